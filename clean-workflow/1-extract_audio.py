@@ -1,8 +1,34 @@
 import os
+import sys
+import time
+import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import catalog
+import metrics
 
 INPUT_DIR = "input"
 OUTPUT_DIR = "audio-from-input"
+# Аудиокодеки, которые следующие этапы читают напрямую: такой поток
+# копируется без перекодирования в подходящий контейнер
+COPY_CODECS = {"mp3": ".mp3", "opus": ".ogg", "vorbis": ".ogg", "aac": ".m4a", "flac": ".flac"}
+# Расширения извлеченного аудио (те же, что принимает 2-split_audio.py)
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg")
+# Контейнер ffmpeg для каждого расширения: аудио пишется во временный файл
+# с другим расширением, поэтому формат указывается явно
+MUXERS = {".mp3": "mp3", ".wav": "wav", ".m4a": "ipod", ".flac": "flac", ".ogg": "ogg"}
+# Формат промежуточного аудио: "mp3" (копия потока или MP3 q0, как раньше),
+# либо "flac"/"wav" - без потерь, сразу 16 кГц моно, как ожидают Whisper
+# и pyannote, чтобы следующие этапы не пересэмплировали аудио при каждой загрузке
+INTERMEDIATE_FORMAT = "mp3"
+ASR_FORMATS = {
+    "flac": ("-c:a", "flac"),
+    "wav": ("-c:a", "pcm_s16le"),
+}
+ASR_SAMPLE_RATE = 16000
+# Число одновременных процессов ffmpeg в пакетном режиме
+EXTRACT_WORKERS = os.cpu_count() or 1
 
 def check_ffmpeg():
     try:
@@ -23,26 +49,150 @@ def get_webm_files(directory):
     return sorted(webm_files)
 
 def get_extracted_audio_files(directory):
-    mp3_files = []
+    audio_files = []
     if not os.path.exists(directory):
-        return mp3_files
+        return audio_files
     for filename in os.listdir(directory):
-        if filename.endswith(".mp3"):
-            mp3_files.append(filename)
-    return sorted(mp3_files)
+        if filename.endswith(AUDIO_EXTENSIONS):
+            audio_files.append(filename)
+    return sorted(audio_files)
+
+def is_audio_extracted(webm_file, extracted_audio_files):
+    """Проверяет, есть ли извлеченное аудио (в любом формате) для видеофайла."""
+    base_name = os.path.splitext(webm_file)[0]
+    return any(os.path.splitext(f)[0] == base_name for f in extracted_audio_files)
 
-def extract_audio(input_file_path, output_file_path):
+def probe_audio(input_file_path):
+    """
+    Возвращает (кодек первой аудиодорожки, длительность в секундах) или (None, None).
+    Результат ffprobe хранится в каталоге, неизменившийся файл повторно не проверяется.
+    """
+    meeting_name = os.path.splitext(os.path.basename(input_file_path))[0]
+    duration, codec = catalog.probe_media(input_file_path, meeting_name)
+    return codec, duration
+
+def extract_audio(input_file_path, output_file_path, copy=False, audio_format=None):
+    """
+    Пишет аудио во временный файл и заменяет им output_file_path только
+    после успешного завершения ffmpeg: при ошибке прежнее аудио остается.
+    """
     print(f"Извлечение аудио из '{input_file_path}' в '{output_file_path}'...")
+    tmp_path = f"{output_file_path}.{os.getpid()}.tmp"
     try:
-        # -vn: no video, -acodec libmp3lame: use mp3 codec, -q:a 0: highest quality mp3
-        subprocess.run(["ffmpeg", "-i", input_file_path, "-vn", "-acodec", "libmp3lame", "-q:a", "0", output_file_path], check=True)
+        if audio_format in ASR_FORMATS:
+            # Без потерь, 16 кГц моно: формат, с которым работают модели
+            codec_args = ["-ac", "1", "-ar", str(ASR_SAMPLE_RATE), *ASR_FORMATS[audio_format]]
+        elif copy:
+            # -c:a copy: поток уже в подходящем кодеке, только меняем контейнер
+            codec_args = ["-c:a", "copy"]
+        else:
+            # -acodec libmp3lame: use mp3 codec, -q:a 0: highest quality mp3
+            codec_args = ["-acodec", "libmp3lame", "-q:a", "0"]
+        muxer = MUXERS[os.path.splitext(output_file_path)[1]]
+        # -vn: no video; -y: перезапись уже подтверждена пользователем
+        subprocess.run(["ffmpeg", "-nostdin", "-y", "-i", input_file_path, "-vn", *codec_args,
+                        "-f", muxer, tmp_path],
+                       check=True, capture_output=True, text=True)
+        os.replace(tmp_path, output_file_path)
         print(f"Аудио успешно извлечено в '{output_file_path}'.")
+        return True
     except subprocess.CalledProcessError as e:
         print(f"Ошибка при извлечении аудио: {e}")
+        print(f"Вывод FFmpeg (stderr):\n{e.stderr}")
     except FileNotFoundError:
         print("Ошибка: ffmpeg не найден. Убедитесь, что ffmpeg установлен и доступен в PATH.")
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return False
+
+def extract_file(webm_file, transcode=False, audio_format=None):
+    """
+    Извлекает аудио из одного видеофайла в OUTPUT_DIR.
+    Для формата "flac"/"wav" пишется 16 кГц моно без потерь. Для "mp3":
+    если кодек дорожки подходит следующим этапам, поток копируется без
+    перекодирования; иначе (или с transcode=True) кодируется в MP3.
+    Возвращает статистику: путь, режим, длительность, время, скорость.
+    """
+    audio_format = audio_format or INTERMEDIATE_FORMAT
+    input_path = os.path.join(INPUT_DIR, webm_file)
+    base_name = os.path.splitext(webm_file)[0]
+    codec, duration = probe_audio(input_path)
+    if audio_format in ASR_FORMATS:
+        copy = False
+        output_path = os.path.join(OUTPUT_DIR, f"{base_name}.{audio_format}")
+        mode = f"{audio_format} 16k mono ({codec or '?'})"
+    else:
+        copy = not transcode and codec in COPY_CODECS
+        output_path = os.path.join(OUTPUT_DIR, base_name + (COPY_CODECS[codec] if copy else ".mp3"))
+        mode = f"copy ({codec})" if copy else f"mp3 ({codec or '?'})"
+
+    catalog.set_stage(base_name, "extract", catalog.RUNNING)
+    start_time = time.time()
+    ok = extract_audio(input_path, output_path, copy=copy, audio_format=audio_format)
+    elapsed = time.time() - start_time
+    if ok:
+        # Старое аудио в другом формате иначе попадет в нарезку вторым файлом;
+        # удаляется только после успешного извлечения нового
+        for filename in get_extracted_audio_files(OUTPUT_DIR):
+            if os.path.splitext(filename)[0] == base_name and filename != os.path.basename(output_path):
+                os.remove(os.path.join(OUTPUT_DIR, filename))
+        catalog.add_artifact(base_name, "extract", output_path)
+    catalog.set_stage(base_name, "extract", catalog.DONE if ok else catalog.FAILED, wall_seconds=round(elapsed, 3),
+                      error=None if ok else "ffmpeg failed")
+    metrics.record("extract", base_name, audio_seconds=duration, wall_seconds=round(elapsed, 4),
+                   bytes_in=metrics.file_size(input_path), bytes_out=metrics.file_size(output_path) if ok else None,
+                   error=None if ok else "ffmpeg failed", mode=mode)
+    return {
+        "file": webm_file,
+        "output": output_path if ok else None,
+        "mode": mode,
+        "duration": duration,
+        "seconds": elapsed,
+        "speed": duration / elapsed if duration and elapsed > 0 else None,
+        "mb_per_s": os.path.getsize(input_path) / 1e6 / elapsed if elapsed > 0 else None,
+    }
+
+def extract_all_pending(webm_files, workers=EXTRACT_WORKERS, transcode=False, force=False, audio_format=None):
+    """
+    Пакетный режим: извлекает аудио из всех видео, для которых его еще нет
+    (или из всех с force=True). Каждая задача - отдельный процесс ffmpeg,
+    одновременно работает не больше workers процессов.
+    """
+    extracted_audio_files = get_extracted_audio_files(OUTPUT_DIR)
+    pending = [f for f in webm_files if force or not is_audio_extracted(f, extracted_audio_files)]
+    if not pending:
+        print("Все файлы уже обработаны.")
+        return []
+
+    print(f"\nПакетное извлечение: {len(pending)} файлов, до {workers} процессов ffmpeg одновременно...")
+    results = []
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(extract_file, f, transcode, audio_format) for f in pending]
+        for future in as_completed(futures):
+            stats = future.result()
+            results.append(stats)
+            if stats["output"]:
+                speed = f"{stats['speed']:.0f}x реального времени" if stats["speed"] else "длительность неизвестна"
+                print(f"  ✓ {stats['file']}: {stats['mode']}, {stats['seconds']:.1f} с, {speed}, {stats['mb_per_s']:.1f} МБ/с")
+            else:
+                print(f"  ✗ {stats['file']}: ошибка извлечения")
+    total = time.time() - start_time
+    done = sum(1 for r in results if r["output"])
+    print(f"Готово: {done}/{len(pending)} файлов за {total:.1f} с.")
+    return results
 
 def main():
+    parser = argparse.ArgumentParser(description="Извлечение аудио из видео")
+    parser.add_argument("--all", action="store_true", help="извлечь аудио из всех необработанных видео без меню")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS,
+                        help=f"число одновременных процессов ffmpeg (по умолчанию {EXTRACT_WORKERS})")
+    parser.add_argument("--transcode", action="store_true", help="всегда перекодировать в MP3, не копировать поток")
+    parser.add_argument("--force", action="store_true", help="в пакетном режиме извлечь заново и уже обработанные файлы")
+    parser.add_argument("--format", choices=["mp3", *ASR_FORMATS], default=INTERMEDIATE_FORMAT,
+                        help="формат промежуточного аудио: mp3 или flac/wav (16 кГц моно без потерь)")
+    args = parser.parse_args()
+
     if not check_ffmpeg():
         return
 
@@ -55,20 +205,29 @@ def main():
         print(f"В папке '{INPUT_DIR}' не найдено файлов .webm.")
         return
 
+    if args.all:
+        results = extract_all_pending(webm_files, workers=args.workers, transcode=args.transcode, force=args.force,
+                                      audio_format=args.format)
+        sys.exit(0 if all(r["output"] for r in results) else 1)
+
     print("\nДоступные .webm файлы:")
     files_to_process = []
     for i, webm_file in enumerate(webm_files):
-        base_name = os.path.splitext(webm_file)[0]
-        corresponding_mp3 = f"{base_name}.mp3"
-        status = " (аудио уже извлечено)" if corresponding_mp3 in extracted_audio_files else ""
+        already_extracted = is_audio_extracted(webm_file, extracted_audio_files)
+        status = " (аудио уже извлечено)" if already_extracted else ""
         print(f"{i + 1}. {webm_file}{status}")
-        files_to_process.append((webm_file, corresponding_mp3 in extracted_audio_files))
+        files_to_process.append((webm_file, already_extracted))
 
     while True:
         try:
-            choice = input("\nВыберите номер файла для извлечения аудио (или 'q' для выхода): ")
+            choice = input("\nВыберите номер файла для извлечения аудио ('a' - все необработанные, 'q' - выход): ")
             if choice.lower() == 'q':
                 break
+            if choice.lower() == 'a':
+                extract_all_pending(webm_files, workers=args.workers, transcode=args.transcode, audio_format=args.format)
+                extracted_audio_files = get_extracted_audio_files(OUTPUT_DIR)
+                files_to_process = [(f, is_audio_extracted(f, extracted_audio_files)) for f, _ in files_to_process]
+                continue
             
             choice_index = int(choice) - 1
             if 0 <= choice_index < len(files_to_process):
@@ -79,11 +238,7 @@ def main():
                     if confirm.lower() != 'y':
                         continue
 
-                input_path = os.path.join(INPUT_DIR, selected_webm_file)
-                output_base_name = os.path.splitext(selected_webm_file)[0]
-                output_path = os.path.join(OUTPUT_DIR, f"{output_base_name}.mp3")
-                
-                extract_audio(input_path, output_path)
+                extract_file(selected_webm_file, transcode=args.transcode, audio_format=args.format)
                 # Обновить список извлеченных файлов после успешного извлечения
                 extracted_audio_files = get_extracted_audio_files(OUTPUT_DIR)
                 # Обновить статус в files_to_process
@@ -1,12 +1,34 @@
 import os
+import json
+import argparse
 import subprocess
 import math
 
+import rttm
+import catalog
+import metrics
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")  # нужен только поиску пауз
+
 AUDIO_INPUT_DIR = "audio-from-input"
 CHUNKS_OUTPUT_DIR = "chunks"
 CHUNK_DURATION_MINUTES = 10
 OVERLAP_SECONDS = 10  # Небольшое перекрытие для плавного перехода
 
+# Режим нарезки: "fixed" - ровно каждые CHUNK_DURATION_MINUTES с перекрытием,
+# "energy" - граница в ближайшей паузе по энергии сигнала,
+# "rttm" - граница в ближайшем промежутке между репликами из диаризации
+SPLIT_MODE = "fixed"
+BOUNDARY_TOLERANCE_SECONDS = 30  # насколько граница может сдвинуться от расчетной
+PAUSE_OVERLAP_SECONDS = 0        # перекрытие, если граница попала в паузу
+MIN_PAUSE_SECONDS = 0.3          # минимальная длина паузы для границы
+ENERGY_FRAME_SECONDS = 0.05
+ANALYSIS_SAMPLE_RATE = 8000      # для поиска пауз хватает 8 кГц
+RTTM_DIR = "../diarization/diarization_results"
+# Точные смещения фрагментов для этапа сборки
+MANIFEST_FILENAME = "_chunks.json"
+
 def check_ffmpeg_and_ffprobe():
     try:
         subprocess.run(["ffmpeg", "-version"], capture_output=True, check=True, text=True)
@@ -29,90 +51,313 @@ def get_audio_files(directory):
     return sorted(audio_files)
 
 def get_file_duration(file_path):
-    try:
-        result = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", file_path], capture_output=True, text=True, check=True)
-        return float(result.stdout)
-    except (subprocess.CalledProcessError, ValueError) as e:
-        print(f"Ошибка при получении длительности файла {file_path}: {e}")
-        return None
+    """Длительность из каталога; ffprobe запускается, только если файл новый или изменился."""
+    duration, _ = catalog.probe_media(file_path, os.path.splitext(os.path.basename(file_path))[0])
+    if duration is None:
+        print(f"Ошибка при получении длительности файла {file_path}: ffprobe не смог ее определить")
+    return duration
 
 def has_chunks_been_created(audio_filename):
     base_name = os.path.splitext(audio_filename)[0]
     chunk_dir = os.path.join(CHUNKS_OUTPUT_DIR, base_name)
+    # Каталог знает, завершилась ли нарезка: недорезанная папка не считается готовой
+    status = catalog.stage_status(base_name, "split")
+    if status is not None:
+        return status == catalog.DONE and os.path.isdir(chunk_dir)
     if os.path.exists(chunk_dir) and os.listdir(chunk_dir):
         return True
     return False
 
-def split_audio_into_chunks(input_file_path, output_base_dir, audio_filename):
-    print(f"\nРазделение '{audio_filename}' на фрагменты...")
-    duration = get_file_duration(input_file_path)
-    if duration is None:
-        return
-
-    base_name = os.path.splitext(audio_filename)[0]
-    output_chunk_dir = os.path.join(output_base_dir, base_name)
-    os.makedirs(output_chunk_dir, exist_ok=True)
-
+def plan_chunks(duration):
+    """
+    Рассчитывает границы фрагментов с перекрытием.
+    Возвращает список (номер_фрагмента, начало, длительность), номера с 1.
+    """
     chunk_duration_seconds = CHUNK_DURATION_MINUTES * 60
     # Исправляем ошибку в расчете: для одного файла длительностью < chunk_duration_seconds нужно 1 чанк, а не 0
     num_chunks = math.ceil(duration / (chunk_duration_seconds - OVERLAP_SECONDS)) if chunk_duration_seconds > OVERLAP_SECONDS else math.ceil(duration / chunk_duration_seconds)
     if num_chunks == 0 and duration > 0:
         num_chunks = 1
 
-
+    chunks = []
     for i in range(num_chunks):
         start_time = i * (chunk_duration_seconds - OVERLAP_SECONDS)
         # Для первого чанка нет смещения
         if i == 0:
             start_time = 0
-        
+
         current_chunk_duration = chunk_duration_seconds
-        
+
         # Убедимся, что последний фрагмент не выходит за пределы файла
         if start_time + current_chunk_duration > duration:
             current_chunk_duration = duration - start_time
-        
+
         # Если длительность получилась отрицательной или нулевой, пропускаем
         if current_chunk_duration <= 0:
             continue
 
-        output_chunk_path = os.path.join(output_chunk_dir, f"{base_name}_part{i+1:03d}.mp3")
-        
-        print(f"  Создание фрагмента {i+1}/{num_chunks}: {output_chunk_path} (начало: {start_time:.2f}s, длительность: {current_chunk_duration:.2f}s)")
-        try:
-            # --- ИЗМЕНЕНИЕ ЗДЕСЬ ---
-            # Базовая команда
-            # Добавляем -nostdin, чтобы избежать случайного зависания в циклах
-            cmd = ["ffmpeg", "-y", "-i", input_file_path, "-ss", str(start_time), "-t", str(current_chunk_duration)]
-
-            # Определяем, нужно ли перекодировать аудио
-            if input_file_path.lower().endswith(".mp3"):
-                # Если исходный файл - mp3, просто копируем поток
-                cmd.extend(["-c", "copy"])
-            else:
-                # Для других форматов (wav, flac и т.д.) перекодируем в mp3
-                # -c:a libmp3lame - стандартный качественный кодировщик MP3
-                # -b:a 192k - аудио битрейт 192 кбит/с (хороший баланс качества и размера)
-                cmd.extend(["-c:a", "libmp3lame", "-b:a", "192k"])
+        chunks.append((i + 1, start_time, current_chunk_duration))
+    return chunks
+
+def compute_frame_energy(input_file_path):
+    """
+    Громкость (dBFS) по кадрам ENERGY_FRAME_SECONDS. Аудио декодируется
+    потоком в 8 кГц моно, в памяти держится только массив громкостей.
+    """
+    frame = int(ENERGY_FRAME_SECONDS * ANALYSIS_SAMPLE_RATE)
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", input_file_path,
+           "-vn", "-ac", "1", "-ar", str(ANALYSIS_SAMPLE_RATE), "-f", "f32le", "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    levels = []
+    rest = np.zeros(0, dtype=np.float32)
+    block_bytes = frame * 4 * 200
+    while True:
+        block = proc.stdout.read(block_bytes)
+        if not block:
+            break
+        samples = np.concatenate((rest, np.frombuffer(block[:len(block) - len(block) % 4], dtype=np.float32)))
+        num_frames = len(samples) // frame
+        frames = samples[:num_frames * frame].reshape(num_frames, frame).astype(np.float64)
+        levels.append(10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10))
+        rest = samples[num_frames * frame:]
+    proc.wait()
+    return np.concatenate(levels) if levels else np.zeros(0)
+
+def load_rttm_turns(rttm_path):
+    """Реплики из RTTM как отсортированные и объединенные интервалы (начало, конец)."""
+    starts, ends = rttm.speech_intervals(rttm.load_rttm(rttm_path))
+    return np.column_stack((starts, ends)).tolist()
+
+def energy_pause_finder(levels):
+    """Ищет самое тихое место (не короче MIN_PAUSE_SECONDS) около расчетной границы."""
+    window = max(1, int(MIN_PAUSE_SECONDS / ENERGY_FRAME_SECONDS))
+    smoothed = np.convolve(levels, np.ones(window) / window, mode='same') if len(levels) else levels
+    # Пауза должна быть заметно тише типичного уровня речи
+    silence_level = np.percentile(levels, 20) + 6 if len(levels) else 0.0
+
+    def find_pause(lo, hi, target):
+        first, last = int(lo / ENERGY_FRAME_SECONDS), min(int(hi / ENERGY_FRAME_SECONDS), len(smoothed))
+        if last <= first:
+            return None
+        region = smoothed[first:last]
+        quietest = region.min()
+        if quietest > silence_level:
+            return None
+        # Среди почти одинаково тихих мест берем ближайшее к расчетной границе
+        candidates = np.flatnonzero(region <= quietest + 3) + first
+        times = (candidates + 0.5) * ENERGY_FRAME_SECONDS
+        return float(times[np.argmin(np.abs(times - target))])
+    return find_pause
+
+def rttm_pause_finder(turns):
+    """Ищет промежуток между репликами около расчетной границы."""
+    gaps = [(0.0, turns[0][0])] if turns else []
+    gaps += [(turns[i][1], turns[i + 1][0]) for i in range(len(turns) - 1)]
+    if turns:
+        gaps.append((turns[-1][1], float('inf')))
+
+    def find_pause(lo, hi, target):
+        best = None
+        for gap_start, gap_end in gaps:
+            if gap_end - gap_start < MIN_PAUSE_SECONDS:
+                continue
+            start, end = max(gap_start, lo), min(gap_end, hi)
+            if end <= start:
+                continue
+            # Точка внутри промежутка, ближайшая к расчетной границе (не вплотную к речи)
+            margin = min(MIN_PAUSE_SECONDS / 2, (end - start) / 2)
+            point = min(max(target, start + margin), end - margin)
+            if best is None or abs(point - target) < abs(best - target):
+                best = point
+        return best
+    return find_pause
+
+def plan_adaptive_chunks(duration, find_pause):
+    """
+    Рассчитывает фрагменты с границами в паузах. Граница ищется в пределах
+    BOUNDARY_TOLERANCE_SECONDS от расчетной; если пауза найдена, соседние
+    фрагменты перекрываются на PAUSE_OVERLAP_SECONDS (по умолчанию 0),
+    иначе граница остается на месте с обычным перекрытием OVERLAP_SECONDS.
+    Возвращает список (номер_фрагмента, начало, длительность), как plan_chunks.
+    """
+    chunk_duration_seconds = CHUNK_DURATION_MINUTES * 60
+    chunks = []
+    start = 0.0
+    while duration - start > 0:
+        target = start + chunk_duration_seconds
+        # Короткий хвост не выделяем в отдельный фрагмент
+        if target + BOUNDARY_TOLERANCE_SECONDS >= duration:
+            chunks.append((len(chunks) + 1, start, duration - start))
+            break
+        cut = find_pause(max(target - BOUNDARY_TOLERANCE_SECONDS, start + 1), target + BOUNDARY_TOLERANCE_SECONDS, target)
+        overlap = PAUSE_OVERLAP_SECONDS
+        if cut is None:
+            cut, overlap = target, OVERLAP_SECONDS
+        chunks.append((len(chunks) + 1, start, cut - start))
+        start = cut - overlap
+    return chunks
 
-            # Добавляем путь к выходному файлу
+def plan_split(input_file_path, duration, mode=None):
+    """Фрагменты для выбранного режима нарезки (SPLIT_MODE по умолчанию)."""
+    mode = mode or SPLIT_MODE
+    if mode == "rttm":
+        base_name = os.path.splitext(os.path.basename(input_file_path))[0]
+        rttm_path = os.path.join(RTTM_DIR, f"{base_name}.rttm")
+        if os.path.exists(rttm_path):
+            return plan_adaptive_chunks(duration, rttm_pause_finder(load_rttm_turns(rttm_path)))
+        print(f"Нет файла диаризации {rttm_path}, паузы ищутся по энергии сигнала.")
+        mode = "energy"
+    if mode == "energy":
+        return plan_adaptive_chunks(duration, energy_pause_finder(compute_frame_energy(input_file_path)))
+    return plan_chunks(duration)
+
+def write_manifest(output_chunk_dir, input_file_path, duration, mode, chunks):
+    """Сохраняет точные смещения фрагментов для этапа сборки (атомарно)."""
+    extension = get_chunk_extension(input_file_path)
+    base_name = os.path.basename(output_chunk_dir)
+    manifest = {
+        "source": os.path.basename(input_file_path),
+        "duration": duration,
+        "mode": mode,
+        "chunks": [
+            {"part": part_num, "file": f"{base_name}_part{part_num:03d}{extension}",
+             "start": round(start_time, 3), "duration": round(chunk_duration, 3)}
+            for part_num, start_time, chunk_duration in chunks
+        ],
+    }
+    manifest_path = os.path.join(output_chunk_dir, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+def get_codec_args(input_file_path):
+    """Определяет, нужно ли перекодировать аудио."""
+    if input_file_path.lower().endswith(".mp3"):
+        # Если исходный файл - mp3, просто копируем поток
+        return ["-c", "copy"]
+    if input_file_path.lower().endswith(".wav"):
+        # PCM режется точно по сэмплам, копируем без изменений
+        return ["-c", "copy"]
+    if input_file_path.lower().endswith(".flac"):
+        # FLAC без потерь: фрагменты остаются FLAC (кодирование дешевое и не портит звук)
+        return ["-c:a", "flac"]
+    # Для других форматов (m4a, ogg и т.д.) перекодируем в mp3
+    # -c:a libmp3lame - стандартный качественный кодировщик MP3
+    # -b:a 192k - аудио битрейт 192 кбит/с (хороший баланс качества и размера)
+    return ["-c:a", "libmp3lame", "-b:a", "192k"]
+
+def get_chunk_extension(input_file_path):
+    """Расширение фрагментов: WAV и FLAC сохраняются без потерь, остальное - mp3."""
+    ext = os.path.splitext(input_file_path)[1].lower()
+    return ext if ext in (".wav", ".flac") else ".mp3"
+
+def split_audio_into_chunks(input_file_path, output_base_dir, audio_filename, single_pass=True, mode=None):
+    """
+    Делит аудиофайл на фрагменты {base}_partNNN и записывает рядом
+    манифест MANIFEST_FILENAME с точными смещениями фрагментов.
+
+    Границы выбираются режимом mode (SPLIT_MODE по умолчанию): фиксированные
+    с перекрытием или в паузах речи. По умолчанию все фрагменты пишутся
+    одним процессом ffmpeg: файл читается один раз, а каждый выход получает
+    свои -ss/-t. С single_pass=False используется старый режим (отдельный
+    ffmpeg на каждый фрагмент), который оставлен для сравнения в бенчмарке.
+    """
+    print(f"\nРазделение '{audio_filename}' на фрагменты...")
+    duration = get_file_duration(input_file_path)
+    if duration is None:
+        return
+
+    base_name = os.path.splitext(audio_filename)[0]
+    output_chunk_dir = os.path.join(output_base_dir, base_name)
+    os.makedirs(output_chunk_dir, exist_ok=True)
+
+    mode = mode or SPLIT_MODE
+    catalog.forget(base_name, "split")
+    catalog.set_stage(base_name, "split", catalog.RUNNING)
+    with metrics.timed("split", base_name, audio_seconds=duration, bytes_in=metrics.file_size(input_file_path),
+                       mode=mode) as event:
+        chunks = plan_split(input_file_path, duration, mode)
+        if single_pass:
+            ok = split_single_pass(input_file_path, output_chunk_dir, base_name, chunks)
+        else:
+            ok = split_per_chunk(input_file_path, output_chunk_dir, base_name, chunks)
+        if ok:
+            manifest = write_manifest(output_chunk_dir, input_file_path, duration, mode, chunks)
+            catalog.record_chunks(base_name, manifest["chunks"])
+            for chunk in manifest["chunks"]:
+                catalog.add_artifact(base_name, "split", os.path.join(output_chunk_dir, chunk["file"]))
+            event["bytes_out"] = sum(metrics.file_size(os.path.join(output_chunk_dir, f)) or 0
+                                     for f in os.listdir(output_chunk_dir))
+        else:
+            event["error"] = "ffmpeg failed"
+        event["chunks"] = len(chunks)
+    catalog.set_stage(base_name, "split", catalog.DONE if ok else catalog.FAILED,
+                      wall_seconds=event.get("wall_seconds"), error=event.get("error"))
+    print(f"Разделение '{audio_filename}' завершено.")
+
+def split_single_pass(input_file_path, output_chunk_dir, base_name, chunks):
+    """Создает все фрагменты за одно декодирование исходного файла."""
+    # -nostdin, чтобы избежать случайного зависания
+    cmd = ["ffmpeg", "-nostdin", "-y", "-i", input_file_path]
+    output_paths = []
+    for part_num, start_time, current_chunk_duration in chunks:
+        output_chunk_path = os.path.join(output_chunk_dir, f"{base_name}_part{part_num:03d}{get_chunk_extension(input_file_path)}")
+        print(f"  Фрагмент {part_num}/{len(chunks)}: {output_chunk_path} (начало: {start_time:.2f}s, длительность: {current_chunk_duration:.2f}s)")
+        # Опции -ss/-t после -i относятся к конкретному выходу: ffmpeg декодирует
+        # файл один раз и раздает кадры всем выходам сразу
+        cmd.extend(["-map", "0:a:0", "-ss", str(start_time), "-t", str(current_chunk_duration)])
+        cmd.extend(get_codec_args(input_file_path))
+        cmd.append(output_chunk_path)
+        output_paths.append(output_chunk_path)
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Ошибка при создании фрагментов: {e}")
+        print(f"Вывод FFmpeg (stderr):\n{e.stderr}") # Печатаем вывод ffmpeg для диагностики
+        # Удаляем неполные фрагменты, чтобы папка не считалась готовой
+        for output_chunk_path in output_paths:
+            if os.path.exists(output_chunk_path):
+                os.remove(output_chunk_path)
+        return False
+
+def split_per_chunk(input_file_path, output_chunk_dir, base_name, chunks):
+    """Старый режим: отдельный процесс ffmpeg на каждый фрагмент."""
+    for part_num, start_time, current_chunk_duration in chunks:
+        output_chunk_path = os.path.join(output_chunk_dir, f"{base_name}_part{part_num:03d}{get_chunk_extension(input_file_path)}")
+
+        print(f"  Создание фрагмента {part_num}/{len(chunks)}: {output_chunk_path} (начало: {start_time:.2f}s, длительность: {current_chunk_duration:.2f}s)")
+        try:
+            # Так как -ss стоит после -i, каждый вызов декодирует файл с самого начала
+            cmd = ["ffmpeg", "-nostdin", "-y", "-i", input_file_path, "-ss", str(start_time), "-t", str(current_chunk_duration)]
+            cmd.extend(get_codec_args(input_file_path))
             cmd.append(output_chunk_path)
 
-            # Выполняем команду
             # capture_output=True и text=True помогут увидеть вывод ffmpeg в случае ошибки
             subprocess.run(cmd, check=True, capture_output=True, text=True)
-            # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
         except subprocess.CalledProcessError as e:
-            print(f"Ошибка при создании фрагмента {i+1}: {e}")
+            print(f"Ошибка при создании фрагмента {part_num}: {e}")
             print(f"Вывод FFmpeg (stderr):\n{e.stderr}") # Печатаем вывод ffmpeg для диагностики
-            # Можно добавить логику для удаления неполного файла, если нужно
             if os.path.exists(output_chunk_path):
                 os.remove(output_chunk_path)
-            break # Прекращаем, если один фрагмент не удалось создать
-    print(f"Разделение '{audio_filename}' завершено.")
+            return False # Прекращаем, если один фрагмент не удалось создать
+    return True
 
 def main():
+    global SPLIT_MODE, BOUNDARY_TOLERANCE_SECONDS
+
+    parser = argparse.ArgumentParser(description="Разделение аудио на фрагменты")
+    parser.add_argument("--mode", choices=["fixed", "energy", "rttm"], default=SPLIT_MODE,
+                        help="fixed - ровные фрагменты с перекрытием; energy/rttm - границы в паузах речи")
+    parser.add_argument("--tolerance", type=float, default=BOUNDARY_TOLERANCE_SECONDS,
+                        help=f"максимальный сдвиг границы к паузе, с (по умолчанию {BOUNDARY_TOLERANCE_SECONDS})")
+    args = parser.parse_args()
+    SPLIT_MODE = args.mode
+    BOUNDARY_TOLERANCE_SECONDS = args.tolerance
+
     if not check_ffmpeg_and_ffprobe():
         return
 
@@ -1,15 +1,75 @@
-import torch
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
 import os
+import sys
+import json
 import time
 import shutil
+import re
+import bisect
+import hashlib
+import wave
+import argparse
+import subprocess
+
+import rttm
+import catalog
+import metrics
+import model_server
+import waveform_cache
+from lazy_imports import lazy_import
+
+# torch и transformers импортируются только при загрузке модели, numpy - при
+# первом обращении: статус и план run_pipeline.py не ждут их загрузки
+np = lazy_import("numpy")
 
 # --- НАСТРОЙКИ ---
 # Базовые директории для работы
 CHUNKS_BASE_DIR = "chunks"
 RAW_TEXT_BASE_DIR = "raw_text"
+# Манифест с точными смещениями чанков (пишет 2-split_audio.py)
+MANIFEST_FILENAME = "_chunks.json"
 # ID модели Whisper для транскрибации
 MODEL_ID = "openai/whisper-large-v3"
+# Движок распознавания (см. ASR_BACKENDS):
+#   "transformers" - модель как есть (float16 на GPU, float32 на CPU)
+#   "int8"         - для CPU: динамическая int8-квантизация линейных слоев
+ASR_BACKEND = "transformers"
+# Язык распознавания
+LANGUAGE = "russian"
+# Частота дискретизации, которую ожидает Whisper
+SAMPLE_RATE = 16000
+# Окна для потокового режима (совпадают с нарезкой в 2-split_audio.py)
+CHUNK_DURATION_MINUTES = 10
+OVERLAP_SECONDS = 10
+# Пакетный режим: длина окна Whisper и число окон в одном проходе модели
+CHUNK_LENGTH_S = 30
+BATCH_SIZE = 16
+# Поддерживаемые форматы аудио-чанков
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a')
+# Кэш результатов по хэшу содержимого аудио (и параметрам модели)
+TRANSCRIPTION_CACHE_DIR = "transcription_cache"
+USE_TRANSCRIPTION_CACHE = True
+# Читать чанки срезами из общего декодированного waveforms/<совещание>.npy
+# (его же использует диаризация), а не декодировать каждый файл заново
+USE_SHARED_WAVEFORM = False
+# Брать модель у запущенного model_server.py (если он есть) вместо загрузки
+USE_MODEL_SERVER = True
+# Отсев тишины перед распознаванием (VAD): None - выключен,
+# "energy" - по энергии сигнала, "rttm" - по репликам из диаризации
+VAD_MODE = None
+VAD_RTTM_DIR = "../diarization/diarization_results"
+VAD_FRAME_S = 0.03         # длина кадра для оценки энергии
+VAD_THRESHOLD_DB = 12      # порог речи над уровнем шума
+VAD_MIN_DB = -50           # кадры тише этого уровня (dBFS) всегда тишина
+VAD_MIN_SILENCE_S = 2.0    # более короткие паузы не вырезаются
+VAD_PADDING_S = 0.3        # запас вокруг речи
+VAD_JOIN_GAP_S = 0.5       # тишина между склеенными фрагментами речи
+# Метки времени по словам (return_timestamps="word"): строки "[a -> b] текст"
+# собираются из слов, а сами слова сохраняются рядом в <чанк>.words.jsonl -
+# по ним 4.5-apply_diarization.py назначает спикера каждому слову
+WORD_TIMESTAMPS = False
+WORDS_SUFFIX = ".words.jsonl"
+WORD_LINE_MAX_GAP_S = 1.0  # пауза между словами, после которой начинается новая строка
+WORD_LINE_MAX_S = 30.0     # максимальная длина строки из слов
 # --- КОНЕЦ НАСТРОЕК ---
 
 
@@ -32,18 +92,25 @@ def get_transcription_status(meeting_name):
     if not os.path.exists(chunks_dir):
         return "Ошибка: папка с чанками не найдена"
 
-    try:
-        num_mp3 = len([f for f in os.listdir(chunks_dir) if f.endswith(('.mp3', '.wav', '.flac', '.m4a'))])
-    except FileNotFoundError:
-        return "Ошибка: папка с чанками не найдена"
-    
+    # Если каталог знает совещание, оба числа берутся из него без обхода папок
+    counts = catalog_transcription_counts(meeting_name)
+    if counts is not None:
+        num_mp3, num_txt = counts
+    else:
+        try:
+            num_mp3 = len([f for f in os.listdir(chunks_dir) if f.endswith(AUDIO_EXTENSIONS)])
+        except FileNotFoundError:
+            return "Ошибка: папка с чанками не найдена"
+
     if num_mp3 == 0:
         return "Нет аудио-чанков"
 
     if not os.path.exists(raw_text_dir):
         return "Не начато"
 
-    num_txt = len([f for f in os.listdir(raw_text_dir) if f.endswith('.txt')])
+    if counts is None:
+        # Служебные файлы следующих этапов (_full_transcript.txt и др.) не считаем
+        num_txt = len([f for f in os.listdir(raw_text_dir) if f.endswith('.txt') and not f.startswith('_')])
 
     if num_txt == 0:
         return "Не начато"
@@ -54,6 +121,363 @@ def get_transcription_status(meeting_name):
     else:
         return f"Ошибка: текстовых файлов больше, чем аудио ({num_txt}/{num_mp3})"
 
+def format_transcript(result):
+    """Форматирует результат пайплайна в строки '[start -> end] текст'."""
+    if result and "chunks" in result:
+        lines = []
+        for chunk in result["chunks"]:
+            start_ts = chunk.get('timestamp', [None, None])[0]
+            end_ts = chunk.get('timestamp', [None, None])[1]
+            text = chunk.get('text', '').strip()
+
+            # Записываем только если есть текст
+            if text and start_ts is not None and end_ts is not None:
+                lines.append(f"[{start_ts:.2f} -> {end_ts:.2f}] {text}\n")
+        return "".join(lines)
+    # На случай, если результат пустой или в неожиданном формате
+    return result.get("text", "Не удалось извлечь текст.")
+
+SENTENCE_END_RE = re.compile(r'[.!?…]["»)]*$')
+
+def format_words(result):
+    """
+    Слова результата пайплайна (return_timestamps="word") в JSONL: по строке
+    {"seg", "start", "end", "text"} на слово. "seg" - номер строки транскрипта:
+    новая строка начинается после конца предложения, паузы длиннее
+    WORD_LINE_MAX_GAP_S или когда строка длиннее WORD_LINE_MAX_S.
+    """
+    lines = []
+    seg, line_start, previous_end, sentence_ended = -1, None, None, False
+    for chunk in (result or {}).get("chunks", []):
+        start_ts, end_ts = chunk.get('timestamp', (None, None))
+        text = chunk.get('text', '').strip()
+        if not text or start_ts is None:
+            continue
+        # У последнего слова окна Whisper иногда не ставит конец
+        end_ts = start_ts if end_ts is None else max(end_ts, start_ts)
+        if (seg < 0 or sentence_ended or start_ts - previous_end > WORD_LINE_MAX_GAP_S
+                or end_ts - line_start > WORD_LINE_MAX_S):
+            seg += 1
+            line_start = start_ts
+        lines.append(json.dumps({"seg": seg, "start": round(start_ts, 2), "end": round(end_ts, 2), "text": text},
+                                ensure_ascii=False) + "\n")
+        previous_end = end_ts
+        sentence_ended = bool(SENTENCE_END_RE.search(text))
+    return "".join(lines)
+
+def words_to_transcript(words_jsonl):
+    """Строки '[start -> end] текст' из JSONL слов: по строке на каждый "seg"."""
+    lines = []
+    current = None
+    for line in words_jsonl.splitlines():
+        if not line.strip():
+            continue
+        word = json.loads(line)
+        if current is None or word["seg"] != current[0]:
+            if current is not None:
+                lines.append(f"[{current[1]:.2f} -> {current[2]:.2f}] {' '.join(current[3])}\n")
+            current = [word["seg"], word["start"], word["end"], [word["text"]]]
+        else:
+            current[2] = max(current[2], word["end"])
+            current[3].append(word["text"])
+    if current is not None:
+        lines.append(f"[{current[1]:.2f} -> {current[2]:.2f}] {' '.join(current[3])}\n")
+    return "".join(lines)
+
+def catalog_transcription_counts(meeting_name):
+    """(число чанков, число готовых транскрипций) по каталогу или None, если он не знает совещание."""
+    if catalog.stage_status(meeting_name, "transcribe") is None:
+        return None
+    chunks = catalog.get_chunks(meeting_name)
+    if chunks is None:
+        return None
+    return len(chunks), catalog.count_artifacts(meeting_name, "transcribe") or 0
+
+def start_transcription(meeting_name, output_meeting_folder, force_rerun):
+    """Готовит папку результатов совещания (с force_rerun - пустую) и отмечает этап в каталоге."""
+    if force_rerun and os.path.exists(output_meeting_folder):
+        print(f"Удаляю предыдущие результаты из: {output_meeting_folder}")
+        shutil.rmtree(output_meeting_folder)
+        catalog.forget(meeting_name, "transcribe")
+    os.makedirs(output_meeting_folder, exist_ok=True)
+    catalog.set_stage(meeting_name, "transcribe", catalog.RUNNING)
+
+def finish_transcription(meeting_name, ok, error=None):
+    catalog.set_stage(meeting_name, "transcribe", catalog.DONE if ok else catalog.FAILED, error=error)
+
+def write_text(output_filepath, text):
+    with open(output_filepath, 'w', encoding='utf-8') as f:
+        f.write(text)
+    # Файл лежит в raw_text/<совещание>/
+    catalog.add_artifact(os.path.basename(os.path.dirname(os.path.abspath(output_filepath))), "transcribe",
+                         output_filepath)
+
+def words_path(output_filepath):
+    return os.path.splitext(output_filepath)[0] + WORDS_SUFFIX
+
+def write_chunk_result(output_filepath, payload):
+    """
+    Записывает результат чанка в том виде, в каком он лежит в кэше: текст
+    '[start -> end] ...' или, с WORD_TIMESTAMPS, JSONL слов. Слова пишутся
+    рядом в .words.jsonl раньше .txt - готовым чанк считается по .txt.
+    """
+    path = words_path(output_filepath)
+    if WORD_TIMESTAMPS:
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+        payload = words_to_transcript(payload)
+    elif os.path.exists(path):
+        # Слова от прошлого запуска не соответствуют новому тексту
+        os.remove(path)
+    write_text(output_filepath, payload)
+
+def write_transcript(result, output_filepath):
+    """Сохраняет результат пайплайна и возвращает то, что нужно положить в кэш."""
+    payload = format_words(result) if WORD_TIMESTAMPS else format_transcript(result)
+    write_chunk_result(output_filepath, payload)
+    return payload
+
+# --- КЭШ ТРАНСКРИПЦИЙ ---
+# Ключ кэша: хэш содержимого аудио + модель, язык и параметры декодирования.
+# Переименование, повторная нарезка или перезапуск совещания не требуют
+# повторной транскрибации неизменившихся чанков.
+
+def timestamps_mode():
+    """Значение return_timestamps пайплайна: метки по словам или по сегментам."""
+    return "word" if WORD_TIMESTAMPS else True
+
+def decode_params(**extra):
+    """Параметры, влияющие на результат транскрибации."""
+    params = {"model": MODEL_ID, "backend": ASR_BACKEND, "language": LANGUAGE, "return_timestamps": timestamps_mode()}
+    if VAD_MODE:
+        params["vad"] = [VAD_MODE, VAD_THRESHOLD_DB, VAD_MIN_DB, VAD_MIN_SILENCE_S, VAD_PADDING_S, VAD_JOIN_GAP_S]
+    params.update(extra)
+    return params
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_samples(samples):
+    return hashlib.sha256(samples.tobytes()).hexdigest()
+
+def transcription_cache_key(content_hash, params):
+    payload = content_hash + json.dumps(params, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_cached_transcript(key):
+    """Возвращает текст из кэша или None."""
+    if not USE_TRANSCRIPTION_CACHE:
+        return None
+    cache_path = os.path.join(TRANSCRIPTION_CACHE_DIR, key[:2], key + ".txt")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def store_cached_transcript(key, text):
+    if not USE_TRANSCRIPTION_CACHE:
+        return
+    cache_dir = os.path.join(TRANSCRIPTION_CACHE_DIR, key[:2])
+    os.makedirs(cache_dir, exist_ok=True)
+    # Пишем во временный файл и переименовываем, чтобы параллельные запуски
+    # никогда не увидели неполную запись
+    tmp_path = os.path.join(cache_dir, f".{key}.{os.getpid()}.tmp")
+    # Не через write_text: файлы кэша - не результаты совещания для каталога
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, os.path.join(cache_dir, key + ".txt"))
+
+# --- ОТСЕВ ТИШИНЫ (VAD) ---
+# Перед моделью из аудио вырезаются длинные участки без речи (паузы,
+# перерывы, музыка ожидания в режиме "rttm"). Оставшаяся речь склеивается,
+# а карта времени переводит метки Whisper обратно во время исходного чанка.
+
+def load_chunk_manifest(meeting_name):
+    """Манифест нарезки из chunks/<совещание> (пишет 2-split_audio.py) или None."""
+    manifest_path = os.path.join(CHUNKS_BASE_DIR, meeting_name, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_chunk_spans(meeting_name):
+    """
+    {файл чанка: (начало, длительность)} из манифеста и каталога (каталог
+    важнее). Читается один раз на совещание, а не для каждого чанка.
+    """
+    spans = {}
+    for chunks in ((load_chunk_manifest(meeting_name) or {}).get("chunks"), catalog.get_chunks(meeting_name)):
+        for chunk in chunks or []:
+            spans[chunk["file"]] = (chunk["start"], chunk["duration"])
+    return spans
+
+def chunk_span(spans, filename):
+    """
+    Начало и длительность чанка в секундах из load_chunk_spans(), иначе по
+    номеру _partNNN при фиксированной нарезке (длительность тогда
+    неизвестна - None).
+    """
+    if filename in spans:
+        return spans[filename]
+    match = re.search(r'_part(\d+)', filename)
+    part_index = int(match.group(1)) - 1 if match else 0
+    return part_index * (CHUNK_DURATION_MINUTES * 60 - OVERLAP_SECONDS), None
+
+def chunk_offset(spans, filename):
+    """Смещение чанка в секундах во времени совещания."""
+    return chunk_span(spans, filename)[0]
+
+def copy_chunk_manifest(meeting_name):
+    """Кладет манифест нарезки рядом с транскрипциями, чтобы сборка знала точные смещения."""
+    manifest_path = os.path.join(CHUNKS_BASE_DIR, meeting_name, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.makedirs(os.path.join(RAW_TEXT_BASE_DIR, meeting_name), exist_ok=True)
+        shutil.copyfile(manifest_path, os.path.join(RAW_TEXT_BASE_DIR, meeting_name, MANIFEST_FILENAME))
+
+def write_stream_manifest(output_meeting_folder, media_path, windows):
+    """Манифест окон потокового режима в формате 2-split_audio.py."""
+    meeting_name = os.path.basename(output_meeting_folder)
+    manifest = {
+        "source": os.path.basename(media_path),
+        "duration": max((start + duration for _, start, duration in windows), default=0.0),
+        "mode": "stream",
+        "chunks": [{"part": part_num, "file": f"{meeting_name}_part{part_num:03d}.txt",
+                    "start": round(start, 3), "duration": round(duration, 3)}
+                   for part_num, start, duration in windows],
+    }
+    manifest_path = os.path.join(output_meeting_folder, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    catalog.record_chunks(meeting_name, manifest["chunks"])
+
+def merge_regions(regions, duration):
+    """Объединяет интервалы с паузами короче VAD_MIN_SILENCE_S и добавляет запас."""
+    merged = []
+    for start, end in sorted(regions):
+        start = max(0.0, start - VAD_PADDING_S)
+        end = min(duration, end + VAD_PADDING_S)
+        if merged and start - merged[-1][1] < VAD_MIN_SILENCE_S:
+            merged[-1][1] = max(merged[-1][1], end)
+        elif end > start:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def energy_speech_regions(samples):
+    """Речь по энергии: кадры заметно громче фонового шума."""
+    frame = int(VAD_FRAME_S * SAMPLE_RATE)
+    num_frames = len(samples) // frame
+    if num_frames == 0:
+        return []
+    frames = samples[:num_frames * frame].reshape(num_frames, frame)
+    db = 20 * np.log10(np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1)) + 1e-10)
+    noise_floor = np.percentile(db, 10)
+    # Если речь идет почти без пауз, "шум" - это тоже речь: ограничиваем порог сверху
+    threshold = max(VAD_MIN_DB, min(noise_floor + VAD_THRESHOLD_DB, np.percentile(db, 95) - 20))
+    speech = db > threshold
+
+    regions = []
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    for start_frame, end_frame in zip(edges[::2], edges[1::2]):
+        regions.append((float(start_frame * VAD_FRAME_S), float(end_frame * VAD_FRAME_S)))
+    return regions
+
+def vad_rttm_path(meeting_name):
+    return os.path.join(VAD_RTTM_DIR, f"{meeting_name}.rttm")
+
+def vad_params(meeting_name, chunk_offset):
+    """
+    Параметры VAD, зависящие от совещания и чанка. В режиме "rttm" маска речи
+    берется из диаризации, поэтому в ключ кэша входят хэш RTTM и смещение
+    чанка: после повторной диаризации чанки распознаются заново.
+    """
+    if VAD_MODE != "rttm":
+        return {}
+    rttm_path = vad_rttm_path(meeting_name)
+    return {"vad_rttm": rttm.file_sha256(rttm_path) if os.path.exists(rttm_path) else None,
+            "vad_offset": round(chunk_offset, 3)}
+
+def rttm_speech_regions(meeting_name, chunk_offset, duration):
+    """Речь по результатам диаризации: реплики, попадающие в этот чанк."""
+    rttm_path = vad_rttm_path(meeting_name)
+    if not os.path.exists(rttm_path):
+        print(f"Внимание: нет файла диаризации {rttm_path}, VAD для '{meeting_name}' не применяется.")
+        return [(0.0, duration)]
+    # Кэш .npz сам проверяет, что RTTM не изменился
+    turns = rttm.load_rttm(rttm_path)
+    chunk_end = chunk_offset + duration
+    inside = (turns.ends > chunk_offset) & (turns.starts < chunk_end)
+    starts = np.maximum(turns.starts[inside], chunk_offset) - chunk_offset
+    ends = np.minimum(turns.ends[inside], chunk_end) - chunk_offset
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def apply_vad(samples, chunk_offset=0.0, meeting_name=None):
+    """
+    Вырезает участки без речи. Возвращает (аудио для модели, карта времени).
+    Карта - список (начало_в_склейке, начало_в_чанке, длительность);
+    None, если VAD выключен.
+    """
+    if not VAD_MODE:
+        return samples, None
+    duration = len(samples) / SAMPLE_RATE
+    if VAD_MODE == "rttm":
+        regions = rttm_speech_regions(meeting_name, chunk_offset, duration)
+    else:
+        regions = energy_speech_regions(samples)
+    regions = merge_regions(regions, duration)
+
+    gap = np.zeros(int(VAD_JOIN_GAP_S * SAMPLE_RATE), dtype=np.float32)
+    pieces, time_map, position = [], [], 0.0
+    for start, end in regions:
+        piece = samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        if pieces:
+            pieces.append(gap)
+            position += len(gap) / SAMPLE_RATE
+        pieces.append(piece)
+        time_map.append((position, start, len(piece) / SAMPLE_RATE))
+        position += len(piece) / SAMPLE_RATE
+
+    kept = position - VAD_JOIN_GAP_S * max(0, len(regions) - 1)
+    print(f"VAD: оставлено {kept:.1f} из {duration:.1f} с аудио ({len(regions)} фрагментов речи).")
+    compact = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+    return compact, time_map
+
+def restore_time(time_map, t):
+    """Переводит время из склеенного аудио во время исходного чанка."""
+    if t is None or not time_map:
+        return t
+    i = max(0, bisect.bisect_right([entry[0] for entry in time_map], t) - 1)
+    compact_start, original_start, length = time_map[i]
+    # Метка внутри вставленной паузы прижимается к концу предыдущего фрагмента
+    return original_start + min(max(t - compact_start, 0.0), length)
+
+def restore_timestamps(result, time_map):
+    """Возвращает меткам Whisper время исходного чанка."""
+    if time_map is None or not result or "chunks" not in result:
+        return result
+    for chunk in result["chunks"]:
+        start_ts, end_ts = chunk.get('timestamp', (None, None))
+        chunk['timestamp'] = (restore_time(time_map, start_ts), restore_time(time_map, end_ts))
+    return result
+
+def run_asr(pipe, samples, chunk_offset=0.0, meeting_name=None):
+    """Распознает один чанк с учетом VAD; метки времени - в исходном времени чанка."""
+    samples, time_map = apply_vad(samples, chunk_offset, meeting_name)
+    if len(samples) == 0:
+        return {"text": "", "chunks": []}
+    result = pipe(
+        {"raw": samples, "sampling_rate": SAMPLE_RATE},
+        generate_kwargs={"language": LANGUAGE},
+        return_timestamps=timestamps_mode()
+    )
+    return restore_timestamps(result, time_map)
+
 def process_meeting_folder(meeting_name, pipe, force_rerun=False):
     """
     Основная функция обработки папки с чанками одного совещания
@@ -63,21 +487,20 @@ def process_meeting_folder(meeting_name, pipe, force_rerun=False):
     chunks_folder_path = os.path.join(CHUNKS_BASE_DIR, meeting_name)
     output_meeting_folder = os.path.join(RAW_TEXT_BASE_DIR, meeting_name)
 
-    if force_rerun and os.path.exists(output_meeting_folder):
-        print(f"Удаляю предыдущие результаты из: {output_meeting_folder}")
-        shutil.rmtree(output_meeting_folder)
-    
-    os.makedirs(output_meeting_folder, exist_ok=True)
+    start_transcription(meeting_name, output_meeting_folder, force_rerun)
     print(f"Результаты будут сохранены в: {output_meeting_folder}")
+    copy_chunk_manifest(meeting_name)
 
     # Ищем аудиофайлы с разными расширениями
-    audio_files = sorted([f for f in os.listdir(chunks_folder_path) if f.endswith(('.mp3', '.wav', '.flac', '.m4a'))])
+    audio_files = sorted([f for f in os.listdir(chunks_folder_path) if f.endswith(AUDIO_EXTENSIONS)])
     
     total_files = len(audio_files)
     if total_files == 0:
         print("В папке не найдено аудиофайлов для обработки.")
+        finish_transcription(meeting_name, False, "no audio chunks")
         return
 
+    spans = load_chunk_spans(meeting_name)
     for i, filename in enumerate(audio_files):
         print(f"\nОбрабатываю чанк {i+1}/{total_files}: {filename}")
         file_path = os.path.join(chunks_folder_path, filename)
@@ -87,63 +510,383 @@ def process_meeting_folder(meeting_name, pipe, force_rerun=False):
             print(f"Ошибка: Файл не найден по пути: {file_path}")
             continue
 
+        output_filepath = os.path.join(output_meeting_folder, os.path.splitext(filename)[0] + '.txt')
+
         try:
+            offset = chunk_offset(spans, filename)
+            source = chunk_audio_input(meeting_name, filename, spans)
+            cache_key = transcription_cache_key(hash_file(file_path),
+                                                decode_params(input=source, **vad_params(meeting_name, offset)))
+            cached_text = get_cached_transcript(cache_key)
+            if cached_text is not None:
+                write_chunk_result(output_filepath, cached_text)
+                print(f"Результат взят из кэша: {output_filepath}")
+                metrics.record("transcribe", meeting_name, filename, bytes_in=metrics.file_size(file_path),
+                               bytes_out=metrics.file_size(output_filepath), cached=True)
+                continue
+
             start_time = time.time()
             
             # --- ТРАНСКРИБАЦИЯ ФАЙЛА ---
             # Используем пайплайн, переданный в функцию
-            result = pipe(
-                file_path, 
-                generate_kwargs={"language": "russian"}, 
-                return_timestamps=True
-            )
+            samples = load_chunk_audio(meeting_name, filename, file_path, spans, source)
+            result = run_asr(pipe, samples, offset, meeting_name)
             
             end_time = time.time()
             processing_time = end_time - start_time
             print(f"Транскрибация чанка завершена за {processing_time:.2f} секунд.")
 
             # --- ФОРМАТИРОВАНИЕ И СОХРАНЕНИЕ РЕЗУЛЬТАТА С ВРЕМЕННЫМИ МЕТКАМИ ---
-            output_filepath = os.path.join(output_meeting_folder, os.path.splitext(filename)[0] + '.txt')
-            
-            with open(output_filepath, 'w', encoding='utf-8') as f:
-                if result and "chunks" in result:
-                    for chunk in result["chunks"]:
-                        start_ts = chunk.get('timestamp', [None, None])[0]
-                        end_ts = chunk.get('timestamp', [None, None])[1]
-                        text = chunk.get('text', '').strip()
-                        
-                        # Записываем только если есть текст
-                        if text and start_ts is not None and end_ts is not None:
-                            f.write(f"[{start_ts:.2f} -> {end_ts:.2f}] {text}\n")
-                else:
-                    # На случай, если результат пустой или в неожиданном формате
-                    f.write(result.get("text", "Не удалось извлечь текст."))
+            store_cached_transcript(cache_key, write_transcript(result, output_filepath))
 
             print(f"Результат с временными метками сохранен в: {output_filepath}")
+            metrics.record("transcribe", meeting_name, filename, audio_seconds=round(len(samples) / SAMPLE_RATE, 2),
+                           wall_seconds=round(processing_time, 4), bytes_in=metrics.file_size(file_path),
+                           bytes_out=metrics.file_size(output_filepath))
 
         except Exception as e:
             print(f"!!! Произошла критическая ошибка при обработке файла {filename}: {e}")
+            metrics.record("transcribe", meeting_name, filename, bytes_in=metrics.file_size(file_path), error=str(e))
             print("!!! Пропускаю этот чанк и перехожу к следующему.")
             continue
             
+    finish_transcription(meeting_name, get_transcription_status(meeting_name) == "Готово")
     print(f"\n--- Обработка совещания {meeting_name} завершена! ---")
 
 
-def main():
+def stream_pcm_windows(media_path, window_seconds=CHUNK_DURATION_MINUTES * 60, overlap_seconds=OVERLAP_SECONDS):
     """
-    Главная функция: загружает модель и запускает интерактивное меню
-    для выбора папок и управления процессом транскрибации.
+    Декодирует аудио из видео/аудиофайла через ffmpeg прямо в память
+    (16 кГц, моно, float32) и отдает перекрывающиеся окна.
+    Генерирует (номер_окна, начало_в_секундах, np.ndarray); номера с 1.
+    Границы окон совпадают с фрагментами из 2-split_audio.py.
     """
-    # --- ЗАГРУЗКА МОДЕЛИ И ПАЙПЛАЙНА (выполняется один раз) ---
-    print("Инициализация... Загрузка модели Whisper. Это может занять несколько минут.")
+    window = int(window_seconds * SAMPLE_RATE)
+    step = int((window_seconds - overlap_seconds) * SAMPLE_RATE)
+    bytes_per_sample = 4
+
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", media_path,
+           "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    buffer = bytearray()
+    window_start = 0  # в сэмплах
+    part_num = 1
     try:
-        device = "cuda:0" if torch.cuda.is_available() else "cpu"
-        torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+        while True:
+            block = proc.stdout.read(SAMPLE_RATE * bytes_per_sample)
+            if block:
+                buffer.extend(block)
+            while len(buffer) >= window * bytes_per_sample:
+                samples = np.frombuffer(bytes(buffer[:window * bytes_per_sample]), dtype=np.float32)
+                yield part_num, window_start / SAMPLE_RATE, samples
+                del buffer[:step * bytes_per_sample]
+                window_start += step
+                part_num += 1
+            if not block:
+                break
 
-        model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            MODEL_ID, torch_dtype=torch_dtype, low_cpu_mem_usage=True, use_safetensors=True
-        )
-        model.to(device)
+        # Хвост: последнее (короткое) окно
+        tail = len(buffer) - len(buffer) % bytes_per_sample
+        if tail > 0:
+            yield part_num, window_start / SAMPLE_RATE, np.frombuffer(bytes(buffer[:tail]), dtype=np.float32)
+
+        stderr = proc.stderr.read().decode(errors="replace")
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg завершился с ошибкой: {stderr.strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+def waveform_windows(waveform, window_seconds=CHUNK_DURATION_MINUTES * 60, overlap_seconds=OVERLAP_SECONDS):
+    """Те же окна, что и stream_pcm_windows, но срезами из общего декодированного файла."""
+    window = int(window_seconds * SAMPLE_RATE)
+    step = int((window_seconds - overlap_seconds) * SAMPLE_RATE)
+    window_start, part_num = 0, 1
+    while window_start < len(waveform):
+        yield part_num, window_start / SAMPLE_RATE, waveform[window_start:window_start + window]
+        window_start += step
+        part_num += 1
+
+def transcribe_stream(meeting_name, media_path, pipe, force_rerun=False):
+    """
+    Потоковый режим: аудио из исходного файла декодируется один раз и
+    подается в модель окнами прямо из памяти, без промежуточных mp3
+    в audio-from-input/ и chunks/. Результаты пишутся в те же файлы
+    raw_text/<совещание>/<совещание>_partNNN.txt, что и в обычном режиме.
+    Возвращает True, если весь файл обработан.
+    """
+    print(f"\n--- Потоковая транскрибация: {meeting_name} ({media_path}) ---")
+    output_meeting_folder = os.path.join(RAW_TEXT_BASE_DIR, meeting_name)
+
+    start_transcription(meeting_name, output_meeting_folder, force_rerun)
+
+    windows = []
+    try:
+        waveform = waveform_cache.open_waveform(meeting_name) if USE_SHARED_WAVEFORM else None
+        if waveform is not None:
+            print(f"Аудио читается из общего файла {waveform_cache.waveform_path(meeting_name)}")
+            windows_source = waveform_windows(waveform)
+        else:
+            windows_source = stream_pcm_windows(media_path)
+        for part_num, window_start, samples in windows_source:
+            duration = len(samples) / SAMPLE_RATE
+            windows.append((part_num, window_start, duration))
+            write_stream_manifest(output_meeting_folder, media_path, windows)
+            print(f"\nОкно {part_num}: {window_start:.2f}s - {window_start + duration:.2f}s")
+            output_filepath = os.path.join(output_meeting_folder, f"{meeting_name}_part{part_num:03d}.txt")
+
+            cache_key = transcription_cache_key(hash_samples(samples),
+                                                decode_params(input="pcm_f32le_16k",
+                                                              **vad_params(meeting_name, window_start)))
+            cached_text = get_cached_transcript(cache_key)
+            if cached_text is not None:
+                write_chunk_result(output_filepath, cached_text)
+                print(f"Результат взят из кэша: {output_filepath}")
+                metrics.record("transcribe", meeting_name, os.path.basename(output_filepath),
+                               audio_seconds=round(duration, 2), bytes_out=metrics.file_size(output_filepath),
+                               cached=True, streaming=True)
+                continue
+
+            start_time = time.time()
+            result = run_asr(pipe, samples, window_start, meeting_name)
+            processing_time = time.time() - start_time
+            print(f"Транскрибация окна завершена за {processing_time:.2f} секунд.")
+
+            store_cached_transcript(cache_key, write_transcript(result, output_filepath))
+            print(f"Результат с временными метками сохранен в: {output_filepath}")
+            metrics.record("transcribe", meeting_name, os.path.basename(output_filepath),
+                           audio_seconds=round(duration, 2), wall_seconds=round(processing_time, 4),
+                           bytes_in=samples.nbytes, bytes_out=metrics.file_size(output_filepath), streaming=True)
+    except Exception as e:
+        print(f"!!! Ошибка потоковой транскрибации {media_path}: {e}")
+        metrics.record("transcribe", meeting_name, error=str(e), streaming=True)
+        finish_transcription(meeting_name, False, str(e))
+        return False
+
+    finish_transcription(meeting_name, True)
+    print(f"\n--- Обработка совещания {meeting_name} завершена! ---")
+    return True
+
+def decode_audio(file_path):
+    """Декодирует аудиофайл в 16 кГц моно float32 через ffmpeg."""
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", file_path,
+           "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-"]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def load_audio(file_path):
+    """
+    Загружает чанк как 16 кГц моно float32. WAV, уже записанный в этом
+    формате (1-extract_audio.py --format wav), читается напрямую без
+    ffmpeg и пересэмплирования; остальные форматы декодируются через ffmpeg.
+    """
+    if file_path.lower().endswith(".wav"):
+        with wave.open(file_path, "rb") as wav:
+            if wav.getnchannels() == 1 and wav.getframerate() == SAMPLE_RATE and wav.getsampwidth() == 2:
+                pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+                return pcm.astype(np.float32) / 32768.0
+    return decode_audio(file_path)
+
+def chunk_audio_input(meeting_name, filename, spans):
+    """
+    Откуда берется аудио чанка: "shared_waveform" - при USE_SHARED_WAVEFORM,
+    если есть общий декодированный файл совещания и известна длительность
+    чанка, иначе "chunk_file". Это разные данные, поэтому значение входит
+    в ключ кэша транскрипций.
+    """
+    if (USE_SHARED_WAVEFORM and chunk_span(spans, filename)[1] is not None
+            and os.path.exists(waveform_cache.waveform_path(meeting_name))):
+        return "shared_waveform"
+    return "chunk_file"
+
+def load_chunk_audio(meeting_name, filename, file_path, spans, source):
+    """
+    Аудио чанка как 16 кГц моно float32 из источника chunk_audio_input():
+    срез общего файла совещания (без копирования и без ffmpeg) или
+    декодированный файл чанка.
+    """
+    if source == "shared_waveform":
+        start, duration = chunk_span(spans, filename)
+        waveform = waveform_cache.open_waveform(meeting_name)
+        if waveform is None:
+            raise FileNotFoundError(f"Общий файл аудио пропал: {waveform_cache.waveform_path(meeting_name)}")
+        return waveform_cache.waveform_slice(waveform, start, duration)
+    return load_audio(file_path)
+
+def collect_pending_chunks(meeting_names, force_rerun=False):
+    """
+    Собирает список (совещание, имя_файла, путь) всех чанков, которые нужно
+    транскрибировать. Без force_rerun уже готовые .txt пропускаются.
+    """
+    items = []
+    for meeting_name in meeting_names:
+        chunks_folder_path = os.path.join(CHUNKS_BASE_DIR, meeting_name)
+        output_meeting_folder = os.path.join(RAW_TEXT_BASE_DIR, meeting_name)
+        if not os.path.isdir(chunks_folder_path):
+            print(f"Ошибка: папка с чанками не найдена: {chunks_folder_path}")
+            continue
+
+        start_transcription(meeting_name, output_meeting_folder, force_rerun)
+        copy_chunk_manifest(meeting_name)
+
+        for filename in sorted(f for f in os.listdir(chunks_folder_path) if f.endswith(AUDIO_EXTENSIONS)):
+            output_filepath = os.path.join(output_meeting_folder, os.path.splitext(filename)[0] + '.txt')
+            if os.path.exists(output_filepath):
+                # Готовые файлы прошлых запусков тоже попадают в каталог
+                catalog.add_artifact(meeting_name, "transcribe", output_filepath)
+                continue
+            items.append((meeting_name, filename, os.path.join(chunks_folder_path, filename)))
+    return items
+
+def transcribe_batched(meeting_names, pipe, batch_size=BATCH_SIZE, force_rerun=False):
+    """
+    Пакетный режим: чанки всех указанных совещаний подаются в пайплайн
+    одним потоком. Пайплайн режет каждый чанк на окна по CHUNK_LENGTH_S
+    секунд и собирает окна из разных чанков (и разных совещаний) в батчи
+    по batch_size, так что один проход модели обрабатывает сразу много
+    окон. Результаты раскладываются обратно в .txt файлы чанков.
+
+    Возвращает статистику: число файлов, секунды аудио, секунды работы
+    и пропускную способность (секунд аудио в секунду).
+    """
+    stats = {"files": 0, "cached": 0, "audio_seconds": 0.0, "wall_seconds": 0.0, "throughput": 0.0, "batch_size": batch_size}
+    items = []
+    spans = {meeting_name: load_chunk_spans(meeting_name) for meeting_name in meeting_names}
+    for meeting_name, filename, file_path in collect_pending_chunks(meeting_names, force_rerun=force_rerun):
+        source = chunk_audio_input(meeting_name, filename, spans[meeting_name])
+        params = decode_params(chunk_length_s=CHUNK_LENGTH_S, input=source,
+                               **vad_params(meeting_name, chunk_offset(spans[meeting_name], filename)))
+        cache_key = transcription_cache_key(hash_file(file_path), params)
+        cached_text = get_cached_transcript(cache_key)
+        if cached_text is not None:
+            output_filepath = os.path.join(RAW_TEXT_BASE_DIR, meeting_name, os.path.splitext(filename)[0] + '.txt')
+            write_chunk_result(output_filepath, cached_text)
+            stats["cached"] += 1
+            metrics.record("transcribe", meeting_name, filename, bytes_in=metrics.file_size(file_path),
+                           bytes_out=metrics.file_size(output_filepath), cached=True, batched=True)
+        else:
+            items.append((meeting_name, filename, file_path, source, cache_key))
+    if stats["cached"]:
+        print(f"Из кэша: {stats['cached']} чанков.")
+
+    if not items:
+        print("Нет чанков для транскрибации.")
+        finish_batched_meetings(meeting_names)
+        return stats
+
+    print(f"\n--- Пакетная транскрибация: {len(items)} чанков, batch_size={batch_size} ---")
+    durations = []
+    time_maps = []
+
+    def inputs():
+        for meeting_name, filename, file_path, source, _ in items:
+            samples = load_chunk_audio(meeting_name, filename, file_path, spans[meeting_name], source)
+            durations.append(len(samples) / SAMPLE_RATE)
+            samples, time_map = apply_vad(samples, chunk_offset(spans[meeting_name], filename), meeting_name)
+            time_maps.append(time_map)
+            if len(samples) == 0:
+                # Пайплайн не принимает пустой вход: секунда тишины дает пустой текст
+                samples = np.zeros(SAMPLE_RATE, dtype=np.float32)
+            yield {"raw": samples, "sampling_rate": SAMPLE_RATE}
+
+    start_time = time.time()
+    results = pipe(
+        inputs(),
+        batch_size=batch_size,
+        chunk_length_s=CHUNK_LENGTH_S,
+        generate_kwargs={"language": LANGUAGE},
+        return_timestamps=timestamps_mode()
+    )
+    # Пайплайн возвращает результаты в порядке входов. Чанки в батче
+    # обрабатываются вместе, поэтому время чанка в метриках - это время
+    # от предыдущего готового результата (в сумме - все время прохода)
+    previous_time = start_time
+    for index, ((meeting_name, filename, file_path, _, cache_key), result) in enumerate(zip(items, results)):
+        result = restore_timestamps(result, time_maps[index])
+        output_filepath = os.path.join(RAW_TEXT_BASE_DIR, meeting_name, os.path.splitext(filename)[0] + '.txt')
+        store_cached_transcript(cache_key, write_transcript(result, output_filepath))
+        stats["files"] += 1
+        print(f"[{stats['files']}/{len(items)}] {meeting_name}/{filename} -> {output_filepath}")
+        now = time.time()
+        metrics.record("transcribe", meeting_name, filename, audio_seconds=round(durations[index], 2),
+                       wall_seconds=round(now - previous_time, 4), bytes_in=metrics.file_size(file_path),
+                       bytes_out=metrics.file_size(output_filepath), batched=True, batch_size=batch_size)
+        previous_time = now
+
+    stats["wall_seconds"] = time.time() - start_time
+    stats["audio_seconds"] = sum(durations)
+    if stats["wall_seconds"] > 0:
+        stats["throughput"] = stats["audio_seconds"] / stats["wall_seconds"]
+    print(f"Обработано {stats['audio_seconds']:.1f} с аудио за {stats['wall_seconds']:.1f} с "
+          f"({stats['throughput']:.2f} с аудио / с, batch_size={batch_size}).")
+    finish_batched_meetings(meeting_names)
+    return stats
+
+def finish_batched_meetings(meeting_names):
+    """Отмечает в каталоге итог совещаний, начатых в collect_pending_chunks()."""
+    for meeting_name in meeting_names:
+        if catalog.stage_status(meeting_name, "transcribe") == catalog.RUNNING:
+            finish_transcription(meeting_name, get_transcription_status(meeting_name) == "Готово")
+
+# --- ДВИЖКИ РАСПОЗНАВАНИЯ ---
+# Каждый движок готовит модель и возвращает (модель, устройство, dtype).
+# Дальше все движки оборачиваются в один и тот же пайплайн transformers,
+# поэтому process_meeting_folder() и формат "[a -> b] текст" не меняются.
+
+def prepare_transformers_model():
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(
+        MODEL_ID, torch_dtype=torch_dtype, low_cpu_mem_usage=True, use_safetensors=True
+    )
+    model.to(device)
+    return model, device, torch_dtype
+
+def prepare_int8_model():
+    """
+    CPU-движок: веса линейных слоев (почти все вычисления Whisper)
+    квантизуются в int8, активации квантизуются на лету.
+    """
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq
+
+    if torch.cuda.is_available():
+        print("Внимание: движок int8 работает только на CPU, GPU использоваться не будет.")
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(
+        MODEL_ID, torch_dtype=torch.float32, low_cpu_mem_usage=True, use_safetensors=True
+    )
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model, "cpu", torch.float32
+
+ASR_BACKENDS = {
+    "transformers": prepare_transformers_model,
+    "int8": prepare_int8_model,
+}
+
+def load_whisper_pipeline():
+    """
+    Загружает модель Whisper выбранным движком (ASR_BACKEND) и создает
+    пайплайн распознавания речи. Если запущен model_server.py, возвращается
+    прокси к уже загруженной на сервере модели.
+    Возвращает пайплайн или None, если загрузка не удалась.
+    """
+    if USE_MODEL_SERVER:
+        remote = model_server.connect_pipeline("asr", backend=ASR_BACKEND, model=MODEL_ID)
+        if remote is not None:
+            return remote
+    print("Инициализация... Загрузка модели Whisper. Это может занять несколько минут.")
+    try:
+        if ASR_BACKEND not in ASR_BACKENDS:
+            raise ValueError(f"неизвестный движок '{ASR_BACKEND}', доступны: {', '.join(ASR_BACKENDS)}")
+        model, device, torch_dtype = ASR_BACKENDS[ASR_BACKEND]()
+        from transformers import AutoProcessor, pipeline
 
         processor = AutoProcessor.from_pretrained(MODEL_ID)
 
@@ -154,12 +897,64 @@ def main():
             feature_extractor=processor.feature_extractor,
             torch_dtype=torch_dtype,
             device=device,
-            batch_size=16, # Ускоряет обработку, если передавать несколько файлов сразу, но мы обрабатываем по одному
+            batch_size=BATCH_SIZE, # Работает в пакетном режиме (transcribe_batched); при обработке по одному файлу не влияет
         )
-        print(f"Модель {MODEL_ID} успешно загружена на устройство: {device}")
+        print(f"Модель {MODEL_ID} ({ASR_BACKEND}) успешно загружена на устройство: {device}")
+        return pipe
     except Exception as e:
         print(f"Не удалось загрузить модель или создать пайплайн: {e}")
         print("Проверьте интернет-соединение, имя модели и установленные библиотеки.")
+        return None
+
+
+def main():
+    """
+    Главная функция: загружает модель и запускает интерактивное меню
+    для выбора папок и управления процессом транскрибации.
+    """
+    global USE_TRANSCRIPTION_CACHE, USE_SHARED_WAVEFORM, ASR_BACKEND, VAD_MODE, WORD_TIMESTAMPS
+
+    parser = argparse.ArgumentParser(description="Локальная транскрибация Whisper")
+    parser.add_argument("--stream", nargs="+", metavar="MEDIA",
+                        help="транскрибировать видео/аудиофайлы напрямую, без промежуточных mp3 и чанков")
+    parser.add_argument("--batch", nargs="+", metavar="MEETING",
+                        help="пакетная транскрибация чанков указанных совещаний ('all' - всех) без меню")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"число окен по {CHUNK_LENGTH_S} с в одном проходе модели (по умолчанию {BATCH_SIZE})")
+    parser.add_argument("--force", action="store_true", help="перезаписать уже готовые .txt в пакетном режиме")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш транскрипций")
+    parser.add_argument("--shared-waveform", action="store_true",
+                        help="читать аудио срезами из общего waveforms/<совещание>.npy, если он есть")
+    parser.add_argument("--vad", choices=["energy", "rttm"], default=VAD_MODE,
+                        help="вырезать тишину перед распознаванием: по энергии или по RTTM диаризации")
+    parser.add_argument("--backend", choices=list(ASR_BACKENDS), default=ASR_BACKEND,
+                        help=f"движок распознавания (по умолчанию {ASR_BACKEND}; int8 - быстрее на CPU)")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="метки времени по словам (для атрибуции спикеров по словам в 4.5)")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        USE_TRANSCRIPTION_CACHE = False
+    USE_SHARED_WAVEFORM = args.shared_waveform
+    ASR_BACKEND = args.backend
+    VAD_MODE = args.vad
+    WORD_TIMESTAMPS = args.word_timestamps or WORD_TIMESTAMPS
+
+    # --- ЗАГРУЗКА МОДЕЛИ И ПАЙПЛАЙНА (выполняется один раз) ---
+    pipe = load_whisper_pipeline()
+    if pipe is None:
+        return
+
+    if args.stream:
+        failed = False
+        for media_path in args.stream:
+            meeting_name = os.path.splitext(os.path.basename(media_path))[0]
+            failed |= not transcribe_stream(meeting_name, media_path, pipe, force_rerun=True)
+        sys.exit(1 if failed else 0)
+
+    if args.batch:
+        meeting_names = get_meeting_folders(CHUNKS_BASE_DIR) if args.batch == ["all"] else args.batch
+        transcribe_batched(meeting_names, pipe, batch_size=args.batch_size, force_rerun=args.force)
         return
 
     # --- ГЛАВНЫЙ ЦИКЛ РАБОТЫ С ПОЛЬЗОВАТЕЛЕМ ---
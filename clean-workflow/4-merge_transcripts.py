@@ -1,4 +1,12 @@
 import os
+import re
+import time
+import json
+import hashlib
+import itertools
+
+import catalog
+import metrics
 
 # --- НАСТРОЙКИ ---
 # Папка, где лежат папки с текстовыми файлами транскрипций
@@ -7,10 +15,32 @@ RAW_TEXT_BASE_DIR = "raw_text"
 # Имя, которое будет дано итоговому объединенному файлу
 MERGED_FILENAME = "_full_transcript.txt"
 
-# Длительность каждого аудио-чанка в минутах.
+# Структурированная временная шкала (одна строка JSON на сегмент)
+TIMELINE_FILENAME = "_timeline.jsonl"
+
+# Дополнительные форматы, которые пишутся в том же проходе, что и итоговый
+# файл: _full_transcript.srt, _full_transcript.vtt, _full_transcript.json
+EXPORT_FORMATS = ("srt", "vtt", "json")
+
+# Слова с метками времени, которые 3-transcribe_local_batch.py --word-timestamps
+# пишет рядом с .txt чанка; попадают в сегменты временной шкалы как "words"
+WORDS_SUFFIX = ".words.jsonl"
+
+# Манифест с точными смещениями чанков (пишут 2-split_audio.py и потоковый
+# режим 3-transcribe_local_batch.py); ищется в raw_text/<совещание>, затем в chunks/<совещание>
+CHUNKS_BASE_DIR = "chunks"
+MANIFEST_FILENAME = "_chunks.json"
+
+# Длительность каждого аудио-чанка в минутах и перекрытие между чанками
+# (должны совпадать с настройками 2-split_audio.py). Используются, только
+# если манифеста нет.
 CHUNK_DURATION_MINUTES = 10
+OVERLAP_SECONDS = 10
 # --- КОНЕЦ НАСТРОЕК ---
 
+# Строка сегмента, которую пишет 3-transcribe_local_batch.py: "[12.34 -> 15.60] текст"
+SEGMENT_RE = re.compile(r'^\[(\d+(?:\.\d+)?) -> (\d+(?:\.\d+)?)\]\s*(.*)$')
+
 
 def get_meeting_folders(directory):
     """Находит папки совещаний в директории с результатами транскрибации."""
@@ -24,69 +54,448 @@ def get_meeting_folders(directory):
     return sorted(folders)
 
 def has_merged_file(meeting_folder_path):
-    """Проверяет, существует ли уже объединенный файл."""
-    return os.path.exists(os.path.join(meeting_folder_path, MERGED_FILENAME))
+    """
+    Проверяет, существует ли уже объединенный файл. Если совещание есть в
+    каталоге, файл прерванной сборки не считается готовым.
+    """
+    exists = os.path.exists(os.path.join(meeting_folder_path, MERGED_FILENAME))
+    status = catalog.stage_status(os.path.basename(os.path.normpath(meeting_folder_path)), "merge")
+    return exists if status is None else exists and status == catalog.DONE
 
 def format_seconds_to_hhmmss(seconds):
     """Конвертирует секунды в строку формата HH:MM:SS."""
+    seconds = int(seconds)
     hh = seconds // 3600
     mm = (seconds % 3600) // 60
     ss = seconds % 60
     return f"{hh:02}:{mm:02}:{ss:02}"
 
-def merge_text_files_for_meeting(meeting_name):
+def parse_chunk_segments(file_path):
+    """
+    Читает .txt файл чанка построчно и выдает (начало, конец, текст) с
+    временем относительно начала чанка. Строки без временных меток
+    (например, если модель вернула только текст) получают время None.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            match = SEGMENT_RE.match(line)
+            if match:
+                yield float(match.group(1)), float(match.group(2)), match.group(3).strip()
+            else:
+                yield None, None, line
+
+def get_chunk_offsets(num_parts):
+    """Смещения начала чанков в секундах при фиксированной нарезке 2-split_audio.py."""
+    step = CHUNK_DURATION_MINUTES * 60 - OVERLAP_SECONDS
+    return [i * step for i in range(num_parts)]
+
+def load_chunk_manifest(meeting_name):
+    """Манифест чанков совещания или None, если его нет."""
+    for base_dir in (RAW_TEXT_BASE_DIR, CHUNKS_BASE_DIR):
+        manifest_path = os.path.join(base_dir, meeting_name, MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    return None
+
+def get_chunk_spans(meeting_name, txt_files):
+    """
+    Начало и конец каждого чанка во времени совещания. Берутся из каталога
+    или манифеста, а если их нет (или они не описывают все файлы) - из
+    фиксированной нарезки.
+    """
+    names = [os.path.splitext(f)[0] for f in txt_files]
+    chunks = catalog.get_chunks(meeting_name)
+    manifest = load_chunk_manifest(meeting_name) if chunks is None else None
+    if manifest is not None:
+        chunks = manifest["chunks"]
+    if chunks is not None:
+        by_name = {os.path.splitext(chunk["file"])[0]: chunk for chunk in chunks}
+        if all(name in by_name for name in names):
+            return [(by_name[name]["start"], by_name[name]["start"] + by_name[name]["duration"]) for name in names]
+        print(f"Внимание: манифест '{MANIFEST_FILENAME}' не совпадает с файлами, используются фиксированные смещения.")
+    chunk_seconds = CHUNK_DURATION_MINUTES * 60
+    return [(offset, offset + chunk_seconds) for offset in get_chunk_offsets(len(txt_files))]
+
+def normalize_text(text):
+    """Нормализует текст для сравнения дубликатов: без регистра и пунктуации."""
+    return " ".join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+def same_speech(a, b, window):
+    """
+    Один и тот же фрагмент речи в двух соседних чанках: тот же текст с
+    началом не дальше window секунд или пересечение по времени не меньше
+    половины более короткого из сегментов.
+    """
+    if abs(a["start"] - b["start"]) < window and normalize_text(a["text"]) == normalize_text(b["text"]):
+        return True
+    shared = min(a["end"], b["end"]) - max(a["start"], b["start"])
+    return shared > 0 and shared >= min(a["end"] - a["start"], b["end"] - b["start"]) / 2
+
+def read_chunk_head(file_path, offset, until):
+    """Сегменты чанка с метками времени, начавшиеся (в абсолютном времени) до until."""
+    head = []
+    for start, end, text in parse_chunk_segments(file_path):
+        if start is None:
+            continue
+        if offset + start >= until:
+            break
+        head.append({"start": round(offset + start, 2), "end": round(offset + end, 2), "text": text})
+    return head
+
+def iter_line_words(words_path):
+    """Слова чанка из .words.jsonl, по строкам транскрипта: пары (номер строки, [(начало, конец, текст)])."""
+    with open(words_path, 'r', encoding='utf-8') as f:
+        words = (json.loads(line) for line in f if line.strip())
+        for seg, group in itertools.groupby(words, key=lambda word: word["seg"]):
+            yield seg, [(word["start"], word["end"], word["text"]) for word in group]
+
+def take_line_words(line_words, pending, line_index):
+    """
+    Слова строки line_index из iter_line_words(). pending - группа, уже
+    прочитанная для более поздней строки. Возвращает (слова, pending).
+    """
+    while True:
+        if pending is None:
+            pending = next(line_words, (float("inf"), []))
+        if pending[0] < line_index:
+            pending = None
+        elif pending[0] == line_index:
+            return pending[1], None
+        else:
+            return [], pending
+
+def iter_timeline(meeting_folder_path, txt_files, spans=None):
+    """
+    Единая временная шкала совещания из .txt файлов чанков, по одному
+    сегменту за раз.
+
+    Время сегментов переводится в абсолютное время совещания по реальным
+    смещениям чанков (spans - список (начало, конец) из get_chunk_spans;
+    по умолчанию фиксированная нарезка). Каждое перекрытие делится пополам,
+    но сегмент отбрасывается, только если соседний чанк записал тот же
+    фрагмент речи (same_speech): каждый чанк оценивает время сам, и
+    сегмент у середины может оказаться "чужим" для обоих чанков. Сегменты
+    предыдущего чанка после середины перекрытия записываются, если
+    следующий чанк не записывает их сам (его начало читается заранее, до
+    конца перекрытия); сегменты следующего чанка - если их нет среди уже
+    записанных из предыдущего. Чанки, нарезанные по паузам без перекрытия,
+    склеиваются так же.
+
+    Выдает пары (часть, сегмент), а после последнего сегмента части -
+    (часть, None); к этому моменту у части заполнен "end". Часть -
+    {"part", "source", "start", "end"}. В памяти держится только текущая
+    строка и сегменты у границы текущего перекрытия, так что длина
+    совещания на память не влияет.
+
+    Если у чанка есть .words.jsonl, сегмент получает "words" - список
+    [начало, конец, текст] в абсолютном времени; слова отброшенных
+    сегментов отбрасываются вместе с ними.
+    """
+    if spans is None:
+        chunk_seconds = CHUNK_DURATION_MINUTES * 60
+        spans = [(offset, offset + chunk_seconds) for offset in get_chunk_offsets(len(txt_files))]
+    offsets = [start for start, _ in spans]
+    overlaps = [max(0.0, spans[i][1] - spans[i + 1][0]) for i in range(len(spans) - 1)]
+    # Границы "владения" между соседними чанками - середины перекрытий
+    boundaries = [offsets[i + 1] + overlaps[i] / 2 for i in range(len(txt_files) - 1)]
+
+    # Записанные сегменты предыдущего чанка у его конца
+    previous = []
+    for i, filename in enumerate(txt_files):
+        lower = boundaries[i - 1] if i > 0 else 0.0
+        upper = boundaries[i] if i < len(boundaries) else None
+        # Дубликаты ищутся только на расстоянии перекрытия с соседом
+        window_before = overlaps[i - 1] if i > 0 else 0.0
+        window_after = overlaps[i] if upper is not None else 0.0
+        # Сегменты до next_start + window_after понадобятся следующему чанку
+        next_start = offsets[i + 1] if upper is not None else None
+        previous_until = max((segment["end"] for segment in previous), default=0.0) + window_before
+        part = {"part": i + 1, "source": filename, "start": lower, "end": None}
+        last_end = None
+        recent = []
+        tail = []
+        words_path = os.path.join(meeting_folder_path, os.path.splitext(filename)[0] + WORDS_SUFFIX)
+        line_words = iter_line_words(words_path) if os.path.exists(words_path) else None
+        pending_words = None
+        line_index = -1
+
+        for start, end, text in parse_chunk_segments(os.path.join(meeting_folder_path, filename)):
+            if start is None:
+                yield part, {"start": None, "end": None, "text": text}
+                continue
+            line_index += 1
+            if line_words is not None:
+                words, pending_words = take_line_words(line_words, pending_words, line_index)
+            abs_start = offsets[i] + start
+            abs_end = offsets[i] + end
+            segment = {"start": round(abs_start, 2), "end": round(abs_end, 2), "text": text}
+            if line_words is not None:
+                segment["words"] = [[round(offsets[i] + word_start, 2), round(offsets[i] + word_end, 2), word]
+                                    for word_start, word_end, word in words]
+            # Тот же фрагмент, уже записанный из предыдущего чанка в зоне перекрытия
+            if abs_start < previous_until and any(same_speech(segment, other, window_before) for other in previous):
+                continue
+            # После середины перекрытия: решается, когда известно начало следующего чанка
+            if upper is not None and abs_start >= upper:
+                tail.append(segment)
+                continue
+            if next_start is not None and segment["end"] > next_start - window_after:
+                recent.append(segment)
+            last_end = segment["end"] if last_end is None else max(last_end, segment["end"])
+            yield part, segment
+
+        if line_words is not None:
+            line_words.close()
+        if tail:
+            following = read_chunk_head(os.path.join(meeting_folder_path, txt_files[i + 1]), offsets[i + 1],
+                                        max(segment["end"] for segment in tail) + window_after)
+            for segment in tail:
+                # Следующий чанк запишет свой сегмент, если его нет среди записанных отсюда
+                if any(same_speech(segment, other, window_after) for other in following
+                       if not any(same_speech(other, kept, window_after) for kept in recent)):
+                    continue
+                recent.append(segment)
+                last_end = segment["end"] if last_end is None else max(last_end, segment["end"])
+                yield part, segment
+        previous = recent
+        if upper is not None:
+            part["end"] = upper
+        else:
+            part["end"] = last_end if last_end is not None else lower
+        yield part, None
+
+# --- ВЫХОДНЫЕ ФОРМАТЫ ---
+# Каждый формат получает сегменты по мере сборки и сразу пишет их во
+# временный файл; commit() публикует файл целиком (os.replace), так что
+# прерванная сборка не оставляет полузаписанных результатов. SHA-256 и
+# размер считаются по ходу записи, повторно файлы не читаются.
+
+def format_subtitle_time(seconds, separator):
+    """Секунды в "HH:MM:SS,mmm" (SRT) или "HH:MM:SS.mmm" (WebVTT)."""
+    milliseconds = int(round(seconds * 1000))
+    hh, milliseconds = divmod(milliseconds, 3600000)
+    mm, milliseconds = divmod(milliseconds, 60000)
+    ss, milliseconds = divmod(milliseconds, 1000)
+    return f"{hh:02}:{mm:02}:{ss:02}{separator}{milliseconds:03}"
+
+class ExportWriter:
+    """Один выходной файл сборки."""
+
+    def __init__(self, path, meeting_name):
+        self.path = path
+        self.meeting_name = meeting_name
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file = open(path + ".tmp", 'wb')
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.digest.update(data)
+        self.size += len(data)
+        self.file.write(data)
+
+    def segment(self, part, segment):
+        pass
+
+    def part_end(self, part):
+        pass
+
+    def finish(self):
+        pass
+
+    def commit(self):
+        self.finish()
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+class TextWriter(ExportWriter):
+    """_full_transcript.txt: строки "[a -> b] текст" и метаданные после каждой части."""
+
+    def __init__(self, path, meeting_name):
+        super().__init__(path, meeting_name)
+        self.separator = ""
+        self.part_started = False
+
+    def segment(self, part, segment):
+        if segment["start"] is None:
+            line = segment["text"]
+        else:
+            line = f"[{segment['start']:.2f} -> {segment['end']:.2f}] {segment['text']}"
+        self.write(("\n" if self.part_started else self.separator) + line)
+        self.part_started = True
+
+    def part_end(self, part):
+        # Добавляем метаданные с реальным временем части
+        start_time_str = format_seconds_to_hhmmss(part["start"])
+        end_time_str = format_seconds_to_hhmmss(part["end"])
+        metadata_line = f"\n\n--- Конец Части-{part['part']}, Время: {start_time_str} - {end_time_str} ---"
+        self.write(("" if self.part_started else self.separator) + metadata_line)
+        # Пустые строки для разделения перед следующей частью
+        self.separator = "\n\n"
+        self.part_started = False
+
+class TimelineWriter(ExportWriter):
+    """_timeline.jsonl: одна строка JSON на сегмент."""
+
+    def segment(self, part, segment):
+        record = {"part": part["part"], "source": part["source"], **segment}
+        self.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+class SubtitleWriter(ExportWriter):
+    """
+    Субтитры SRT; сегменты без меток времени или без текста в них не
+    попадают (блок без строки текста часть плееров не принимает).
+    """
+    header = ""
+    time_separator = ","
+    numbered = True
+
+    def __init__(self, path, meeting_name):
+        super().__init__(path, meeting_name)
+        self.cues = 0
+        self.write(self.header)
+
+    def cue_text(self, text):
+        return text
+
+    def segment(self, part, segment):
+        text = segment["text"].strip()
+        if segment["start"] is None or not text:
+            return
+        self.cues += 1
+        start = format_subtitle_time(segment["start"], self.time_separator)
+        end = format_subtitle_time(max(segment["end"], segment["start"]), self.time_separator)
+        number = f"{self.cues}\n" if self.numbered else ""
+        self.write(f"{number}{start} --> {end}\n{self.cue_text(text)}\n\n")
+
+class VttWriter(SubtitleWriter):
+    """Субтитры WebVTT."""
+    header = "WEBVTT\n\n"
+    time_separator = "."
+    numbered = False
+
+    def cue_text(self, text):
+        # "&" и "<" в тексте реплики - разметка WebVTT, "-->" - разделитель времени
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+class JsonWriter(ExportWriter):
+    """
+    Один JSON-документ: {"meeting", "segments": [...], "parts": [...]}.
+    Сегменты пишутся по одному, в памяти копятся только границы частей.
+    """
+
+    def __init__(self, path, meeting_name):
+        super().__init__(path, meeting_name)
+        self.parts = []
+        self.count = 0
+        self.write('{"meeting": ' + json.dumps(meeting_name, ensure_ascii=False) + ', "segments": [')
+
+    def segment(self, part, segment):
+        record = {"part": part["part"], **segment}
+        self.write(("," if self.count else "") + "\n  " + json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def part_end(self, part):
+        self.parts.append(dict(part))
+
+    def finish(self):
+        self.write("\n], \"parts\": " + json.dumps(self.parts, ensure_ascii=False) + "}\n")
+
+EXPORT_WRITERS = {"srt": SubtitleWriter, "vtt": VttWriter, "json": JsonWriter}
+
+def export_path(meeting_folder_path, fmt):
+    """Путь файла экспорта: _full_transcript.<формат>."""
+    return os.path.join(meeting_folder_path, os.path.splitext(MERGED_FILENAME)[0] + "." + fmt)
+
+def merge_text_files_for_meeting(meeting_name, formats=None, on_part=None):
     """
     Собирает все .txt файлы из папки совещания в один итоговый файл,
-    добавляя метаданные после каждого фрагмента.
+    добавляя метаданные после каждого фрагмента. Рядом сохраняются
+    структурированная временная шкала в формате JSONL и экспорт в
+    форматах EXPORT_FORMATS (или formats).
+
+    Все файлы пишутся за один проход: сегменты читаются из чанков по
+    одному и сразу уходят во все форматы. on_part(часть) вызывается после
+    каждой собранной части. Возвращает список записанных файлов или None.
     """
+    formats = EXPORT_FORMATS if formats is None else formats
     meeting_folder_path = os.path.join(RAW_TEXT_BASE_DIR, meeting_name)
     output_file_path = os.path.join(meeting_folder_path, MERGED_FILENAME)
+    timeline_file_path = os.path.join(meeting_folder_path, TIMELINE_FILENAME)
 
     print(f"\n--- Начинаю сборку транскрипции для: {meeting_name} ---")
 
     try:
-        txt_files = [f for f in os.listdir(meeting_folder_path) if f.endswith('.txt') and f != MERGED_FILENAME]
+        # Служебные файлы (_full_transcript.txt, _diarized_transcript.txt) начинаются с "_"
+        txt_files = [f for f in os.listdir(meeting_folder_path) if f.endswith('.txt') and not f.startswith('_')]
         txt_files.sort()
     except FileNotFoundError:
         print(f"Ошибка: Папка {meeting_folder_path} не найдена.")
-        return
+        return None
 
     if not txt_files:
         print("В папке не найдено .txt файлов для объединения.")
-        return
+        return None
+
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_WRITERS]
+    if unknown:
+        print(f"Ошибка: неизвестные форматы экспорта: {', '.join(unknown)}")
+        return None
 
     print(f"Найдено {len(txt_files)} файлов для объединения.")
-    
-    chunk_duration_seconds = CHUNK_DURATION_MINUTES * 60
 
+    event = {"bytes_in": sum(os.path.getsize(os.path.join(meeting_folder_path, f)) for f in txt_files)}
+    catalog.set_stage(meeting_name, "merge", catalog.RUNNING)
+    started = time.perf_counter()
+    writers = []
     try:
-        with open(output_file_path, 'w', encoding='utf-8') as outfile:
-            for i, filename in enumerate(txt_files):
-                file_path = os.path.join(meeting_folder_path, filename)
-                
-                with open(file_path, 'r', encoding='utf-8') as infile:
-                    content = infile.read().strip() # .strip() убирает лишние пустые строки в конце
-                    outfile.write(content)
-                
-                # Вычисляем и добавляем метаданные
-                part_num = i + 1
-                start_seconds = i * chunk_duration_seconds
-                end_seconds = part_num * chunk_duration_seconds
-                
-                start_time_str = format_seconds_to_hhmmss(start_seconds)
-                end_time_str = format_seconds_to_hhmmss(end_seconds)
+        writers.append(TextWriter(output_file_path, meeting_name))
+        writers.append(TimelineWriter(timeline_file_path, meeting_name))
+        for fmt in formats:
+            writers.append(EXPORT_WRITERS[fmt](export_path(meeting_folder_path, fmt), meeting_name))
 
-                metadata_line = f"\n\n--- Конец Части-{part_num}, Время: {start_time_str} - {end_time_str} ---"
-                outfile.write(metadata_line)
-                
-                # Добавляем пустые строки для разделения перед следующей частью
-                if i < len(txt_files) - 1:
-                    outfile.write("\n\n")
-        
+        spans = get_chunk_spans(meeting_name, txt_files)
+        for part, segment in iter_timeline(meeting_folder_path, txt_files, spans):
+            if segment is None:
+                for writer in writers:
+                    writer.part_end(part)
+                event["audio_seconds"] = round(part["end"], 2)
+                if on_part is not None:
+                    on_part(part)
+            else:
+                for writer in writers:
+                    writer.segment(part, segment)
+
+        for writer in writers:
+            writer.commit()
         print(f"Успешно! Все части собраны в один файл: {output_file_path}")
+        print(f"Временная шкала сохранена в: {timeline_file_path}")
+        if formats:
+            print(f"Экспорт: {', '.join(os.path.basename(writer.path) for writer in writers[2:])}")
+        event["bytes_out"] = sum(writer.size for writer in writers)
+        for writer in writers:
+            catalog.add_artifact(meeting_name, "merge", writer.path, sha256=writer.digest.hexdigest())
 
     except Exception as e:
         print(f"Произошла ошибка во время сборки файлов: {e}")
+        event["error"] = str(e)
+        for writer in writers:
+            writer.discard()
+    wall_seconds = round(time.perf_counter() - started, 4)
+    catalog.set_stage(meeting_name, "merge", catalog.FAILED if event.get("error") else catalog.DONE,
+                      wall_seconds=wall_seconds, error=event.get("error"))
+    metrics.record("merge", meeting_name, wall_seconds=wall_seconds, parts=len(txt_files),
+                   formats=list(formats), **event)
+    return None if event.get("error") else [writer.path for writer in writers]
 
 
 def main():
@@ -1,5 +1,15 @@
 import os
 import re
+import json
+import time
+import bisect
+
+import rttm
+import catalog
+import metrics
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
 
 # --- НАСТРОЙКИ ---
 # Папка с результатами диаризации (.rttm файлы)
@@ -8,70 +18,335 @@ DIARIZATION_DIR = "../diarization/diarization_results"
 RAW_TEXT_DIR = "raw_text"
 # Имя объединенного файла транскрипта
 MERGED_FILENAME = "_full_transcript.txt"
+# Структурированная временная шкала, которую пишет 4-merge_transcripts.py
+TIMELINE_FILENAME = "_timeline.jsonl"
 # Имя файла с применной диаризацией
 DIARIZED_FILENAME = "_diarized_transcript.txt"
-# Длительность каждого аудио-чанка в минутах
-CHUNK_DURATION_MINUTES = 10
+# Реплики с временем и спикерами (одна строка JSON на реплику)
+UTTERANCES_FILENAME = "_diarized_utterances.jsonl"
+# Как назначать спикеров:
+#   "auto"     - по словам, если во временной шкале есть их метки
+#                (3-transcribe_local_batch.py --word-timestamps), иначе как "midpoint";
+#   "overlap"  - по наибольшему перекрытию с репликами: слов, а без них - целых сегментов;
+#   "midpoint" - спикер, говорящий в середине сегмента Whisper (прежнее правило)
+ATTRIBUTION_MODE = "auto"
+# Слово вне реплик получает ближайшего спикера, если его реплика не дальше (секунд)
+ATTRIBUTION_MAX_GAP_S = 0.5
+# Одновременная речь: второй спикер перекрывает не меньше этой доли слова...
+OVERLAP_MIN_SHARE = 0.5
+# ...и вместе они говорят не меньше стольких секунд подряд
+OVERLAP_MIN_S = 0.5
 # --- КОНЕЦ НАСТРОЕК ---
 
+UNKNOWN_SPEAKER = "UNKNOWN_SPEAKER"
+# Строка сегмента в объединенном транскрипте: "[12.34 -> 15.60] текст"
+SEGMENT_RE = re.compile(r'^\[(\d+(?:\.\d+)?) -> (\d+(?:\.\d+)?)\]\s*(.*)$')
+PART_END_RE = re.compile(r'^--- Конец Части-(\d+)')
+
 
 def parse_rttm_file(rttm_path):
     """
-    Парсит RTTM файл и возвращает список сегментов с информацией о спикерах.
+    Загружает RTTM файл в колонки NumPy (rttm.SpeakerTurns): начала, концы
+    и коды спикеров, отсортированные по началу. Повторная загрузка берет
+    кэш .npz рядом с файлом. При ошибке возвращает пустой набор реплик.
     Формат RTTM: SPEAKER file_id channel start_time duration conf1 conf2 speaker_id conf3 conf4
     """
-    segments = []
     try:
-        with open(rttm_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('SPEAKER'):
-                    parts = line.split()
-                    if len(parts) >= 8:
-                        start_time = float(parts[3])
-                        duration = float(parts[4])
-                        end_time = start_time + duration
-                        speaker_id = parts[7]
-                        
-                        segments.append({
-                            'start': start_time,
-                            'end': end_time,
-                            'speaker': speaker_id
-                        })
-        
-        # Сортируем сегменты по времени начала
-        segments.sort(key=lambda x: x['start'])
-        return segments
-    
+        return rttm.load_rttm(rttm_path)
     except FileNotFoundError:
         print(f"Файл диаризации не найден: {rttm_path}")
-        return []
     except Exception as e:
         print(f"Ошибка при чтении RTTM файла {rttm_path}: {e}")
-        return []
+    return rttm.SpeakerTurns.from_segments([])
 
 
-def get_speaker_at_time(segments, time_seconds):
+def build_speaker_index(turns):
     """
-    Определяет, какой спикер говорит в указанное время.
+    Строит индекс по отсортированным репликам диаризации (rttm.SpeakerTurns):
+    начала, концы, спикеры и накопленный максимум концов. Накопленный
+    максимум позволяет находить все сегменты, покрывающие момент времени,
+    не просматривая весь список, даже если реплики спикеров перекрываются.
     """
-    for segment in segments:
-        if segment['start'] <= time_seconds <= segment['end']:
-            return segment['speaker']
-    return "UNKNOWN_SPEAKER"
+    max_ends = np.maximum.accumulate(turns.ends) if len(turns) else turns.ends
+    return {
+        'starts': turns.starts.tolist(),
+        'ends': turns.ends.tolist(),
+        'max_ends': max_ends.tolist(),
+        'speakers': turns.speaker_labels(),
+    }
+
+
+def _speaker_covering(index, last, time_seconds):
+    """
+    Ищет спикера среди сегментов [0..last] (все они начались не позже
+    time_seconds). Идем назад, пока накопленный максимум концов еще
+    достает до time_seconds; из покрывающих берется самый ранний сегмент,
+    как и при линейном просмотре.
+    """
+    speaker = UNKNOWN_SPEAKER
+    j = last
+    while j >= 0 and index['max_ends'][j] >= time_seconds:
+        if index['ends'][j] >= time_seconds:
+            speaker = index['speakers'][j]
+        j -= 1
+    return speaker
+
+
+def get_speaker_at_time(index, time_seconds):
+    """
+    Определяет, какой спикер говорит в указанное время (поиск делением пополам).
+    """
+    return _speaker_covering(index, bisect.bisect_right(index['starts'], time_seconds) - 1, time_seconds)
+
+
+def assign_speakers(index, times):
+    """
+    Определяет спикеров для отсортированной по возрастанию последовательности
+    моментов времени за один совместный проход (sweep-line). Указатель по
+    началам сегментов движется только вперед, а список активных сегментов
+    содержит лишь реплики, которые еще не закончились, поэтому сложность
+    O(сегменты + моменты × число одновременных реплик).
+    """
+    starts, ends, speaker_ids = index['starts'], index['ends'], index['speakers']
+    speakers = []
+    active = []
+    next_segment = 0
+    for time_seconds in times:
+        while next_segment < len(starts) and starts[next_segment] <= time_seconds:
+            active.append(next_segment)
+            next_segment += 1
+        # Моменты идут по возрастанию, так что закончившиеся реплики больше не нужны
+        active = [j for j in active if ends[j] >= time_seconds]
+        # Как и при линейном просмотре, берем самый ранний покрывающий сегмент
+        speakers.append(speaker_ids[active[0]] if active else UNKNOWN_SPEAKER)
+    return speakers
 
 
 def format_seconds_to_hhmmss(seconds):
     """Конвертирует секунды в строку формата HH:MM:SS."""
+    seconds = int(seconds)
     hh = seconds // 3600
     mm = (seconds % 3600) // 60
     ss = seconds % 60
     return f"{hh:02}:{mm:02}:{ss:02}"
 
 
+def load_timeline(meeting_name):
+    """
+    Загружает сегменты транскрипта с абсолютным временем:
+    список {"part", "start", "end", "text"}. Берет _timeline.jsonl,
+    а если его нет - разбирает строки "[a -> b] текст" объединенного файла.
+    """
+    timeline_path = os.path.join(RAW_TEXT_DIR, meeting_name, TIMELINE_FILENAME)
+    if os.path.exists(timeline_path):
+        with open(timeline_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    transcript_path = os.path.join(RAW_TEXT_DIR, meeting_name, MERGED_FILENAME)
+    timeline = []
+    part_num = 1
+    with open(transcript_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            part_end = PART_END_RE.match(line)
+            if part_end:
+                part_num = int(part_end.group(1)) + 1
+                continue
+            match = SEGMENT_RE.match(line)
+            if match:
+                timeline.append({"part": part_num, "start": float(match.group(1)),
+                                 "end": float(match.group(2)), "text": match.group(3).strip()})
+            else:
+                timeline.append({"part": part_num, "start": None, "end": None, "text": line})
+    return timeline
+
+
+def attribution_units(timeline, use_words):
+    """
+    Единицы атрибуции в порядке временной шкалы: слова сегментов (если
+    use_words и у сегмента есть "words") или сегменты целиком. Возвращает
+    массивы частей, начал и концов (NaN - без метки времени) и список текстов.
+    """
+    parts, starts, ends, texts = [], [], [], []
+    for seg in timeline:
+        words = seg.get('words') if use_words else None
+        if words:
+            for word_start, word_end, text in words:
+                parts.append(seg['part'])
+                starts.append(word_start)
+                ends.append(word_end)
+                texts.append(text)
+        else:
+            parts.append(seg['part'])
+            starts.append(seg['start'])
+            ends.append(seg['end'])
+            texts.append(seg['text'])
+    # None (строка без меток времени) превращается в NaN
+    return (np.asarray(parts, dtype=np.int64), np.asarray(starts, dtype=np.float64),
+            np.asarray(ends, dtype=np.float64), texts)
+
+
+def attribute_by_midpoint(turns, starts, ends):
+    """
+    Прежнее правило: спикер реплики, покрывающей середину интервала
+    (assign_speakers по интервалам в порядке начала). Возвращает коды
+    спикеров (-1 - никто не говорит) и коды второго спикера (всегда -1).
+    """
+    order = np.argsort(starts, kind="stable")
+    midpoints = ((starts + ends) / 2)[order]
+    codes = {label: code for code, label in enumerate(turns.labels)}
+    speakers = np.full(len(starts), -1, dtype=np.int64)
+    speakers[order] = [codes.get(speaker, -1)
+                       for speaker in assign_speakers(build_speaker_index(turns), midpoints.tolist())]
+    return speakers, np.full(len(starts), -1, dtype=np.int64)
+
+
+def attribute_by_overlap(turns, starts, ends):
+    """
+    Спикер каждого интервала - тот, чьи реплики перекрывают его дольше всех;
+    перекрытия со всеми спикерами считаются сразу для всех интервалов
+    (rttm.speaker_overlaps). Интервал вне реплик (или нулевой длины)
+    получает ближайшего спикера, если тот не дальше ATTRIBUTION_MAX_GAP_S.
+    Второй по перекрытию спикер, занимающий не меньше OVERLAP_MIN_SHARE
+    интервала, отмечается как одновременная речь.
+    Возвращает коды спикеров и вторых спикеров (-1 - нет).
+    """
+    n = len(starts)
+    speakers = np.full(n, -1, dtype=np.int64)
+    co_speakers = np.full(n, -1, dtype=np.int64)
+    if n == 0 or len(turns) == 0:
+        return speakers, co_speakers
+    ends = np.maximum(ends, starts)
+    overlaps = rttm.speaker_overlaps(turns, starts, ends)
+    rows = np.arange(n)
+    speakers[:] = overlaps.argmax(axis=1)
+    best = overlaps[rows, speakers]
+
+    outside = best <= 0
+    if outside.any():
+        distances = rttm.speaker_distances(turns, (starts[outside] + ends[outside]) / 2)
+        nearest = distances.argmin(axis=1)
+        close = distances[np.arange(len(nearest)), nearest] <= ATTRIBUTION_MAX_GAP_S
+        speakers[outside] = np.where(close, nearest, -1)
+
+    if overlaps.shape[1] > 1:
+        overlaps[rows, overlaps.argmax(axis=1)] = -np.inf
+        second = overlaps.argmax(axis=1)
+        second_overlap = overlaps[rows, second]
+        together = ~outside & (second_overlap > 0) & (second_overlap >= OVERLAP_MIN_SHARE * (ends - starts))
+        co_speakers[together] = second[together]
+    return speakers, co_speakers
+
+
+def _run_starts(*columns):
+    """Индексы, с которых начинаются серии одинаковых значений во всех колонках сразу"""
+    changed = np.zeros(len(columns[0]) - 1, dtype=bool)
+    for column in columns:
+        changed |= column[1:] != column[:-1]
+    return np.flatnonzero(np.concatenate(([True], changed)))
+
+
+def build_utterances(turns, timeline, by_overlap, use_words):
+    """
+    Назначает спикеров единицам атрибуции (словам или сегментам) и
+    склеивает подряд идущие единицы одной части с тем же спикером (и тем же
+    вторым спикером) в реплики. Единицы без меток времени продолжают
+    предыдущую реплику. Одновременная речь короче OVERLAP_MIN_S не
+    отмечается. Возвращает список {"part", "speaker", "overlap_with",
+    "start", "end", "text"} и число единиц с одновременной речью.
+    """
+    parts, starts, ends, texts = attribution_units(timeline, use_words)
+    if not texts:
+        return [], 0
+    timed = ~np.isnan(starts)
+    speakers = np.full(len(texts), -1, dtype=np.int64)
+    co_speakers = np.full(len(texts), -1, dtype=np.int64)
+    attribute = attribute_by_overlap if by_overlap else attribute_by_midpoint
+    speakers[timed], co_speakers[timed] = attribute(turns, starts[timed], ends[timed])
+
+    # Без метки времени - спикер предыдущей единицы с меткой
+    previous = np.maximum.accumulate(np.where(timed, np.arange(len(texts)), -1))
+    inherit = ~timed & (previous >= 0)
+    speakers[inherit] = speakers[previous[inherit]]
+    co_speakers[inherit] = co_speakers[previous[inherit]]
+
+    if (co_speakers >= 0).any():
+        runs = _run_starts(speakers, co_speakers)
+        run_ids = np.repeat(np.arange(len(runs)), np.diff(np.append(runs, len(texts))))
+        # fmin/fmax пропускают NaN единиц без времени
+        run_seconds = np.fmax.reduceat(ends, runs) - np.fmin.reduceat(starts, runs)
+        short = (co_speakers >= 0) & (run_seconds[run_ids] < OVERLAP_MIN_S)
+        co_speakers[short] = -1
+
+    bounds = _run_starts(parts, speakers, co_speakers)
+    utterance_starts = np.fmin.reduceat(starts, bounds)
+    utterance_ends = np.fmax.reduceat(ends, bounds)
+    labels = turns.labels
+
+    utterances = []
+    stops = bounds[1:].tolist() + [len(texts)]
+    for i, (first, stop) in enumerate(zip(bounds.tolist(), stops)):
+        speaker, co_speaker = int(speakers[first]), int(co_speakers[first])
+        utterances.append({
+            "part": int(parts[first]),
+            "speaker": labels[speaker] if speaker >= 0 else UNKNOWN_SPEAKER,
+            "overlap_with": labels[co_speaker] if co_speaker >= 0 else None,
+            "start": None if np.isnan(utterance_starts[i]) else round(float(utterance_starts[i]), 2),
+            "end": None if np.isnan(utterance_ends[i]) else round(float(utterance_ends[i]), 2),
+            "text": " ".join(texts[first:stop]),
+        })
+    return utterances, int((co_speakers >= 0).sum())
+
+
+def format_diarized(timeline, utterances):
+    """
+    Текст с информацией о спикерах: части с заголовками "=== ЧАСТЬ n ===",
+    внутри - "[СПИКЕР]: текст" с новым заголовком при смене спикера или
+    второго спикера одновременной речи.
+    """
+    # Границы частей - по первому и последнему сегменту с метками времени
+    bounds = {}
+    for seg in timeline:
+        part_bounds = bounds.setdefault(seg['part'], [None, 0])
+        if seg['start'] is not None:
+            if part_bounds[0] is None:
+                part_bounds[0] = seg['start']
+            part_bounds[1] = seg['end']
+    part_utterances = {}
+    for utterance in utterances:
+        part_utterances.setdefault(utterance['part'], []).append(utterance)
+
+    diarized_content = []
+    current = None
+    for part_num in sorted(bounds):
+        part_start_seconds, part_end_seconds = bounds[part_num]
+        part_start_seconds = part_start_seconds or 0
+        diarized_content.append(f"\n=== ЧАСТЬ {part_num} ({format_seconds_to_hhmmss(part_start_seconds)} - {format_seconds_to_hhmmss(part_end_seconds)}) ===\n")
+
+        for utterance in part_utterances.get(part_num, []):
+            # Если спикер изменился, добавляем заголовок
+            speaker = (utterance['speaker'], utterance['overlap_with'])
+            if speaker != current:
+                current = speaker
+                if utterance['overlap_with']:
+                    diarized_content.append(f"\n[{utterance['speaker']}] (одновременно с {utterance['overlap_with']}): ")
+                else:
+                    diarized_content.append(f"\n[{utterance['speaker']}]: ")
+            diarized_content.append(utterance['text'] + " ")
+
+        diarized_content.append(f"\n\n--- Конец Части-{part_num} ---\n")
+    return ''.join(diarized_content)
+
+
 def apply_diarization_to_transcript(meeting_name):
     """
     Применяет результаты диаризации к объединенному транскрипту.
+    Если у транскрипта есть метки времени слов, каждое слово получает
+    спикера с наибольшим перекрытием, а слова подряд склеиваются в реплики;
+    иначе спикер каждого сегмента Whisper определяется по середине его
+    реального временного интервала (см. ATTRIBUTION_MODE).
     """
     print(f"\n--- Применяю диаризацию для: {meeting_name} ---")
     
@@ -79,6 +354,7 @@ def apply_diarization_to_transcript(meeting_name):
     rttm_path = os.path.join(DIARIZATION_DIR, f"{meeting_name}.rttm")
     transcript_path = os.path.join(RAW_TEXT_DIR, meeting_name, MERGED_FILENAME)
     output_path = os.path.join(RAW_TEXT_DIR, meeting_name, DIARIZED_FILENAME)
+    utterances_path = os.path.join(RAW_TEXT_DIR, meeting_name, UTTERANCES_FILENAME)
     
     # Проверяем существование файлов
     if not os.path.exists(rttm_path):
@@ -90,90 +366,70 @@ def apply_diarization_to_transcript(meeting_name):
         print("Сначала выполните скрипт 4-merge_transcripts.py")
         return False
     
+    started = time.perf_counter()
+    bytes_in = os.path.getsize(rttm_path) + os.path.getsize(transcript_path)
+    catalog.set_stage(meeting_name, "apply_diarization", catalog.RUNNING)
+
     # Парсим результаты диаризации
     segments = parse_rttm_file(rttm_path)
     if not segments:
         print("Не удалось загрузить данные диаризации")
+        catalog.set_stage(meeting_name, "apply_diarization", catalog.FAILED, error="no diarization segments")
         return False
     
     print(f"Загружено {len(segments)} сегментов диаризации")
     
-    # Читаем объединенный транскрипт
+    # Читаем временную шкалу транскрипта
     try:
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        timeline = load_timeline(meeting_name)
     except Exception as e:
         print(f"Ошибка при чтении транскрипта: {e}")
+        metrics.record("apply", meeting_name, wall_seconds=round(time.perf_counter() - started, 4),
+                       bytes_in=bytes_in, error=str(e))
+        catalog.set_stage(meeting_name, "apply_diarization", catalog.FAILED, error=str(e))
         return False
-    
-    # Разбиваем транскрипт на части по метаданным
-    parts = re.split(r'\n\n--- Конец Части-(\d+), Время: ([\d:]+) - ([\d:]+) ---', content)
-    
-    # Создаем итоговый текст с информацией о спикерах
-    diarized_content = []
-    chunk_duration_seconds = CHUNK_DURATION_MINUTES * 60
-    
-    current_speaker = None
-    
-    for i in range(0, len(parts), 4):
-        if i < len(parts):
-            part_text = parts[i].strip()
-            if not part_text:
-                continue
-                
-            # Определяем номер части
-            if i + 1 < len(parts):
-                part_num = int(parts[i + 1]) if parts[i + 1].isdigit() else (i // 4) + 1
-            else:
-                part_num = (i // 4) + 1
-            
-            # Вычисляем время начала этой части
-            part_start_seconds = (part_num - 1) * chunk_duration_seconds
-            part_end_seconds = part_num * chunk_duration_seconds
-            
-            # Разбиваем текст части на предложения для более точной привязки спикеров
-            sentences = re.split(r'[.!?]+', part_text)
-            
-            part_content = []
-            part_content.append(f"\n=== ЧАСТЬ {part_num} ({format_seconds_to_hhmmss(part_start_seconds)} - {format_seconds_to_hhmmss(part_end_seconds)}) ===\n")
-            
-            for j, sentence in enumerate(sentences):
-                sentence = sentence.strip()
-                if not sentence:
-                    continue
-                
-                # Примерно определяем время этого предложения внутри части
-                sentence_time = part_start_seconds + (j / len(sentences)) * chunk_duration_seconds
-                
-                # Определяем спикера для этого времени
-                speaker = get_speaker_at_time(segments, sentence_time)
-                
-                # Если спикер изменился, добавляем заголовок
-                if speaker != current_speaker:
-                    current_speaker = speaker
-                    part_content.append(f"\n[{speaker}]: ")
-                
-                part_content.append(sentence + ". ")
-            
-            diarized_content.extend(part_content)
-            diarized_content.append(f"\n\n--- Конец Части-{part_num} ---\n")
+
+    use_words = ATTRIBUTION_MODE != "midpoint" and any(seg.get('words') for seg in timeline)
+    by_overlap = use_words or ATTRIBUTION_MODE == "overlap"
+    attribution = ("слова" if use_words else "сегменты") + (", наибольшее перекрытие" if by_overlap else ", середина")
+    print(f"Атрибуция: {attribution}")
+    utterances, overlapped = build_utterances(segments, timeline, by_overlap, use_words)
+    if overlapped:
+        print(f"Одновременная речь: {overlapped} {'слов' if use_words else 'сегментов'}")
     
     # Сохраняем результат
     try:
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(''.join(diarized_content))
+            f.write(format_diarized(timeline, utterances))
+        with open(utterances_path, 'w', encoding='utf-8') as f:
+            for utterance in utterances:
+                f.write(json.dumps(utterance, ensure_ascii=False) + "\n")
         
         print(f"Успешно! Транскрипт с диаризацией сохранен: {output_path}")
+        wall_seconds = round(time.perf_counter() - started, 4)
+        metrics.record("apply", meeting_name,
+                       audio_seconds=max((seg['end'] for seg in timeline if seg['end'] is not None), default=None),
+                       wall_seconds=wall_seconds, bytes_in=bytes_in,
+                       bytes_out=os.path.getsize(output_path), segments=len(timeline),
+                       utterances=len(utterances), overlapped=overlapped, word_level=use_words)
+        catalog.add_artifact(meeting_name, "apply_diarization", output_path)
+        catalog.add_artifact(meeting_name, "apply_diarization", utterances_path)
+        catalog.set_stage(meeting_name, "apply_diarization", catalog.DONE, wall_seconds=wall_seconds)
         return True
         
     except Exception as e:
         print(f"Ошибка при сохранении файла: {e}")
+        metrics.record("apply", meeting_name, wall_seconds=round(time.perf_counter() - started, 4),
+                       bytes_in=bytes_in, error=str(e))
+        catalog.set_stage(meeting_name, "apply_diarization", catalog.FAILED, error=str(e))
         return False
 
 
 def get_available_meetings():
     """
     Находит совещания, для которых есть и объединенный транскрипт, и результаты диаризации.
+    Состояние берется одним запросом к каталогу; совещания, которых в нем
+    нет, проверяются по файлам.
     """
     meetings = []
     
@@ -181,10 +437,21 @@ def get_available_meetings():
     if not os.path.exists(RAW_TEXT_DIR):
         return meetings
     
+    table = catalog.stage_table() or {}
     for folder_name in os.listdir(RAW_TEXT_DIR):
         folder_path = os.path.join(RAW_TEXT_DIR, folder_name)
         if not os.path.isdir(folder_path):
             continue
+
+        stages = table.get(folder_name, {})
+        if "merge" in stages and "diarize" in stages:
+            if stages["merge"] == catalog.DONE and stages["diarize"] == catalog.DONE:
+                if "apply_diarization" in stages:
+                    already_processed = stages["apply_diarization"] == catalog.DONE
+                else:
+                    already_processed = os.path.exists(os.path.join(folder_path, DIARIZED_FILENAME))
+                meetings.append((folder_name, already_processed))
+            continue
         
         # Проверяем наличие объединенного транскрипта
         transcript_path = os.path.join(folder_path, MERGED_FILENAME)
@@ -1,22 +1,46 @@
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import catalog
+import metrics
 
 # ---------------------------------------------------------------------------
 # 📦 1.  ENV & CLIENT INITIALISATION
 # ---------------------------------------------------------------------------
-load_dotenv()
-
-API_KEY = os.environ.get("OPENROUTER_API_KEY")  # <-- put your key in .env
-if not API_KEY:
-    raise EnvironmentError("Environment variable OPENROUTER_API_KEY not found.")
 
 # Endpoint and model
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 MODEL_ID = "deepseek/deepseek-r1:free"  # free tier model slug
+TEMPERATURE = 0.6
+TOP_P = 0.95
+
+# Created on the first request, so importing this module (status checks,
+# the runner's plan) needs neither the openai package nor the API key
+client = None
+_client_lock = threading.Lock()
+
 
-client = OpenAI(base_url=OPENROUTER_BASE_URL, api_key=API_KEY)
-print("OpenRouter client initialised (DeepSeek‑R1).")
+def get_client():
+    """The OpenRouter client; reads OPENROUTER_API_KEY from .env on first use."""
+    global client
+    with _client_lock:
+        if client is None:
+            from dotenv import load_dotenv
+            from openai import OpenAI
+
+            load_dotenv()
+            api_key = os.environ.get("OPENROUTER_API_KEY")  # <-- put your key in .env
+            if not api_key:
+                raise EnvironmentError("Environment variable OPENROUTER_API_KEY not found.")
+            client = OpenAI(base_url=OPENROUTER_BASE_URL, api_key=api_key)
+            print("OpenRouter client initialised (DeepSeek‑R1).")
+        return client
 
 # ---------------------------------------------------------------------------
 # 🗂️ 2.  PATHS & CONSTANTS (retain original directory logic)
@@ -26,6 +50,17 @@ FULL_TRANSCRIPT_FILENAME = "_full_transcript.txt"
 SUMMARIES_BASE_DIR = "summaries"
 SUMMARY_FILENAME = "_summary.txt"
 
+# Map-reduce mode: parts are summarised concurrently, then combined
+MAP_REDUCE = False
+SUMMARY_CONCURRENCY = 4          # parallel requests during the map step
+MAX_REDUCE_CHARS = 60000         # larger sets of notes are reduced in groups first
+# On-disk cache of model responses, keyed by prompt + model + sampling
+LLM_CACHE_DIR = "llm_cache"
+USE_LLM_CACHE = True
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+LLM_CACHE_MAX_AGE_DAYS = 30
+PART_MARKER_RE = re.compile(r'\n*--- Конец Части-(\d+), Время: ([\d:]+) - ([\d:]+) ---\n*')
+
 # ---------------------------------------------------------------------------
 # 📝 3.  FLEXIBLE MARKDOWN PROMPT (no system role)
 # ---------------------------------------------------------------------------
@@ -56,6 +91,24 @@ SUMMARIZE_PROMPT = """
 """
 # SUMMARIZE_PROMPT = "Проанализируй транскрипцию совещания в профессиональное резюме."
 
+# Map step: notes for one part, grouped by the same sections as SUMMARIZE_PROMPT
+PART_NOTES_PROMPT = """
+Ты — бизнес‑аналитик. Перед тобой фрагмент транскрипции совещания
+({part_label}). Составь сжатый конспект этого фрагмента для последующего
+объединения с конспектами других фрагментов.
+
+**Инструкции**
+1. Выпиши факты по разделам: ключевые темы, выводы и результаты,
+   принятые решения, поставленные задачи (с ответственными),
+   риски и проблемные зоны, открытые вопросы.
+2. Пропускай разделы, по которым во фрагменте ничего нет.
+3. Не придумывай фактов, опирайся строго на текст.
+4. Только Markdown‑списки, без вступлений и заключений.
+"""
+
+# Reduce step: the final summary is built from the part notes
+NOTES_HEADER = "Ниже — конспекты последовательных частей совещания (а не сама транскрипция)."
+
 # ---------------------------------------------------------------------------
 # 🔍 4.  UTILS (unchanged)
 # ---------------------------------------------------------------------------
@@ -72,15 +125,199 @@ def get_meetings_for_summarization():
     return sorted(folders)
 
 def get_summary_status(meeting_name):
+    """True if the summary exists; with a catalog entry, only a finished run counts."""
     summary_path = os.path.join(SUMMARIES_BASE_DIR, meeting_name, SUMMARY_FILENAME)
-    return os.path.exists(summary_path)
+    status = catalog.stage_status(meeting_name, "summarize")
+    if status is None:
+        return os.path.exists(summary_path)
+    return status == catalog.DONE and os.path.exists(summary_path)
 
 # ---------------------------------------------------------------------------
 # ✨ 5.  CORE SUMMARISATION FUNCTION (OpenRouter replacement)
 # ---------------------------------------------------------------------------
 
-def create_summary_for_meeting(meeting_name):
+def llm_cache_key(user_message):
+    payload = json.dumps(
+        {"prompt": user_message, "model": MODEL_ID, "temperature": TEMPERATURE, "top_p": TOP_P},
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_response(key):
+    """Return a cached response, or None if missing or expired."""
+    path = os.path.join(LLM_CACHE_DIR, key + ".json")
+    try:
+        if time.time() - os.path.getmtime(path) > LLM_CACHE_MAX_AGE_DAYS * 86400:
+            os.remove(path)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)["content"]
+        os.utime(path)  # mark as recently used for eviction
+        return content
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def store_cached_response(key, content):
+    os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+    path = os.path.join(LLM_CACHE_DIR, key + ".json")
+    # Map-reduce requests of one process can store the same key concurrently
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"model": MODEL_ID, "created": time.time(), "content": content}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    evict_llm_cache()
+
+
+def evict_llm_cache():
+    """Drop expired entries, then the least recently used ones until under the size limit."""
+    entries = []
+    now = time.time()
+    for name in os.listdir(LLM_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(LLM_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # removed by a concurrent request
+        if now - stat.st_mtime > LLM_CACHE_MAX_AGE_DAYS * 86400:
+            _remove_quietly(path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= LLM_CACHE_MAX_BYTES:
+            break
+        _remove_quietly(path)
+        total -= size
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def request_completion(user_message, label="резюме"):
+    """Single chat completion with the configured model and sampling.
+
+    Responses are cached on disk, so repeating a request with the same
+    prompt, model and sampling parameters returns immediately. An empty
+    reply (e.g. content filtering) raises RuntimeError naming the label,
+    so no "None" reaches the notes or the summary file.
+    """
+    key = llm_cache_key(user_message)
+    bytes_in = len(user_message.encode("utf-8"))
+    if USE_LLM_CACHE:
+        cached = get_cached_response(key)
+        if cached is not None:
+            print("Ответ взят из кэша.")
+            metrics.record("llm_request", bytes_in=bytes_in, bytes_out=len(cached.encode("utf-8")), cached=True)
+            return cached
+
+    with metrics.timed("llm_request", bytes_in=bytes_in, model=MODEL_ID) as event:
+        response = get_client().chat.completions.create(
+            model=MODEL_ID,
+            messages=[{"role": "user", "content": user_message}],
+            temperature=TEMPERATURE,
+            top_p=TOP_P,
+        )
+        content = response.choices[0].message.content
+        event["bytes_out"] = len((content or "").encode("utf-8"))
+
+    if not content or not content.strip():
+        raise RuntimeError(f"модель вернула пустой ответ ({label})")
+    if USE_LLM_CACHE:
+        store_cached_response(key, content)
+    return content
+
+
+def split_transcript_parts(full_text):
+    """Split _full_transcript.txt on its '--- Конец Части-N' markers.
+
+    Returns a list of (label, text) in order.
+    """
+    pieces = PART_MARKER_RE.split(full_text)
+    parts = []
+    # re.split with 3 groups: text, num, start, end, text, num, ...
+    for i in range(0, len(pieces), 4):
+        text = pieces[i].strip()
+        if not text:
+            continue
+        if i + 3 < len(pieces):
+            label = f"Часть {pieces[i + 1]}, {pieces[i + 2]} - {pieces[i + 3]}"
+        else:
+            label = f"Часть {i // 4 + 1}"
+        parts.append((label, text))
+    return parts
+
+
+def summarize_part(label, text):
+    user_message = (
+        PART_NOTES_PROMPT.format(part_label=label)
+        + "\n\n```TRANSCRIPT\n" + text + "\n```"
+    )
+    return request_completion(user_message, label)
+
+
+def reduce_notes(meeting_name, notes, concurrency):
+    """Combine part notes into the final summary.
+
+    If the notes are still too long for one request, neighbouring notes are
+    first merged in groups (with the map prompt) until they fit.
+    """
+    while len(notes) > 1 and sum(len(text) for _, text in notes) > MAX_REDUCE_CHARS:
+        groups, group, size = [], [], 0
+        for label, text in notes:
+            if group and size + len(text) > MAX_REDUCE_CHARS:
+                groups.append(group)
+                group, size = [], 0
+            group.append((label, text))
+            size += len(text)
+        groups.append(group)
+        if len(groups) == len(notes):
+            break  # every note is already larger than the limit on its own
+        print(f"Промежуточное объединение: {len(notes)} конспектов → {len(groups)}")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            merged = list(pool.map(
+                lambda g: summarize_part(
+                    f"{g[0][0]} … {g[-1][0]}",
+                    NOTES_HEADER + "\n\n" + "\n\n".join(f"#### {label}\n{text}" for label, text in g),
+                ),
+                groups,
+            ))
+        notes = [(f"{g[0][0]} … {g[-1][0]}", text) for g, text in zip(groups, merged)]
+
+    notes_text = "\n\n".join(f"#### {label}\n{text}" for label, text in notes)
+    user_message = (
+        SUMMARIZE_PROMPT.replace("[Краткое название встречи]", meeting_name)
+        + "\n\n" + NOTES_HEADER
+        + "\n\n```NOTES\n" + notes_text + "\n```"
+    )
+    return request_completion(user_message)
+
+
+def summarize_map_reduce(meeting_name, full_text, concurrency=SUMMARY_CONCURRENCY):
+    """Summarise each part concurrently, then reduce the notes into one summary."""
+    parts = split_transcript_parts(full_text)
+    if len(parts) <= 1:
+        return None
+
+    print(f"Map-reduce: {len(parts)} частей, до {concurrency} запросов одновременно…")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        part_notes = list(pool.map(lambda part: summarize_part(*part), parts))
+    print("Конспекты частей готовы, собираю итоговое резюме…")
+    return reduce_notes(meeting_name, list(zip([label for label, _ in parts], part_notes)), concurrency)
+
+
+def create_summary_for_meeting(meeting_name, map_reduce=None, concurrency=None):
     print(f"\n--- Создаю резюме для: {meeting_name} ---")
+    map_reduce = MAP_REDUCE if map_reduce is None else map_reduce
+    concurrency = concurrency or SUMMARY_CONCURRENCY
 
     full_transcript_path = os.path.join(RAW_TEXT_BASE_DIR, meeting_name, FULL_TRANSCRIPT_FILENAME)
     output_dir = os.path.join(SUMMARIES_BASE_DIR, meeting_name)
@@ -97,34 +334,56 @@ def create_summary_for_meeting(meeting_name):
         print(f"Ошибка: Файл '{full_transcript_path}' не найден.")
         return
 
-    # Compose single‑message prompt as recommended for DeepSeek‑R1
-    user_message = (
-        SUMMARIZE_PROMPT.replace("[Краткое название встречи]", meeting_name)
-        + "\n\n```TRANSCRIPT\n" + full_text + "\n```"
-    )
-
+    started = time.perf_counter()
+    event = {"bytes_in": len(full_text.encode("utf-8")), "map_reduce": bool(map_reduce)}
+    catalog.set_stage(meeting_name, "summarize", catalog.RUNNING)
     try:
-        print("Отправляю запрос модели DeepSeek‑R1 (free)…")
-        response = client.chat.completions.create(
-            model=MODEL_ID,
-            messages=[{"role": "user", "content": user_message}],
-            temperature=0.6,
-            top_p=0.95,
-        )
-        summary_text = response.choices[0].message.content
+        summary_text = None
+        if map_reduce:
+            summary_text = summarize_map_reduce(meeting_name, full_text, concurrency)
+
+        if summary_text is None:
+            # Compose single‑message prompt as recommended for DeepSeek‑R1
+            user_message = (
+                SUMMARIZE_PROMPT.replace("[Краткое название встречи]", meeting_name)
+                + "\n\n```TRANSCRIPT\n" + full_text + "\n```"
+            )
+            print("Отправляю запрос модели DeepSeek‑R1 (free)…")
+            summary_text = request_completion(user_message)
 
         with open(output_filepath, "w", encoding="utf-8") as f:
             f.write(summary_text)
         print(f"✅ Резюме сохранено: {output_filepath}")
+        event["bytes_out"] = os.path.getsize(output_filepath)
+        catalog.add_artifact(meeting_name, "summarize", output_filepath)
 
     except Exception as e:
         print(f"Ошибка запроса к OpenRouter / DeepSeek‑R1: {e}")
+        event["error"] = str(e)
+    wall_seconds = round(time.perf_counter() - started, 4)
+    catalog.set_stage(meeting_name, "summarize", catalog.FAILED if event.get("error") else catalog.DONE,
+                      wall_seconds=wall_seconds, error=event.get("error"))
+    metrics.record("summarize", meeting_name, wall_seconds=wall_seconds, **event)
 
 # ---------------------------------------------------------------------------
 # 🏃‍♂️ 6.  MAIN LOOP (identical to original)
 # ---------------------------------------------------------------------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Создание резюме совещаний через OpenRouter")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="резюмировать части параллельно, затем объединить")
+    parser.add_argument("--concurrency", type=int, default=SUMMARY_CONCURRENCY,
+                        help=f"число одновременных запросов в режиме map-reduce (по умолчанию {SUMMARY_CONCURRENCY})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="не использовать кэш ответов модели (всегда новый запрос)")
+    args = parser.parse_args()
+    get_client()  # без ключа сразу выходим, а не на первом запросе
+
+    global USE_LLM_CACHE
+    if args.no_cache:
+        USE_LLM_CACHE = False
+
     os.makedirs(SUMMARIES_BASE_DIR, exist_ok=True)
 
     while True:
@@ -156,7 +415,8 @@ def main():
         if already:
             if input(f"Резюме для '{selected_meeting}' существует. Пересоздать? (y/n): ").lower() != 'y':
                 continue
-        create_summary_for_meeting(selected_meeting)
+        create_summary_for_meeting(selected_meeting, map_reduce=args.map_reduce or None,
+                                   concurrency=args.concurrency)
 
 
 if __name__ == "__main__":
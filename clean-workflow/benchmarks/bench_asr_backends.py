@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ASR backends of 3-transcribe_local_batch.py
+Transcribes the same audio with each backend and reports the real-time
+factor (RTF = processing time / audio duration, lower is better) and the
+word-level agreement of every backend with the first one.
+
+Use real speech for meaningful agreement numbers:
+    python benchmarks/bench_asr_backends.py --audio chunks/22-august/22-august_part001.mp3
+    python benchmarks/bench_asr_backends.py --backends transformers int8 --model openai/whisper-small
+"""
+
+import os
+import re
+import time
+import shutil
+import difflib
+import argparse
+import tempfile
+
+from common import load_stage_module, make_tone_recording
+
+TIMESTAMP_RE = re.compile(r'^\[[\d.]+ -> [\d.]+\]\s*', re.MULTILINE)
+
+
+def words(text):
+    text = TIMESTAMP_RE.sub("", text).lower()
+    return re.findall(r'\w+', text)
+
+
+def word_agreement(reference, hypothesis):
+    """Share of reference words matched in order by the hypothesis (1.0 = identical)"""
+    if not reference:
+        return 1.0 if not hypothesis else 0.0
+    matcher = difflib.SequenceMatcher(a=reference, b=hypothesis, autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    return matched / max(len(reference), len(hypothesis))
+
+
+def run_backend(transcribe, backend, audio_files):
+    transcribe.ASR_BACKEND = backend
+    started = time.perf_counter()
+    pipe = transcribe.load_whisper_pipeline()
+    load_time = time.perf_counter() - started
+    if pipe is None:
+        return None
+
+    audio_seconds, processing, texts = 0.0, 0.0, []
+    for path in audio_files:
+        samples = transcribe.load_audio(path)
+        audio_seconds += len(samples) / transcribe.SAMPLE_RATE
+        started = time.perf_counter()
+        result = pipe(
+            {"raw": samples, "sampling_rate": transcribe.SAMPLE_RATE},
+            generate_kwargs={"language": transcribe.LANGUAGE},
+            return_timestamps=True,
+        )
+        processing += time.perf_counter() - started
+        texts.append(transcribe.format_transcript(result))
+    return {"load": load_time, "audio": audio_seconds, "processing": processing, "texts": texts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="openai/whisper-large-v3")
+    parser.add_argument("--backends", nargs="+", default=["transformers", "int8"])
+    parser.add_argument("--audio", nargs="+", help="audio files to transcribe (default: a synthetic 60 s tone)")
+    args = parser.parse_args()
+
+    transcribe = load_stage_module("3-transcribe_local_batch.py")
+    transcribe.MODEL_ID = args.model
+
+    work_dir = tempfile.mkdtemp(prefix="bench_backends_")
+    try:
+        audio_files = args.audio
+        if not audio_files:
+            print("⚠️  No --audio given: using a synthetic tone, agreement numbers will not be meaningful")
+            audio_files = [os.path.join(work_dir, "tone.wav")]
+            make_tone_recording(audio_files[0], 60, codec_args=("-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le"))
+
+        results = {}
+        for backend in args.backends:
+            results[backend] = run_backend(transcribe, backend, audio_files)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    reference = next((r for r in results.values() if r), None)
+    print("\n" + "=" * 60)
+    print(f"Model: {args.model}, audio: {reference['audio'] if reference else 0:.1f} s")
+    print(f"{'backend':>14} {'load, s':>8} {'proc, s':>8} {'RTF':>6} {'agreement':>10}")
+    for backend, result in results.items():
+        if result is None:
+            print(f"{backend:>14} {'failed to load':>34}")
+            continue
+        agreement = word_agreement(
+            [w for text in reference["texts"] for w in words(text)],
+            [w for text in result["texts"] for w in words(text)],
+        )
+        rtf = result["processing"] / result["audio"] if result["audio"] else 0
+        print(f"{backend:>14} {result['load']:>8.1f} {result['processing']:>8.1f} {rtf:>6.3f} {agreement:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
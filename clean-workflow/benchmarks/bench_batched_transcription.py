@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batched transcription throughput at different batch sizes
+Runs transcribe_batched() from 3-transcribe_local_batch.py over the same
+chunks with several batch sizes (and the one-file-at-a-time
+process_meeting_folder() as a baseline) and reports throughput in audio
+seconds per wall second.
+
+Usage:
+    python benchmarks/bench_batched_transcription.py --batch-sizes 1 4 8 16
+    python benchmarks/bench_batched_transcription.py --meeting 22-august --model openai/whisper-large-v3
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from common import WORKFLOW_DIR, load_stage_module, make_tone_recording
+
+
+def make_synthetic_meeting(chunks_dir, meeting, count, seconds):
+    meeting_dir = os.path.join(chunks_dir, meeting)
+    os.makedirs(meeting_dir, exist_ok=True)
+    for i in range(count):
+        make_tone_recording(os.path.join(meeting_dir, f"{meeting}_part{i + 1:03d}.mp3"), seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="openai/whisper-tiny", help="Whisper model to load")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--meeting", help="use real chunks from chunks/<meeting> instead of synthetic audio")
+    parser.add_argument("--chunks", type=int, default=4, help="synthetic chunks to generate")
+    parser.add_argument("--chunk-seconds", type=int, default=120, help="length of each synthetic chunk")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the one-file-at-a-time baseline")
+    args = parser.parse_args()
+
+    transcribe = load_stage_module("3-transcribe_local_batch.py")
+    transcribe.MODEL_ID = args.model
+    # Every run must hit the model, not the transcription cache
+    transcribe.USE_TRANSCRIPTION_CACHE = False
+
+    work_dir = tempfile.mkdtemp(prefix="bench_asr_")
+    try:
+        if args.meeting:
+            meeting = args.meeting
+            transcribe.CHUNKS_BASE_DIR = os.path.join(WORKFLOW_DIR, "chunks")
+        else:
+            meeting = "synthetic"
+            transcribe.CHUNKS_BASE_DIR = os.path.join(work_dir, "chunks")
+            make_synthetic_meeting(transcribe.CHUNKS_BASE_DIR, meeting, args.chunks, args.chunk_seconds)
+        transcribe.RAW_TEXT_BASE_DIR = os.path.join(work_dir, "raw_text")
+
+        pipe = transcribe.load_whisper_pipeline()
+        if pipe is None:
+            return
+
+        rows = []
+        if not args.no_baseline:
+            audio_seconds = sum(
+                len(transcribe.decode_audio(path)) / transcribe.SAMPLE_RATE
+                for _, _, path in transcribe.collect_pending_chunks([meeting], force_rerun=True)
+            )
+            started = time.time()
+            transcribe.process_meeting_folder(meeting, pipe, force_rerun=True)
+            wall = time.time() - started
+            rows.append(("per-file", audio_seconds, wall))
+
+        for batch_size in args.batch_sizes:
+            stats = transcribe.transcribe_batched([meeting], pipe, batch_size=batch_size, force_rerun=True)
+            rows.append((f"batch={batch_size}", stats["audio_seconds"], stats["wall_seconds"]))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"Model: {args.model}")
+    print(f"{'mode':>10} {'audio, s':>10} {'wall, s':>9} {'audio s / wall s':>17}")
+    for mode, audio_seconds, wall in rows:
+        print(f"{mode:>10} {audio_seconds:>10.1f} {wall:>9.1f} {audio_seconds / wall:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Startup check: the quick runner commands and the stage modules must not
+import the heavy libraries.
+
+  * `run_pipeline.py list|status|plan` is started in a fresh interpreter
+    several times; the median wall time must stay under --budget-ms;
+  * with `python -X importtime`, neither those commands nor importing any
+    stage script may load torch, transformers, pyannote, faster_whisper,
+    openai or numpy.
+
+Every violation is listed and the script exits with status 1, so it can
+run as a check (CI, a pre-commit hook) rather than a report to read:
+    python benchmarks/bench_cli_startup.py
+    python benchmarks/bench_cli_startup.py --runs 15 --budget-ms 150
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+from common import WORKFLOW_DIR
+
+COMMANDS = ["list", "status", "plan"]
+STAGE_SCRIPTS = [
+    "1-extract_audio.py",
+    "2-split_audio.py",
+    "3-transcribe_local_batch.py",
+    "4-merge_transcripts.py",
+    "4.5-apply_diarization.py",
+    "5-create_summary_openrouter.py",
+    os.path.join("..", "diarization", "run_diarization.py"),
+]
+HEAVY_MODULES = ("torch", "transformers", "pyannote", "faster_whisper", "openai", "numpy")
+
+LOAD_SCRIPT = """
+import sys, importlib.util
+sys.path.insert(0, {workflow_dir!r})
+spec = importlib.util.spec_from_file_location("stage", {path!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+"""
+
+
+def imported_modules(importtime_output):
+    """Top-level package names from `python -X importtime` output"""
+    names = set()
+    for line in importtime_output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            if name != "package":
+                names.add(name.split(".")[0])
+    return names
+
+
+def wall_ms(cmd, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, cwd=WORKFLOW_DIR, capture_output=True, check=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def heavy_imports(cmd):
+    result = subprocess.run([sys.executable, "-X", "importtime", *cmd], cwd=WORKFLOW_DIR,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return sorted(imported_modules(result.stderr) & set(HEAVY_MODULES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="starts per command (the median is compared)")
+    parser.add_argument("--budget-ms", type=float, default=200, help="allowed median start time per command")
+    args = parser.parse_args()
+
+    failures = []
+    interpreter = wall_ms([sys.executable, "-c", "pass"], args.runs)
+    print(f"{'command':>26} {'wall, ms':>9}  heavy imports")
+    print(f"{'python -c pass':>26} {interpreter:>9.0f}")
+    for command in COMMANDS:
+        try:
+            wall = wall_ms([sys.executable, "run_pipeline.py", command], args.runs)
+            heavy = heavy_imports(["run_pipeline.py", command])
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            failures.append(f"run_pipeline.py {command} fails: {e}")
+            print(f"{'run_pipeline.py ' + command:>26} {'failed':>9}")
+            continue
+        print(f"{'run_pipeline.py ' + command:>26} {wall:>9.0f}  {', '.join(heavy) or '-'}")
+        if wall > args.budget_ms:
+            failures.append(f"run_pipeline.py {command}: {wall:.0f} ms > {args.budget_ms:g} ms")
+        if heavy:
+            failures.append(f"run_pipeline.py {command} imports {', '.join(heavy)}")
+
+    print(f"\n{'stage module':>32}  heavy imports at load")
+    for script in STAGE_SCRIPTS:
+        code = LOAD_SCRIPT.format(workflow_dir=WORKFLOW_DIR, path=os.path.join(WORKFLOW_DIR, script))
+        try:
+            heavy = heavy_imports(["-c", code])
+        except RuntimeError as e:
+            failures.append(f"{script} does not load: {e}")
+            print(f"{os.path.basename(script):>32}  failed to load")
+            continue
+        print(f"{os.path.basename(script):>32}  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{script} imports {', '.join(heavy)} at load")
+
+    if failures:
+        print("\n❌ Startup regressions:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("\n✅ Quick commands start within budget and stage modules load without heavy imports")
+
+
+if __name__ == "__main__":
+    main()
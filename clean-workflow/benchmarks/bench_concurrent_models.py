@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: diarization and transcription back to back vs. concurrently
+Runs the pyannote pipeline (diarization/run_diarization.py) and the Whisper
+pipeline (3-transcribe_local_batch.py) on the same recording:
+
+  * back to back: each model alone in its own process with every core,
+    the way the stages used to be run by hand;
+  * concurrently: both processes at once, for every thread split given
+    with --splits (diarize threads : transcribe threads).
+
+Models are loaded before the clock starts (both processes wait on a
+barrier), so only processing time is compared. Needs HUGGINGFACE_TOKEN
+for pyannote and real speech for meaningful numbers:
+    python benchmarks/bench_concurrent_models.py --audio audio-from-input/22-august.mp3
+    python benchmarks/bench_concurrent_models.py --audio a.wav --splits 2:6 4:4 --model openai/whisper-small
+
+The best split can then be passed to the runner:
+    python run_pipeline.py --auto --model-threads diarize=2 transcribe=6
+"""
+
+import os
+import time
+import argparse
+import multiprocessing
+
+from common import WORKFLOW_DIR, load_stage_module
+
+
+def model_worker(task, audio_path, model_id, threads, barrier, results):
+    """Load one model with the given torch thread budget, then time one run"""
+    os.chdir(WORKFLOW_DIR)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    if task == "transcribe":
+        transcribe = load_stage_module("3-transcribe_local_batch.py")
+        transcribe.MODEL_ID = model_id
+        transcribe.USE_TRANSCRIPTION_CACHE = False
+        pipe = transcribe.load_whisper_pipeline()
+        samples = transcribe.load_audio(audio_path)
+
+        def run():
+            pipe({"raw": samples, "sampling_rate": transcribe.SAMPLE_RATE},
+                 chunk_length_s=transcribe.CHUNK_LENGTH_S, batch_size=transcribe.BATCH_SIZE,
+                 generate_kwargs={"language": transcribe.LANGUAGE}, return_timestamps=True)
+        ready = pipe is not None
+    else:
+        diarization = load_stage_module(os.path.join("..", "diarization", "run_diarization.py"))
+        pipeline = diarization.load_diarization_pipeline()
+
+        def run():
+            pipeline(audio_path)
+        ready = pipeline is not None
+
+    barrier.wait()
+    if not ready:
+        results.put((task, None, None))
+        return
+    started = time.time()
+    run()
+    results.put((task, started, time.time()))
+
+
+def measure(context, audio_path, model_id, budgets):
+    """Run the given {task: threads} processes together; returns wall seconds or None"""
+    barrier = context.Barrier(len(budgets))
+    results = context.Queue()
+    processes = [
+        context.Process(target=model_worker, args=(task, audio_path, model_id, threads, barrier, results))
+        for task, threads in budgets.items()
+    ]
+    for process in processes:
+        process.start()
+    spans = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if any(start is None for _, start, _ in spans):
+        return None
+    return max(end for _, _, end in spans) - min(start for _, start, _ in spans)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="recording to diarize and transcribe")
+    parser.add_argument("--model", default="openai/whisper-large-v3", help="Whisper model to load")
+    parser.add_argument("--splits", nargs="+", metavar="D:T",
+                        help="thread splits to try (default: a few splits of all cores)")
+    args = parser.parse_args()
+
+    audio_path = os.path.abspath(args.audio)
+    cores = os.cpu_count() or 1
+    splits = args.splits or [f"{d}:{cores - d}" for d in sorted({max(1, cores // 4), max(1, cores // 3), max(1, cores // 2)})
+                             if cores - d >= 1]
+    context = multiprocessing.get_context("spawn")
+
+    print(f"Back to back, {cores} threads each...")
+    diarize_alone = measure(context, audio_path, args.model, {"diarize": cores})
+    transcribe_alone = measure(context, audio_path, args.model, {"transcribe": cores})
+    if diarize_alone is None or transcribe_alone is None:
+        print("❌ A model failed to load, nothing to compare")
+        return
+    sequential = diarize_alone + transcribe_alone
+
+    concurrent = {}
+    for split in splits:
+        diarize_threads, transcribe_threads = (int(n) for n in split.split(":"))
+        print(f"Concurrently, diarize={diarize_threads} transcribe={transcribe_threads} threads...")
+        concurrent[split] = measure(context, audio_path, args.model,
+                                    {"diarize": diarize_threads, "transcribe": transcribe_threads})
+
+    print("\n" + "=" * 60)
+    print(f"Audio: {args.audio}, model: {args.model}, cores: {cores}")
+    print(f"{'mode':>26} {'wall, s':>9} {'speedup':>8}")
+    print(f"{'diarize alone':>26} {diarize_alone:>9.1f}")
+    print(f"{'transcribe alone':>26} {transcribe_alone:>9.1f}")
+    print(f"{'back to back':>26} {sequential:>9.1f} {1.0:>7.2f}x")
+    for split, wall in concurrent.items():
+        if wall is None:
+            print(f"{'concurrent ' + split:>26} {'failed':>9}")
+            continue
+        print(f"{'concurrent ' + split:>26} {wall:>9.1f} {sequential / wall:>7.2f}x")
+
+    measured = {split: wall for split, wall in concurrent.items() if wall}
+    if measured:
+        best = min(measured, key=measured.get)
+        diarize_threads, transcribe_threads = best.split(":")
+        print(f"\nBest split: {best} ({sequential / measured[best]:.2f}x vs back to back)")
+        print(f"  python run_pipeline.py --auto --model-threads diarize={diarize_threads} transcribe={transcribe_threads}")
+
+
+if __name__ == "__main__":
+    main()
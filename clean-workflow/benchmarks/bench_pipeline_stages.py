@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: every pipeline stage on a synthetic meeting
+Generates a multi-speaker recording of configurable length (each speaker
+is a modulated tone at its own pitch, with pauses, long silences and some
+overlapping speech) together with the matching RTTM, then runs the stages
+one after another in a scratch directory:
+
+    extract_audio               1-extract_audio.py
+    split_audio_into_chunks     2-split_audio.py
+    process_meeting_folder      3-transcribe_local_batch.py (tiny Whisper model)
+    merge_text_files_for_meeting   4-merge_transcripts.py
+    apply_diarization_to_transcript 4.5-apply_diarization.py (synthetic RTTM)
+    create_summary_for_meeting  5-create_summary_openrouter.py (stub LLM client)
+
+For each stage it records wall time, RTF (wall time / audio length), peak
+RSS of this process while the stage ran, peak RSS of child processes
+(ffmpeg) and bytes written to disk. Results are appended to a JSON history;
+a stage that is more than 20% slower (or uses 20% more memory) than the
+median of the last runs with the same settings is flagged as a regression.
+
+Without a downloadable Whisper model (or with --no-asr) the transcripts are
+generated from the synthetic turns, so the later stages still run.
+
+Usage:
+    python benchmarks/bench_pipeline_stages.py --minutes 30
+    python benchmarks/bench_pipeline_stages.py --minutes 60 --speakers 4 --model openai/whisper-tiny
+    python benchmarks/bench_pipeline_stages.py --minutes 10 --no-asr --fail-on-regression
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+from types import SimpleNamespace
+
+import numpy as np
+
+from common import WORKFLOW_DIR, load_stage_module
+import catalog
+import metrics
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "stage_history.json")
+HISTORY_WINDOW = 5            # runs the baseline median is taken over
+REGRESSION_THRESHOLD = 0.20   # relative slowdown / memory growth that is flagged
+MIN_REGRESSION_SECONDS = 0.05  # ignore noise on very fast stages
+SAMPLE_RATE = 16000
+MEETING = "bench-meeting"
+SPEAKER_PITCHES = [140, 190, 230, 280, 330, 390, 450, 520]
+
+
+# --- Synthetic meeting ---
+
+def make_turns(seconds, speakers, seed=0):
+    """Speaker turns of 1.5-12 s with short pauses, some long silences and ~5% overlaps"""
+    rng = random.Random(seed)
+    turns, t = [], rng.uniform(0.5, 2.0)
+    while t < seconds - 1:
+        duration = min(rng.uniform(1.5, 12.0), seconds - t)
+        turns.append((t, t + duration, rng.randrange(speakers)))
+        roll = rng.random()
+        if roll < 0.05:
+            t += duration - rng.uniform(0.3, min(1.5, duration / 2))  # interruption
+        elif roll < 0.10:
+            t += duration + rng.uniform(5.0, 20.0)  # long silence
+        else:
+            t += duration + rng.uniform(0.2, 2.5)
+    return turns
+
+
+def synthesize_meeting(turns, seconds, path, block_seconds=10):
+    """Render the turns block by block straight into ffmpeg (WebM/Opus, like a recorded call)"""
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1",
+           "-i", "-", "-c:a", "libopus", "-b:a", "48k", path]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    rng = np.random.default_rng(0)
+    block = block_seconds * SAMPLE_RATE
+    for block_start in range(0, int(seconds * SAMPLE_RATE), block):
+        t = (block_start + np.arange(block)) / SAMPLE_RATE
+        signal = rng.normal(0, 0.003, block)  # room noise
+        for start, end, speaker in turns:
+            if end < t[0] or start > t[-1]:
+                continue
+            mask = (t >= start) & (t < end)
+            pitch = SPEAKER_PITCHES[speaker % len(SPEAKER_PITCHES)]
+            syllables = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * t + speaker)  # ~4 syllables/s
+            voice = np.sin(2 * np.pi * pitch * t) + 0.4 * np.sin(4 * np.pi * pitch * t)
+            signal += mask * 0.2 * syllables * voice
+        proc.stdin.write(signal.astype(np.float32).tobytes())
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError("ffmpeg failed to encode the synthetic meeting")
+
+
+def write_rttm(turns, meeting, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for start, end, speaker in turns:
+            f.write(f"SPEAKER {meeting} 1 {start:.3f} {end - start:.3f} <NA> <NA> SPEAKER_{speaker:02d} <NA> <NA>\n")
+
+
+def write_synthetic_transcripts(turns, meeting):
+    """Chunk transcripts as Whisper would write them, one line per turn, using the split manifest"""
+    with open(os.path.join("chunks", meeting, "_chunks.json"), encoding="utf-8") as f:
+        chunks = json.load(f)["chunks"]
+    os.makedirs(os.path.join("raw_text", meeting), exist_ok=True)
+    for chunk in chunks:
+        chunk_start, chunk_end = chunk["start"], chunk["start"] + chunk["duration"]
+        lines = [f"[{start - chunk_start:.2f} -> {min(end, chunk_end) - chunk_start:.2f}] Реплика номер {i}."
+                 for i, (start, end, _) in enumerate(turns) if chunk_start <= start < chunk_end]
+        name = os.path.splitext(chunk["file"])[0] + ".txt"
+        with open(os.path.join("raw_text", meeting, name), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+class StubLLMClient:
+    """Stands in for the OpenAI client: fixed latency, short Markdown answer"""
+
+    def __init__(self, latency):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.latency = latency
+
+    def _create(self, model, messages, **kwargs):
+        time.sleep(self.latency)
+        words = len(messages[-1]["content"].split())
+        content = f"### Итоги встречи: benchmark\n#### 🔹 Ключевые темы обсуждения:\n- {words} слов на входе\n"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+# --- Measurement ---
+
+def current_rss():
+    """Resident set size of this process in bytes (Linux /proc, else the lifetime peak)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def children_peak_rss():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def snapshot(root):
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def measure(name, fn, audio_seconds, results):
+    """Run one stage and record wall time, RTF, peak RSS and bytes written"""
+    print(f"\n⏱️  {name}")
+    before = snapshot(".")
+    peak = [current_rss()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.02):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        fn()
+    except Exception as e:
+        error = str(e)
+        print(f"❌ {name} failed: {e}")
+    wall = time.perf_counter() - started
+    done.set()
+    sampler.join()
+
+    after = snapshot(".")
+    written = sum(size for path, (size, mtime) in after.items() if before.get(path) != (size, mtime))
+    results[name] = {
+        "wall_seconds": round(wall, 4),
+        "rtf": round(wall / audio_seconds, 6) if audio_seconds else None,
+        "peak_rss_mb": round(peak[0] / 2**20, 1),
+        "children_peak_rss_mb": round(children_peak_rss() / 2**20, 1),
+        "disk_bytes_written": written,
+    }
+    if error:
+        results[name]["error"] = error
+
+
+def run_suite(args, work_dir):
+    os.chdir(work_dir)
+    # Stage events and catalog entries of the synthetic meeting stay out of the real ones
+    metrics.EVENTS_LOG = os.path.join(work_dir, "metrics", "events.jsonl")
+    catalog.CATALOG_PATH = os.path.join(work_dir, "catalog.sqlite3")
+    for dir_name in ["input", "audio-from-input", "chunks", "raw_text", "summaries", "diarization_results"]:
+        os.makedirs(dir_name, exist_ok=True)
+
+    seconds = args.minutes * 60
+    turns = make_turns(seconds, args.speakers)
+    print(f"🎙️  Synthetic meeting: {args.minutes:g} min, {args.speakers} speakers, {len(turns)} turns")
+    video_path = os.path.join("input", f"{MEETING}.webm")
+    synthesize_meeting(turns, seconds, video_path)
+    write_rttm(turns, MEETING, os.path.join("diarization_results", f"{MEETING}.rttm"))
+
+    results = {}
+    extract = load_stage_module("1-extract_audio.py")
+    audio_filename = f"{MEETING}.mp3"
+    audio_path = os.path.join("audio-from-input", audio_filename)
+    measure("extract_audio", lambda: extract.extract_audio(video_path, audio_path), seconds, results)
+
+    split = load_stage_module("2-split_audio.py")
+    measure("split_audio_into_chunks",
+            lambda: split.split_audio_into_chunks(audio_path, "chunks", audio_filename, mode=args.split_mode),
+            seconds, results)
+
+    pipe = None
+    if not args.no_asr:
+        transcribe = load_stage_module("3-transcribe_local_batch.py")
+        transcribe.MODEL_ID = args.model
+        transcribe.USE_TRANSCRIPTION_CACHE = False
+        transcribe.USE_MODEL_SERVER = False
+        pipe = transcribe.load_whisper_pipeline()
+        if pipe is not None:
+            measure("process_meeting_folder", lambda: transcribe.process_meeting_folder(MEETING, pipe),
+                    seconds, results)
+    if pipe is None:
+        print("\n⚠️  Whisper not used: transcripts are generated from the synthetic turns")
+        write_synthetic_transcripts(turns, MEETING)
+
+    merge = load_stage_module("4-merge_transcripts.py")
+    measure("merge_text_files_for_meeting", lambda: merge.merge_text_files_for_meeting(MEETING), seconds, results)
+
+    apply = load_stage_module("4.5-apply_diarization.py")
+    apply.DIARIZATION_DIR = "diarization_results"
+    measure("apply_diarization_to_transcript", lambda: apply.apply_diarization_to_transcript(MEETING),
+            seconds, results)
+
+    # The stub replaces the client before the first request, so no API key or openai package is needed
+    summary = load_stage_module("5-create_summary_openrouter.py")
+    summary.client = StubLLMClient(args.stub_latency)
+    summary.USE_LLM_CACHE = False
+    measure("create_summary_for_meeting",
+            lambda: summary.create_summary_for_meeting(MEETING, map_reduce=args.map_reduce),
+            seconds, results)
+    return results
+
+
+# --- History ---
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def find_regressions(history, entry):
+    """Stages that got slower or hungrier than the median of recent runs with the same config"""
+    previous = [run for run in history if run["config"] == entry["config"]][-HISTORY_WINDOW:]
+    regressions = []
+    for stage, result in entry["stages"].items():
+        baseline_runs = [run["stages"][stage] for run in previous if stage in run["stages"]]
+        if not baseline_runs or "error" in result:
+            continue
+        wall = statistics.median(r["wall_seconds"] for r in baseline_runs)
+        if result["wall_seconds"] > wall * (1 + REGRESSION_THRESHOLD) \
+                and result["wall_seconds"] - wall > MIN_REGRESSION_SECONDS:
+            regressions.append(f"{stage}: {result['wall_seconds']:.2f}s vs median {wall:.2f}s")
+        rss = statistics.median(r["peak_rss_mb"] for r in baseline_runs)
+        if result["peak_rss_mb"] > rss * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"{stage}: peak RSS {result['peak_rss_mb']:.0f} MB vs median {rss:.0f} MB")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=WORKFLOW_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=15, help="length of the synthetic meeting")
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--model", default="openai/whisper-tiny", help="Whisper model for process_meeting_folder")
+    parser.add_argument("--no-asr", action="store_true", help="skip Whisper and use generated transcripts")
+    parser.add_argument("--split-mode", choices=["fixed", "energy", "rttm"], default="fixed")
+    parser.add_argument("--map-reduce", action="store_true", help="summarize in map-reduce mode")
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="seconds per stub LLM request")
+    parser.add_argument("--history", default=HISTORY_FILE, help="JSON history file")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with code 1 on a regression")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    history_path = os.path.abspath(args.history)
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_stages_")
+    try:
+        stages = run_suite(args, work_dir)
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"\nScratch directory kept: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    entry = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "config": {"minutes": args.minutes, "speakers": args.speakers,
+                   "model": None if args.no_asr else args.model, "split_mode": args.split_mode,
+                   "map_reduce": args.map_reduce, "stub_latency": args.stub_latency},
+        "stages": stages,
+    }
+    history = load_history(history_path)
+    regressions = find_regressions(history, entry)
+
+    print("\n" + "=" * 92)
+    print(f"Synthetic meeting: {args.minutes:g} min, {args.speakers} speakers, revision {entry['revision'] or '-'}")
+    print(f"{'stage':>32} {'wall, s':>9} {'RTF':>9} {'RSS, MB':>8} {'child RSS':>10} {'written, MB':>12}")
+    for stage, result in stages.items():
+        print(f"{stage:>32} {result['wall_seconds']:>9.2f} {result['rtf']:>9.5f} {result['peak_rss_mb']:>8.0f} "
+              f"{result['children_peak_rss_mb']:>10.0f} {result['disk_bytes_written'] / 2**20:>12.2f}"
+              f"{'  ERROR' if 'error' in result else ''}")
+
+    if regressions:
+        print("\n🚨 Regressions against the recent history:")
+        for line in regressions:
+            print(f"  {line}")
+    else:
+        print("\nNo regressions against the recent history.")
+
+    if not args.no_save:
+        history.append(entry)
+        save_history(history_path, history)
+        print(f"History: {history_path} ({len(history)} runs)")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
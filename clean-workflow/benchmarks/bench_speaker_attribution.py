@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark: speaker attribution scaling on multi-hour meetings
+Compares the old per-sentence linear scan over all RTTM turns with the
+sorted-interval index from 4.5-apply_diarization.py (bisect lookups and
+the single sweep-line pass) on synthetic diarizations of growing length.
+It also times loading the RTTM: a text parse against the .npz cache of
+rttm.load_rttm(), and word-level attribution: every word of a timeline
+with word timestamps (~2.5 words/s, so 8 hours is over 70k words) gets
+the speaker with the largest overlap, checked against a direct scan on
+the first words.
+
+Usage:
+    python benchmarks/bench_speaker_attribution.py --hours 1 2 4 8
+"""
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import numpy  # imported up front, so the first RTTM parse is not charged for it
+
+from common import load_stage_module
+import rttm
+
+
+def make_turns(hours, speakers=6, seed=0):
+    """Turns of 0.5-8 s with occasional overlaps, like pyannote output"""
+    rng = random.Random(seed)
+    turns, t = [], 0.0
+    while t < hours * 3600:
+        duration = rng.uniform(0.5, 8.0)
+        turns.append({'start': t, 'end': t + duration, 'speaker': f"SPEAKER_{rng.randrange(speakers):02d}"})
+        t += duration * rng.uniform(0.7, 1.1)
+    return turns
+
+
+def make_query_times(hours, seed=1):
+    """Midpoints of Whisper-like segments (~2-7 s long)"""
+    rng = random.Random(seed)
+    times, t = [], 0.0
+    while t < hours * 3600:
+        duration = rng.uniform(2.0, 7.0)
+        times.append(t + duration / 2)
+        t += duration
+    return times
+
+
+def make_word_timeline(hours, seed=2):
+    """Timeline segments of ~5 s, each with "words" [start, end, text] of 0.1-0.5 s"""
+    rng = random.Random(seed)
+    timeline, words, t = [], [], 0.0
+    while t < hours * 3600:
+        start = t
+        while t - start < 5.0:
+            duration = rng.uniform(0.1, 0.5)
+            words.append([round(t, 2), round(t + duration, 2), f"w{len(words)}"])
+            t += duration + rng.uniform(0.0, 0.1)
+        timeline.append({"part": 1, "start": words[0][0], "end": words[-1][1],
+                         "text": " ".join(word[2] for word in words), "words": words})
+        words = []
+        t += rng.uniform(0.2, 1.5)
+    return timeline
+
+
+def direct_overlaps(turns, start, end):
+    """Seconds each speaker talks within [start, end], one turn at a time (a speaker's own overlaps count once)"""
+    clipped = {}
+    for turn in turns:
+        if turn['end'] > start and turn['start'] < end:
+            clipped.setdefault(turn['speaker'], []).append((max(start, turn['start']), min(end, turn['end'])))
+    totals = {}
+    for speaker, intervals in clipped.items():
+        covered, reached = 0.0, start
+        for interval_start, interval_end in sorted(intervals):
+            covered += max(0.0, interval_end - max(interval_start, reached))
+            reached = max(reached, interval_end)
+        totals[speaker] = covered
+    return totals
+
+
+def legacy_speaker_at_time(segments, time_seconds):
+    for segment in segments:
+        if segment['start'] <= time_seconds <= segment['end']:
+            return segment['speaker']
+    return "UNKNOWN_SPEAKER"
+
+
+def write_rttm(turns, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for turn in turns:
+            f.write(f"SPEAKER bench 1 {turn['start']:.3f} {turn['end'] - turn['start']:.3f} "
+                    f"<NA> <NA> {turn['speaker']} <NA> <NA>\n")
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--legacy-max-hours", type=float, default=8,
+                        help="skip the quadratic baseline above this length")
+    args = parser.parse_args()
+
+    diarization = load_stage_module("4.5-apply_diarization.py")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_attribution_")
+    print(f"{'hours':>6} {'turns':>7} {'segments':>9} {'parse, ms':>10} {'cached, ms':>11} "
+          f"{'linear, s':>10} {'bisect, s':>10} {'sweep, s':>9} {'sweep ns/item':>14} "
+          f"{'words':>7} {'overlap, s':>11}")
+    for hours in args.hours:
+        turns = make_turns(hours)
+        times = make_query_times(hours)
+
+        rttm_path = os.path.join(work_dir, f"{hours:g}h.rttm")
+        write_rttm(turns, rttm_path)
+        parse_time, _ = timed(lambda: rttm.load_rttm(rttm_path, use_cache=False))
+        rttm.load_rttm(rttm_path)  # writes the cache
+        cached_time, columns = timed(lambda: rttm.load_rttm(rttm_path))
+
+        index_time, index = timed(lambda: diarization.build_speaker_index(columns))
+        sweep_time, swept = timed(lambda: diarization.assign_speakers(index, times))
+        bisect_time, looked_up = timed(lambda: [diarization.get_speaker_at_time(index, t) for t in times])
+        assert swept == looked_up
+
+        if hours <= args.legacy_max_hours:
+            legacy_time, legacy = timed(lambda: [legacy_speaker_at_time(turns, t) for t in times])
+            assert legacy == swept
+            legacy_str = f"{legacy_time:>10.3f}"
+        else:
+            legacy_str = f"{'-':>10}"
+
+        timeline = make_word_timeline(hours)
+        overlap_time, (utterances, _) = timed(lambda: diarization.build_utterances(columns, timeline, True, True))
+        words = [word for seg in timeline for word in seg["words"]]
+        speakers, _ = diarization.attribute_by_overlap(columns, numpy.array([w[0] for w in words[:300]]),
+                                                       numpy.array([w[1] for w in words[:300]]))
+        for word, code in zip(words[:300], speakers.tolist()):
+            totals = direct_overlaps(turns, word[0], word[1])
+            # Without overlap the word goes to the nearest speaker, if one is close enough
+            if totals and max(totals.values()) > 0:
+                assert totals.get(columns.labels[code], 0.0) >= max(totals.values()) - 1e-9
+
+        per_item = (index_time + sweep_time) / (len(turns) + len(times)) * 1e9
+        print(f"{hours:>6g} {len(turns):>7} {len(times):>9} {parse_time * 1000:>10.1f} {cached_time * 1000:>11.1f} "
+              f"{legacy_str} "
+              f"{index_time + bisect_time:>10.3f} {index_time + sweep_time:>9.3f} {per_item:>14.0f} "
+              f"{len(words):>7} {overlap_time:>11.3f}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
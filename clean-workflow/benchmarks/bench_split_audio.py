@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-pass segmenter vs. one ffmpeg process per chunk
+Generates a synthetic long recording and splits it with both modes of
+split_audio_into_chunks() from 2-split_audio.py.
+
+Usage:
+    python benchmarks/bench_split_audio.py --minutes 30 60 180
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from common import load_stage_module, make_tone_recording
+
+
+def time_split(split, audio_path, single_pass):
+    out_dir = tempfile.mkdtemp(prefix="bench_chunks_")
+    try:
+        started = time.perf_counter()
+        split.split_audio_into_chunks(audio_path, out_dir, os.path.basename(audio_path), single_pass=single_pass)
+        elapsed = time.perf_counter() - started
+        base = os.path.splitext(os.path.basename(audio_path))[0]
+        chunks = sorted(os.listdir(os.path.join(out_dir, base)))
+        return elapsed, chunks
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[30, 60, 180],
+                        help="recording lengths to test")
+    args = parser.parse_args()
+
+    split = load_stage_module("2-split_audio.py")
+    if not split.check_ffmpeg_and_ffprobe():
+        sys.exit(1)
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="bench_split_")
+    try:
+        for minutes in args.minutes:
+            audio_path = os.path.join(work_dir, f"synthetic_{minutes}min.mp3")
+            make_tone_recording(audio_path, minutes * 60)
+
+            per_chunk_time, per_chunk_files = time_split(split, audio_path, single_pass=False)
+            single_time, single_files = time_split(split, audio_path, single_pass=True)
+            if per_chunk_files != single_files:
+                print(f"⚠️  Different chunk layouts for {minutes} min: {per_chunk_files} vs {single_files}")
+
+            results.append((minutes, len(single_files), per_chunk_time, single_time))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"{'minutes':>8} {'chunks':>7} {'per-chunk, s':>13} {'single-pass, s':>15} {'speedup':>8}")
+    for minutes, chunks, per_chunk_time, single_time in results:
+        print(f"{minutes:>8} {chunks:>7} {per_chunk_time:>13.2f} {single_time:>15.2f} {per_chunk_time / single_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
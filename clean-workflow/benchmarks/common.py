@@ -0,0 +1,33 @@
+"""
+Shared helpers for the benchmark scripts: loading stage scripts by file
+name and generating synthetic recordings with ffmpeg.
+"""
+
+import os
+import sys
+import subprocess
+import importlib.util
+
+WORKFLOW_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Stage scripts import shared helpers (waveform_cache) from clean-workflow/
+if WORKFLOW_DIR not in sys.path:
+    sys.path.insert(0, WORKFLOW_DIR)
+
+
+def load_stage_module(script):
+    """Import a stage script such as '2-split_audio.py' from clean-workflow/"""
+    path = os.path.join(WORKFLOW_DIR, script)
+    name = os.path.splitext(os.path.basename(path))[0].replace("-", "_").replace(".", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_tone_recording(path, seconds, codec_args=("-ac", "2", "-c:a", "libmp3lame", "-q:a", "0")):
+    """Sine tone of the given length; by default a stereo MP3 like stage 1 output"""
+    subprocess.run([
+        "ffmpeg", "-nostdin", "-y", "-f", "lavfi",
+        "-i", f"sine=frequency=220:sample_rate=44100:duration={seconds}",
+        *codec_args, path,
+    ], check=True, capture_output=True)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Catalog of meetings, media, chunks, stage state and artifacts (SQLite)
+
+The stages record what they produced in catalog.sqlite3 next to this file:
+
+  * media: duration and audio codec from ffprobe, keyed by path and
+    validated by size and mtime, so a file is probed once;
+  * chunks: the offsets of every chunk of a meeting (from the split plan);
+  * stages: per meeting and stage, running / done / failed, with the wall
+    time and the error;
+  * artifacts: every output file with its size, mtime and SHA-256.
+
+A stage is marked running before it writes anything and done only after
+its outputs are complete, so a crashed run is not mistaken for a finished
+one the way a non-empty folder is. Status views read the stage table with
+one indexed query instead of listing and counting files. A meeting or
+stage the catalog has never seen (processed before it existed) falls back
+to the old file checks; `python catalog.py --rebuild` records such meetings.
+
+Writes never raise: a locked or unwritable catalog prints a warning and the
+stage goes on. Set PIPELINE_CATALOG=0 to turn the catalog off.
+
+    python catalog.py                    # stage table for every meeting
+    python catalog.py --meeting NAME     # media, chunks and artifacts of one meeting
+    python catalog.py --rebuild          # record meetings processed before the catalog
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import subprocess
+
+WORKFLOW_DIR = os.path.dirname(os.path.abspath(__file__))
+ENABLED = os.getenv("PIPELINE_CATALOG", "1") != "0"
+CATALOG_PATH = os.getenv("PIPELINE_CATALOG_PATH", os.path.join(WORKFLOW_DIR, "catalog.sqlite3"))
+HASH_BLOCK_SIZE = 1 << 20
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    name TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    meeting TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    codec TEXT,
+    probed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    meeting TEXT NOT NULL,
+    part INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    start REAL NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (meeting, part)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    meeting TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    wall_seconds REAL,
+    error TEXT,
+    PRIMARY KEY (meeting, stage)
+);
+CREATE INDEX IF NOT EXISTS stages_by_status ON stages (stage, status);
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    meeting TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_by_meeting ON artifacts (meeting, stage);
+"""
+
+_local = threading.local()
+
+
+def connect():
+    """This thread's connection (autocommit, WAL so readers never wait for a writing stage)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != CATALOG_PATH:
+        os.makedirs(os.path.dirname(os.path.abspath(CATALOG_PATH)), exist_ok=True)
+        conn = sqlite3.connect(CATALOG_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.path = conn, CATALOG_PATH
+    return conn
+
+
+def _write(sql_statements):
+    """Run (sql, params) pairs in one transaction; False if the catalog is off or failed"""
+    if not ENABLED:
+        return False
+    try:
+        conn = connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params in sql_statements:
+                conn.execute(sql, params)
+        return True
+    except sqlite3.Error as e:
+        print(f"⚠️  catalog: {e}")
+        return False
+
+
+def _read(sql, params=()):
+    """Rows of a query, or None if the catalog is off or unreadable (callers fall back to the files)"""
+    if not ENABLED:
+        return None
+    try:
+        return connect().execute(sql, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️  catalog: {e}")
+        return None
+
+
+def catalog_path(path):
+    """Paths are stored relative to clean-workflow/, whatever the working directory of the stage"""
+    return os.path.relpath(os.path.abspath(path), WORKFLOW_DIR)
+
+
+def disk_path(stored_path):
+    return os.path.normpath(os.path.join(WORKFLOW_DIR, stored_path))
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _meeting_row(meeting):
+    return "INSERT OR IGNORE INTO meetings (name, created) VALUES (?, ?)", (meeting, time.time())
+
+
+# --- Media ---
+
+def run_ffprobe(path):
+    """(duration in seconds, codec of the first audio stream); None for what ffprobe cannot tell"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name:format=duration",
+             "-of", "default=noprint_wrappers=1", path],
+            capture_output=True, text=True, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None, None
+    info = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+    try:
+        duration = float(info.get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return duration, info.get("codec_name")
+
+
+def probe_media(path, meeting=None):
+    """Duration and codec of a media file; ffprobe runs only if the file is new or has changed"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    rows = _read("SELECT duration, codec FROM media WHERE path = ? AND size = ? AND mtime_ns = ?",
+                 (catalog_path(path), stat.st_size, stat.st_mtime_ns))
+    if rows:
+        return rows[0]
+    duration, codec = run_ffprobe(path)
+    if duration is not None:
+        _write([("INSERT OR REPLACE INTO media (path, meeting, size, mtime_ns, duration, codec, probed) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (catalog_path(path), meeting, stat.st_size, stat.st_mtime_ns, duration, codec, time.time()))])
+    return duration, codec
+
+
+# --- Chunks ---
+
+def record_chunks(meeting, chunks):
+    """Replace the chunk offsets of a meeting; chunks are dicts with part, file, start, duration"""
+    statements = [_meeting_row(meeting), ("DELETE FROM chunks WHERE meeting = ?", (meeting,))]
+    statements += [("INSERT INTO chunks (meeting, part, file, start, duration) VALUES (?, ?, ?, ?, ?)",
+                    (meeting, chunk["part"], chunk["file"], chunk["start"], chunk["duration"]))
+                   for chunk in chunks]
+    _write(statements)
+
+
+def get_chunks(meeting):
+    """[{part, file, start, duration}] in order, or None if the catalog has no chunks for the meeting"""
+    rows = _read("SELECT part, file, start, duration FROM chunks WHERE meeting = ? ORDER BY part", (meeting,))
+    if not rows:
+        return None
+    return [{"part": part, "file": file, "start": start, "duration": duration} for part, file, start, duration in rows]
+
+
+# --- Stages ---
+
+def set_stage(meeting, stage, status, wall_seconds=None, error=None):
+    _write([_meeting_row(meeting),
+            ("INSERT OR REPLACE INTO stages (meeting, stage, status, updated, wall_seconds, error) "
+             "VALUES (?, ?, ?, ?, ?, ?)", (meeting, stage, status, time.time(), wall_seconds, error))])
+
+
+def stage_status(meeting, stage):
+    """running / done / failed, or None if the catalog does not know this stage of the meeting"""
+    rows = _read("SELECT status FROM stages WHERE meeting = ? AND stage = ?", (meeting, stage))
+    return rows[0][0] if rows else None
+
+
+def stage_table():
+    """{meeting: {stage: status}} for every meeting in the catalog, or None if it is unavailable"""
+    rows = _read("SELECT meeting, stage, status FROM stages")
+    if rows is None:
+        return None
+    table = {}
+    for meeting, stage, status in rows:
+        table.setdefault(meeting, {})[stage] = status
+    return table
+
+
+# --- Artifacts ---
+
+def add_artifact(meeting, stage, path, with_hash=True, sha256=None):
+    """Record an output file (size, mtime and, by default, SHA-256; pass sha256 if the writer computed it)"""
+    if not ENABLED:
+        return
+    try:
+        stat = os.stat(path)
+        digest = sha256 or (file_hash(path) if with_hash else None)
+    except OSError as e:
+        print(f"⚠️  catalog: {e}")
+        return
+    _write([_meeting_row(meeting),
+            ("INSERT OR REPLACE INTO artifacts (path, meeting, stage, size, mtime_ns, sha256, created) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+             (catalog_path(path), meeting, stage, stat.st_size, stat.st_mtime_ns, digest, time.time()))])
+
+
+def count_artifacts(meeting, stage):
+    rows = _read("SELECT COUNT(*) FROM artifacts WHERE meeting = ? AND stage = ?", (meeting, stage))
+    return rows[0][0] if rows else None
+
+
+def get_artifacts(meeting, stage=None):
+    """[(path on disk, stage, size, sha256)] of a meeting"""
+    if stage is None:
+        rows = _read("SELECT path, stage, size, sha256 FROM artifacts WHERE meeting = ? ORDER BY stage, path",
+                     (meeting,))
+    else:
+        rows = _read("SELECT path, stage, size, sha256 FROM artifacts WHERE meeting = ? AND stage = ? ORDER BY path",
+                     (meeting, stage))
+    return [(disk_path(path), stage, size, digest) for path, stage, size, digest in rows or []]
+
+
+def forget(meeting, stage):
+    """Drop a stage's artifacts and state, e.g. before its outputs are deleted and made again"""
+    _write([("DELETE FROM artifacts WHERE meeting = ? AND stage = ?", (meeting, stage)),
+            ("DELETE FROM stages WHERE meeting = ? AND stage = ?", (meeting, stage))])
+
+
+# --- Command line ---
+
+def rebuild():
+    """Record the finished stages of meetings processed before the catalog existed (by their files)"""
+    import run_pipeline
+
+    os.chdir(WORKFLOW_DIR)
+    known = stage_table() or {}
+    transcripts = run_pipeline.stage_module("transcribe").RAW_TEXT_BASE_DIR
+    meetings = set(run_pipeline.discover_meetings())
+    if os.path.isdir(transcripts):
+        meetings.update(name for name in os.listdir(transcripts) if os.path.isdir(os.path.join(transcripts, name)))
+    recorded = 0
+    for meeting in sorted(meetings):
+        for stage in run_pipeline.PIPELINE_STAGES:
+            if stage in known.get(meeting, {}):
+                continue
+            if run_pipeline.stage_done(stage, meeting):
+                set_stage(meeting, stage, DONE)
+                recorded += 1
+        manifest = run_pipeline.stage_module("merge").load_chunk_manifest(meeting)
+        if manifest and get_chunks(meeting) is None:
+            record_chunks(meeting, manifest["chunks"])
+    print(f"Recorded {recorded} finished stage(s) of {len(meetings)} meeting(s) in {CATALOG_PATH}")
+
+
+def print_meeting(meeting):
+    status = {stage: row for stage, *row in _read(
+        "SELECT stage, status, wall_seconds, error FROM stages WHERE meeting = ?", (meeting,)) or []}
+    if not status:
+        print(f"{meeting} is not in the catalog")
+        return
+    print(f"Meeting {meeting}")
+    for stage, (state, wall, error) in status.items():
+        print(f"  {stage:<18} {state:<8} {f'{wall:.1f}s' if wall else '':>8}  {error or ''}")
+    for path, duration, codec in _read("SELECT path, duration, codec FROM media WHERE meeting = ?", (meeting,)) or []:
+        print(f"  media   {path}: {duration:.1f}s, {codec or '?'}")
+    for chunk in get_chunks(meeting) or []:
+        print(f"  chunk   {chunk['file']}: {chunk['start']:.2f}s + {chunk['duration']:.2f}s")
+    for path, stage, size, digest in get_artifacts(meeting):
+        print(f"  {stage:<7} {os.path.relpath(path)} ({size} bytes, sha256 {digest[:12] if digest else '-'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog of meetings and stage state")
+    parser.add_argument("--meeting", help="show media, chunks and artifacts of one meeting")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="record meetings that were processed before the catalog existed")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild()
+        return
+    if args.meeting:
+        print_meeting(args.meeting)
+        return
+    table = stage_table()
+    if not table:
+        print(f"The catalog {CATALOG_PATH} is empty")
+        return
+    stages = sorted({stage for states in table.values() for stage in states})
+    width = max(len("meeting"), *(len(meeting) for meeting in table))
+    print(f"{'meeting':<{width}}  " + "  ".join(f"{stage[:10]:>10}" for stage in stages))
+    for meeting in sorted(table):
+        print(f"{meeting:<{width}}  " + "  ".join(f"{table[meeting].get(stage, '-'):>10}" for stage in stages))
+
+
+if __name__ == "__main__":
+    main()
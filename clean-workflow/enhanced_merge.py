@@ -6,6 +6,7 @@ Improved version of 4-merge_transcripts.py
 
 import os
 import sys
+import importlib.util
 from pathlib import Path
 
 try:
@@ -18,7 +19,7 @@ except ImportError:
 # Configuration
 RAW_TEXT_BASE_DIR = "raw_text"
 MERGED_FILENAME = "_full_transcript.txt"
-CHUNK_DURATION_MINUTES = 10
+MERGE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "4-merge_transcripts.py")
 
 class ProgressBar:
     """Simple progress bar fallback if tqdm not available"""
@@ -61,9 +62,19 @@ def get_meeting_folders(directory):
             
     return sorted(folders)
 
+def load_merge_stage():
+    """4-merge_transcripts.py, which does the actual merge (its name is not importable)"""
+    spec = importlib.util.spec_from_file_location("merge_transcripts", MERGE_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.RAW_TEXT_BASE_DIR = RAW_TEXT_BASE_DIR
+    module.MERGED_FILENAME = MERGED_FILENAME
+    return module
+
 def analyze_meeting_folder(meeting_path):
     """Analyze meeting folder and return statistics"""
-    txt_files = [f for f in meeting_path.glob("*.txt") if f.name != MERGED_FILENAME]
+    # Files of later stages (_full_transcript.txt, _diarized_transcript.txt) start with "_"
+    txt_files = [f for f in meeting_path.glob("*.txt") if not f.name.startswith("_")]
     merged_file = meeting_path / MERGED_FILENAME
     
     return {
@@ -73,15 +84,12 @@ def analyze_meeting_folder(meeting_path):
         'txt_files': sorted(txt_files, key=lambda x: x.name)
     }
 
-def format_time(seconds):
-    """Convert seconds to HH:MM:SS format"""
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    secs = seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-
 def merge_transcripts(meeting_name, force_overwrite=False):
-    """Merge transcript files with progress tracking"""
+    """
+    Merge transcript files with progress tracking. The merge itself is the
+    streaming one of 4-merge_transcripts.py: real chunk offsets, overlap
+    de-duplication and the .srt/.vtt/.json exports in the same pass.
+    """
     meeting_path = Path(RAW_TEXT_BASE_DIR) / meeting_name
     output_file = meeting_path / MERGED_FILENAME
     
@@ -101,49 +109,22 @@ def merge_transcripts(meeting_name, force_overwrite=False):
     txt_files = stats['txt_files']
     print(f"📋 Найдено {len(txt_files)} файлов")
     
-    # Progress tracking
+    # Progress tracking: one step per merged part
     progress = get_progress_bar(len(txt_files), "Объединение")
-    
     try:
-        with output_file.open('w', encoding='utf-8') as outfile:
-            for i, txt_file in enumerate(txt_files):
-                try:
-                    # Read file content
-                    content = txt_file.read_text(encoding='utf-8').strip()
-                    outfile.write(content)
-                    
-                    # Add metadata
-                    part_num = i + 1
-                    start_seconds = i * CHUNK_DURATION_MINUTES * 60
-                    end_seconds = part_num * CHUNK_DURATION_MINUTES * 60
-                    
-                    start_time = format_time(start_seconds)
-                    end_time = format_time(end_seconds)
-                    
-                    metadata = f"\n\n--- Конец Части-{part_num}, Время: {start_time} - {end_time} ---"
-                    outfile.write(metadata)
-                    
-                    if i < len(txt_files) - 1:
-                        outfile.write("\n\n")
-                        
-                except Exception as e:
-                    print(f"\n⚠️  Ошибка при чтении {txt_file.name}: {e}")
-                    
-                # Update progress
-                progress.update(1)
-                
+        outputs = load_merge_stage().merge_text_files_for_meeting(meeting_name, on_part=lambda part: progress.update(1))
+    finally:
         progress.close()
-        
-        # Show results
-        final_size = output_file.stat().st_size
-        print(f"✅ Успешно! Создан файл: {output_file.name} ({final_size} байт)")
-        return True
-        
-    except Exception as e:
-        progress.close()
-        print(f"❌ Ошибка: {e}")
+
+    if outputs is None:
+        print("❌ Ошибка при объединении")
         return False
 
+    # Show results
+    final_size = output_file.stat().st_size
+    print(f"✅ Успешно! Создан файл: {output_file.name} ({final_size} байт)")
+    return True
+
 def show_status():
     """Show status of all projects"""
     print("\n" + "="*60)
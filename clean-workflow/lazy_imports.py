@@ -0,0 +1,33 @@
+"""
+Deferred imports for heavy modules.
+
+Importing numpy alone takes longer than listing every meeting, and the
+stage scripts are loaded by run_pipeline.py even for status and plan
+commands. lazy_import() returns a stand-in that performs the real import on
+first attribute access, so a module can keep `np = lazy_import("numpy")`
+at the top and pay for numpy only when a function actually uses it.
+"""
+
+import sys
+import types
+import importlib
+import importlib.util
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module until one of its attributes is needed"""
+
+    def __getattr__(self, attr):
+        # The import system's per-module lock makes concurrent first uses safe
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """The module if it is already imported, otherwise a LazyModule (ImportError if it is not installed)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Shared instrumentation for the pipeline stages.
+
+Every stage reports what it did as one JSON line in metrics/events.jsonl:
+stage, meeting, chunk, audio seconds, wall seconds, real-time factor
+(wall / audio), bytes in and out, and the error if it failed. The log is
+append-only and shared by all processes, so it is the single source of
+truth; the optional Prometheus text file (for the node_exporter textfile
+collector) is rebuilt from it.
+
+    with metrics.timed("transcribe", meeting, chunk=filename, audio_seconds=600) as event:
+        ...
+        event["bytes_out"] = os.path.getsize(output_path)
+
+    python metrics.py                      # per-stage totals from the log
+    python metrics.py --prometheus metrics/pipeline.prom
+
+Set PIPELINE_METRICS=0 to switch the log off, PIPELINE_METRICS_LOG to move
+it, and PIPELINE_METRICS_PROM to keep a Prometheus file up to date.
+"""
+
+import os
+import json
+import time
+import atexit
+import argparse
+import threading
+from contextlib import contextmanager
+
+WORKFLOW_DIR = os.path.dirname(os.path.abspath(__file__))
+ENABLED = os.getenv("PIPELINE_METRICS", "1") != "0"
+EVENTS_LOG = os.getenv("PIPELINE_METRICS_LOG", os.path.join(WORKFLOW_DIR, "metrics", "events.jsonl"))
+PROMETHEUS_FILE = os.getenv("PIPELINE_METRICS_PROM")
+PROMETHEUS_INTERVAL = 10.0  # seconds between rewrites of the Prometheus file
+
+_write_lock = threading.Lock()
+_last_export = 0.0
+
+
+def file_size(path):
+    """Size of a file in bytes, or None if it does not exist"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def record(stage, meeting=None, chunk=None, audio_seconds=None, wall_seconds=None,
+           bytes_in=None, bytes_out=None, error=None, **extra):
+    """Append one event to the log (never raises: metrics must not break a stage)"""
+    if not ENABLED:
+        return
+    event = {"ts": round(time.time(), 3), "stage": stage, "meeting": meeting, "chunk": chunk,
+             "audio_seconds": audio_seconds, "wall_seconds": wall_seconds,
+             "rtf": round(wall_seconds / audio_seconds, 4) if audio_seconds and wall_seconds is not None else None,
+             "bytes_in": bytes_in, "bytes_out": bytes_out, "error": error, "pid": os.getpid()}
+    event.update(extra)
+    line = json.dumps(event, ensure_ascii=False) + "\n"
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(EVENTS_LOG), exist_ok=True)
+            # One write() per line in append mode keeps lines whole across processes
+            with open(EVENTS_LOG, "a", encoding="utf-8") as f:
+                f.write(line)
+        _maybe_export()
+    except OSError as e:
+        print(f"⚠️  metrics: cannot write {EVENTS_LOG}: {e}")
+
+
+@contextmanager
+def timed(stage, meeting=None, chunk=None, **fields):
+    """
+    Time the block and record it. The yielded dict can be filled in inside
+    the block (audio_seconds, bytes_out, ...) and holds wall_seconds after
+    it; an exception is recorded as the event's error and re-raised.
+    """
+    event = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event["error"] = str(e)
+        raise
+    finally:
+        event["wall_seconds"] = round(time.perf_counter() - started, 4)
+        record(stage, meeting, chunk, **event)
+
+
+def read_events(path=None):
+    path = path or EVENTS_LOG
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+
+
+def summarize(events):
+    """Totals per stage: events, errors, wall and audio seconds, bytes in and out"""
+    totals = {}
+    for event in events:
+        stage = totals.setdefault(event["stage"], {"events": 0, "errors": 0, "wall_seconds": 0.0,
+                                                   "audio_seconds": 0.0, "bytes_in": 0, "bytes_out": 0,
+                                                   "last_ts": 0.0})
+        stage["events"] += 1
+        stage["errors"] += 1 if event.get("error") else 0
+        for key in ("wall_seconds", "audio_seconds", "bytes_in", "bytes_out"):
+            stage[key] += event.get(key) or 0
+        stage["last_ts"] = max(stage["last_ts"], event.get("ts") or 0.0)
+    return totals
+
+
+def export_prometheus(path=None, events_log=None):
+    """Write the per-stage totals in Prometheus text exposition format (atomically)"""
+    path = path or PROMETHEUS_FILE
+    totals = summarize(read_events(events_log))
+    series = [
+        ("pipeline_stage_events_total", "counter", "Recorded stage events", "events"),
+        ("pipeline_stage_errors_total", "counter", "Stage events that ended with an error", "errors"),
+        ("pipeline_stage_wall_seconds_total", "counter", "Wall-clock seconds spent in the stage", "wall_seconds"),
+        ("pipeline_stage_audio_seconds_total", "counter", "Seconds of audio processed by the stage", "audio_seconds"),
+        ("pipeline_stage_bytes_in_total", "counter", "Bytes read by the stage", "bytes_in"),
+        ("pipeline_stage_bytes_out_total", "counter", "Bytes written by the stage", "bytes_out"),
+        ("pipeline_stage_last_event_timestamp_seconds", "gauge", "Time of the last event", "last_ts"),
+    ]
+    lines = []
+    for name, kind, help_text, key in series:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{stage="{stage}"}} {values[key]}' for stage, values in sorted(totals.items())]
+    lines += ["# HELP pipeline_stage_rtf Wall seconds per audio second over all events",
+              "# TYPE pipeline_stage_rtf gauge"]
+    lines += [f'pipeline_stage_rtf{{stage="{stage}"}} {values["wall_seconds"] / values["audio_seconds"]:.6f}'
+              for stage, values in sorted(totals.items()) if values["audio_seconds"]]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+def _maybe_export(force=False):
+    global _last_export
+    if not PROMETHEUS_FILE:
+        return
+    now = time.time()
+    if force or now - _last_export >= PROMETHEUS_INTERVAL:
+        _last_export = now
+        export_prometheus()
+
+
+@atexit.register
+def _final_export():
+    if ENABLED and PROMETHEUS_FILE and os.path.exists(EVENTS_LOG):
+        try:
+            _maybe_export(force=True)
+        except OSError as e:
+            print(f"⚠️  metrics: cannot write {PROMETHEUS_FILE}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage totals from the pipeline metrics log")
+    parser.add_argument("--log", default=EVENTS_LOG, help="events log (JSONL)")
+    parser.add_argument("--prometheus", metavar="PATH", help="write the totals in Prometheus text format")
+    args = parser.parse_args()
+
+    totals = summarize(read_events(args.log))
+    if not totals:
+        print(f"No events in {args.log}")
+        return
+    print(f"{'stage':>26} {'events':>7} {'errors':>7} {'wall, s':>10} {'audio, s':>10} {'RTF':>7} {'MB in':>9} {'MB out':>9}")
+    for stage, values in sorted(totals.items(), key=lambda item: -item[1]["wall_seconds"]):
+        rtf = f"{values['wall_seconds'] / values['audio_seconds']:.3f}" if values["audio_seconds"] else "-"
+        print(f"{stage:>26} {values['events']:>7} {values['errors']:>7} {values['wall_seconds']:>10.1f} "
+              f"{values['audio_seconds']:>10.1f} {rtf:>7} {values['bytes_in'] / 2**20:>9.1f} "
+              f"{values['bytes_out'] / 2**20:>9.1f}")
+    if args.prometheus:
+        export_prometheus(args.prometheus, args.log)
+        print(f"Prometheus metrics written to {args.prometheus}")
+
+
+if __name__ == "__main__":
+    main()
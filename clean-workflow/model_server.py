@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Warm model server
+
+Keeps the Whisper and pyannote pipelines loaded in one long-lived process
+and serves them over a local socket (a Unix socket next to this file, or a
+localhost TCP port where Unix sockets are not available). The stage
+scripts check for a running server when they load a model: if it answers,
+they get a RemotePipeline proxy instead of loading the model themselves,
+so the load cost is paid once per host rather than once per invocation.
+
+Everything else (chunk lists, caches, VAD, output files) stays in the
+client; the server only runs the models.
+
+Requests are pickled, so only clients that know the server's key may
+connect: every server start generates a random key and writes it to
+model_server.key, readable by the owner only (MODEL_SERVER_AUTHKEY
+overrides it, e.g. for clients running as another user).
+
+    python model_server.py                      # serve until stopped
+    python model_server.py --preload whisper diarize --backend int8
+    python model_server.py --status
+    python model_server.py --stop
+"""
+
+import os
+import sys
+import socket
+import argparse
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+WORKFLOW_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.path.join(WORKFLOW_DIR, "model_server.sock")
+TCP_ADDRESS = ("127.0.0.1", 50717)
+KEY_PATH = os.path.join(WORKFLOW_DIR, "model_server.key")
+# Chunks sent per request when a client passes many inputs (batched mode)
+REMOTE_GROUP_SIZE = 4
+
+
+def server_address():
+    return SOCKET_PATH if hasattr(socket, "AF_UNIX") else TCP_ADDRESS
+
+
+def read_authkey():
+    """The running server's key (OSError if no server has written one)"""
+    if os.getenv("MODEL_SERVER_AUTHKEY"):
+        return os.environ["MODEL_SERVER_AUTHKEY"].encode()
+    with open(KEY_PATH, "rb") as f:
+        return f.read()
+
+
+def write_authkey():
+    """A new random key for this server run, in a file only its owner can read"""
+    if os.getenv("MODEL_SERVER_AUTHKEY"):
+        return os.environ["MODEL_SERVER_AUTHKEY"].encode()
+    key = os.urandom(32)
+    tmp_path = f"{KEY_PATH}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp_path, KEY_PATH)
+    return key
+
+
+def request(message):
+    """
+    Send one request to the server and return its reply (raises OSError if
+    it is not running, AuthenticationError if it was started with another key)
+    """
+    with Client(server_address(), authkey=read_authkey()) as conn:
+        conn.send(message)
+        return conn.recv()
+
+
+def is_running():
+    try:
+        return request({"op": "ping"}).get("ok", False)
+    except (OSError, EOFError, AuthenticationError):
+        return False
+
+
+class RemotePipeline:
+    """
+    Stands in for a locally loaded pipeline: calling it sends the inputs to
+    the server and returns the server's result, so the stage code that
+    calls pipe(...) works unchanged.
+    """
+
+    def __init__(self, kind, **config):
+        self.kind = kind
+        self.config = config
+
+    def _call(self, inputs, kwargs):
+        reply = request({"op": self.kind, "config": self.config, "inputs": inputs, "kwargs": kwargs})
+        if not reply.get("ok"):
+            raise RuntimeError(f"model server: {reply.get('error')}")
+        return reply["results"]
+
+    def __call__(self, inputs, **kwargs):
+        if isinstance(inputs, (str, dict)):
+            if isinstance(inputs, str):
+                inputs = os.path.abspath(inputs)
+            return self._call([inputs], kwargs)[0]
+        return self._iterate(inputs, kwargs)
+
+    def _iterate(self, inputs, kwargs):
+        group = []
+        for item in inputs:
+            group.append(item)
+            if len(group) == REMOTE_GROUP_SIZE:
+                yield from self._call(group, kwargs)
+                group = []
+        if group:
+            yield from self._call(group, kwargs)
+
+
+def connect_pipeline(kind, **config):
+    """RemotePipeline for a running server, or None if there is none"""
+    if not is_running():
+        return None
+    print(f"Using the {kind} model of the model server at {server_address()}, nothing to load")
+    return RemotePipeline(kind, **config)
+
+
+class ModelServer:
+    """Loads models on first use, keeps them, and runs one job per model at a time"""
+
+    def __init__(self):
+        import run_pipeline
+        self._stage_module = run_pipeline.stage_module
+        self._models = {}
+        self._load_lock = threading.Lock()
+        self._run_locks = {"asr": threading.Lock(), "diarize": threading.Lock()}
+        self._stop = threading.Event()
+
+    def _get_model(self, kind, config):
+        key = (kind, tuple(sorted(config.items())))
+        with self._load_lock:
+            if key not in self._models:
+                if kind == "asr":
+                    transcribe = self._stage_module("transcribe")
+                    transcribe.USE_MODEL_SERVER = False
+                    transcribe.ASR_BACKEND = config.get("backend", transcribe.ASR_BACKEND)
+                    transcribe.MODEL_ID = config.get("model", transcribe.MODEL_ID)
+                    model = transcribe.load_whisper_pipeline()
+                else:
+                    diarization = self._stage_module("diarize")
+                    diarization.USE_MODEL_SERVER = False
+                    model = diarization.load_diarization_pipeline()
+                if model is None:
+                    raise RuntimeError(f"failed to load the {kind} model")
+                self._models[key] = model
+            return self._models[key]
+
+    def handle(self, message):
+        op = message.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "models": [kind for kind, _ in self._models]}
+        if op == "shutdown":
+            self._stop.set()
+            return {"ok": True}
+        if op not in self._run_locks:
+            return {"ok": False, "error": f"unknown request '{op}'"}
+        model = self._get_model(op, message.get("config", {}))
+        inputs, kwargs = message["inputs"], message.get("kwargs", {})
+        with self._run_locks[op]:
+            if op == "asr" and len(inputs) > 1:
+                # A list goes through the HF pipeline in one call, so windows are still batched
+                results = list(model(inputs, **kwargs))
+            else:
+                results = [model(item, **kwargs) for item in inputs]
+        return {"ok": True, "results": results}
+
+    def _serve_connection(self, conn):
+        with conn:
+            try:
+                message = conn.recv()
+                try:
+                    reply = self.handle(message)
+                except Exception as e:
+                    print(f"❌ {message.get('op')} failed: {e}")
+                    reply = {"ok": False, "error": str(e)}
+                conn.send(reply)
+            except (EOFError, OSError):
+                pass
+        if self._stop.is_set():
+            # accept() blocks until the next connection: make one so the serve loop sees the stop
+            is_running()
+
+    def serve(self, address):
+        authkey = write_authkey()
+        listener = Listener(address, authkey=authkey)
+        print(f"🟢 Model server listening on {address} (pid {os.getpid()})")
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    continue  # failed handshake from a client with the wrong key
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            if isinstance(address, str) and os.path.exists(address):
+                os.remove(address)
+            try:
+                # Unless a newer server has replaced it in the meantime
+                if read_authkey() == authkey and not os.getenv("MODEL_SERVER_AUTHKEY"):
+                    os.remove(KEY_PATH)
+            except OSError:
+                pass
+        print("🔴 Model server stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm model server for the transcription pipeline")
+    parser.add_argument("--preload", nargs="*", choices=["whisper", "diarize"], default=[],
+                        help="load these models at start instead of on the first request")
+    parser.add_argument("--backend", choices=["transformers", "int8"], help="Whisper backend to preload")
+    parser.add_argument("--status", action="store_true", help="report whether a server is running")
+    parser.add_argument("--stop", action="store_true", help="stop the running server")
+    args = parser.parse_args()
+
+    os.chdir(WORKFLOW_DIR)
+    sys.path.insert(0, WORKFLOW_DIR)
+
+    if args.status or args.stop:
+        if not is_running():
+            print("Model server is not running")
+            sys.exit(1)
+        if args.stop:
+            request({"op": "shutdown"})
+            print("Model server is stopping")
+        else:
+            reply = request({"op": "ping"})
+            print(f"Model server is running (pid {reply['pid']}), loaded: {', '.join(reply['models']) or 'nothing yet'}")
+        return
+
+    if is_running():
+        print("Model server is already running")
+        sys.exit(1)
+    address = server_address()
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)  # left over from a server that did not shut down cleanly
+
+    server = ModelServer()
+    if "whisper" in args.preload:
+        transcribe = server._stage_module("transcribe")
+        server._get_model("asr", {"backend": args.backend or transcribe.ASR_BACKEND, "model": transcribe.MODEL_ID})
+    if "diarize" in args.preload:
+        server._get_model("diarize", {})
+    try:
+        server.serve(address)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
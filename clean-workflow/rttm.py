@@ -0,0 +1,202 @@
+"""
+Columnar RTTM reader with a binary cache.
+
+load_rttm() returns the speaker turns of a diarization as NumPy arrays
+sorted by start time: starts and ends in seconds (float64) and speakers as
+int32 codes into a table of labels. Attribution and VAD can then work on
+whole arrays instead of one dict per turn.
+
+The parsed arrays are cached next to the RTTM as <name>.rttm.npz. The cache
+is used while the RTTM keeps its size and mtime; if only the mtime changed
+(the file was copied or touched), the SHA-256 of the content decides. A
+long meeting's diarization then reloads in milliseconds instead of being
+parsed line by line on every run.
+"""
+
+import os
+import hashlib
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+CACHE_SUFFIX = ".npz"
+CACHE_VERSION = 1
+
+
+class SpeakerTurns:
+    """Speaker turns sorted by start: starts, ends (seconds) and speakers (codes into labels)"""
+
+    def __init__(self, starts, ends, speakers, labels):
+        self.starts = starts
+        self.ends = ends
+        self.speakers = speakers
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build from [{'start', 'end', 'speaker'}] (any order)"""
+        return _columns([seg['start'] for seg in segments], [seg['end'] for seg in segments],
+                        [seg['speaker'] for seg in segments])
+
+    def speaker_labels(self):
+        """The label of every turn, in turn order"""
+        return [self.labels[code] for code in self.speakers.tolist()]
+
+
+def _columns(starts, ends, labels):
+    """SpeakerTurns from parallel lists; the sort is stable, so turns with equal starts keep file order"""
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    table, codes = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    order = np.argsort(starts, kind="stable")
+    return SpeakerTurns(starts[order], ends[order], codes.astype(np.int32)[order], table.tolist())
+
+
+def parse_rttm(rttm_path):
+    """Parse the SPEAKER lines of an RTTM file (type file channel start duration _ _ speaker ...)"""
+    starts, ends, labels = [], [], []
+    with open(rttm_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 8 and parts[0] == "SPEAKER":
+                start = float(parts[3])
+                starts.append(start)
+                ends.append(start + float(parts[4]))
+                labels.append(parts[7])
+    return _columns(starts, ends, labels)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(rttm_path):
+    return rttm_path + CACHE_SUFFIX
+
+
+def _read_cache(rttm_path, stat):
+    """Cached turns if they still describe the RTTM, else None"""
+    path = cache_path(rttm_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as cached:
+            if int(cached["version"]) != CACHE_VERSION or int(cached["source_size"]) != stat.st_size:
+                return None
+            if int(cached["source_mtime_ns"]) != stat.st_mtime_ns:
+                if str(cached["source_sha256"]) != file_sha256(rttm_path):
+                    return None
+                # Same content under a new mtime: refresh the key so the next load skips the hash
+                refresh = True
+            else:
+                refresh = False
+            turns = SpeakerTurns(cached["starts"], cached["ends"], cached["speakers"], cached["labels"].tolist())
+            sha256 = str(cached["source_sha256"])
+    except (OSError, ValueError, KeyError):
+        return None  # unreadable or from an older layout: parse again
+    if refresh:
+        _write_cache(rttm_path, stat, turns, sha256)
+    return turns
+
+
+def _write_cache(rttm_path, stat, turns, sha256):
+    path = cache_path(rttm_path)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=CACHE_VERSION, source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns,
+                     source_sha256=sha256, starts=turns.starts, ends=turns.ends, speakers=turns.speakers,
+                     labels=np.asarray(turns.labels, dtype=str))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # A read-only results folder only costs the next run a parse
+        print(f"⚠️  rttm: cannot write cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_rttm(rttm_path, use_cache=True):
+    """Speaker turns of an RTTM file, from the .npz cache when it is still valid (OSError if the file is missing)"""
+    stat = os.stat(rttm_path)
+    if use_cache:
+        turns = _read_cache(rttm_path, stat)
+        if turns is not None:
+            return turns
+    turns = parse_rttm(rttm_path)
+    if use_cache:
+        _write_cache(rttm_path, stat, turns, file_sha256(rttm_path))
+    return turns
+
+
+def _union(starts, ends):
+    """Intervals sorted by start merged into non-overlapping (starts, ends); touching ones are joined"""
+    if len(starts) == 0:
+        return np.zeros(0), np.zeros(0)
+    max_ends = np.maximum.accumulate(ends)
+    # A new interval begins where a turn starts after everything before it has ended
+    first = np.concatenate(([True], starts[1:] > max_ends[:-1]))
+    group_starts = np.flatnonzero(first)
+    group_ends = np.concatenate((group_starts[1:] - 1, [len(starts) - 1]))
+    return starts[group_starts], max_ends[group_ends]
+
+
+def speech_intervals(turns):
+    """Turns of all speakers merged into non-overlapping (start, end) intervals"""
+    return _union(turns.starts, turns.ends)
+
+
+def speaker_intervals(turns):
+    """For every speaker code, the union of its own turns as (starts, ends)"""
+    return [_union(turns.starts[turns.speakers == code], turns.ends[turns.speakers == code])
+            for code in range(len(turns.labels))]
+
+
+def _covered(union_starts, union_ends, speech_before, times):
+    """Seconds of the union intervals that lie in [0, t], for every t"""
+    k = np.searchsorted(union_starts, times, side="right") - 1
+    at = np.maximum(k, 0)
+    inside = np.clip(times - union_starts[at], 0.0, union_ends[at] - union_starts[at])
+    return np.where(k >= 0, speech_before[at] + inside, 0.0)
+
+
+def speaker_overlaps(turns, starts, ends):
+    """
+    Seconds each [start, end] interval overlaps each speaker, as an array of
+    shape (intervals, speakers). A speaker's own turns are merged first, so
+    they never count twice; the overlap is then the difference of that
+    speaker's cumulative speech time at both ends of the interval, found by
+    binary search for all intervals at once.
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    overlaps = np.zeros((len(starts), len(turns.labels)))
+    for code, (union_starts, union_ends) in enumerate(speaker_intervals(turns)):
+        if len(union_starts) == 0:
+            continue
+        speech_before = np.concatenate(([0.0], np.cumsum(union_ends - union_starts)))
+        overlaps[:, code] = (_covered(union_starts, union_ends, speech_before, ends)
+                             - _covered(union_starts, union_ends, speech_before, starts))
+    return overlaps
+
+
+def speaker_distances(turns, times):
+    """Seconds from each time to the nearest turn of each speaker (0 inside a turn): (times, speakers)"""
+    times = np.asarray(times, dtype=np.float64)
+    distances = np.full((len(times), len(turns.labels)), np.inf)
+    for code, (union_starts, union_ends) in enumerate(speaker_intervals(turns)):
+        if len(union_starts) == 0:
+            continue
+        k = np.searchsorted(union_starts, times, side="right") - 1
+        after_previous = np.where(k >= 0, times - union_ends[np.maximum(k, 0)], np.inf)
+        before_next = np.where(k + 1 < len(union_starts),
+                               union_starts[np.minimum(k + 1, len(union_starts) - 1)] - times, np.inf)
+        distances[:, code] = np.maximum(np.minimum(after_previous, before_next), 0.0)
+    return distances
@@ -6,9 +6,19 @@ Runs all steps from video input to AI summary
 
 import os
 import sys
+import shutil
+import argparse
+import threading
 import subprocess
 import time
+import importlib.util
+import multiprocessing
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import catalog
+import metrics
+import waveform_cache
 
 # Add current directory to path so we can import other scripts
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -31,9 +41,6 @@ def run_script(script_name, script_description):
     try:
         # Import and run the script
         if script_name == "1-extract_audio.py":
-            from importlib import import_module
-            module = import_module("1-extract_audio")
-            # We'll need to modify the original scripts to support automation
             print("⚠️  Please run manually for now: python 1-extract_audio.py")
             return False
             
@@ -136,9 +143,20 @@ def show_project_status():
         if len(input_files) > 5:
             print(f"   ... and {len(input_files) - 5} more")
     
-    # Check processed projects
+    # Check processed projects: the catalog knows which summaries finished
+    table = catalog.stage_table()
     summaries_dir = Path("summaries")
-    if summaries_dir.exists():
+    if table:
+        completed = sorted(meeting for meeting, stages in table.items()
+                           if stages.get("summarize") == catalog.DONE)
+        print(f"✅ Completed: {len(completed)} projects")
+        for name in completed:
+            print(f"   - {name}")
+        failed = sorted(f"{meeting} ({stage})" for meeting, stages in table.items()
+                        for stage, status in stages.items() if status == catalog.FAILED)
+        if failed:
+            print(f"❌ Failed: {', '.join(failed)}")
+    elif summaries_dir.exists():
         completed = list(summaries_dir.iterdir())
         print(f"✅ Completed: {len(completed)} projects")
         for proj in completed:
@@ -146,6 +164,672 @@ def show_project_status():
     else:
         print("📋 No completed projects yet")
 
+# ---------------------------------------------------------------------------
+# Non-interactive pipeline engine
+# ---------------------------------------------------------------------------
+
+DIARIZATION_SCRIPT = os.path.join("..", "diarization", "run_diarization.py")
+
+# Stage graph: each stage runs per meeting once all of its dependencies
+# for that meeting have finished. Different meetings flow through the graph
+# independently, so one meeting can be splitting while another is in Whisper.
+PIPELINE_STAGES = {
+    "extract": {"script": "1-extract_audio.py", "deps": (), "workers": 2},
+    "split": {"script": "2-split_audio.py", "deps": ("extract",), "workers": 2},
+    "transcribe": {"script": "3-transcribe_local_batch.py", "deps": ("split",), "workers": 1},
+    "diarize": {"script": DIARIZATION_SCRIPT, "deps": ("extract",), "workers": 1},
+    "merge": {"script": "4-merge_transcripts.py", "deps": ("transcribe",), "workers": 2},
+    "apply_diarization": {"script": "4.5-apply_diarization.py", "deps": ("merge", "diarize"), "workers": 2},
+    "summarize": {"script": "5-create_summary_openrouter.py", "deps": ("merge",), "workers": 2},
+}
+
+# In streaming mode Whisper decodes the input video itself, so transcription
+# no longer waits for extraction/splitting and no chunk files are written.
+# Extraction still runs when diarization needs the audio.
+STREAMING_DEPS = {"transcribe": ()}
+STREAMING_SKIP = ("split",)
+
+# Task states
+DONE = "done"          # stage ran and produced its output
+UP_TO_DATE = "skipped"  # output already existed, nothing to do
+FAILED = "failed"
+BLOCKED = "blocked"     # a dependency failed
+
+_module_cache = {}
+_module_lock = threading.Lock()
+
+
+def load_stage_module(script):
+    """Import a stage script by file name (names like 4.5-apply_diarization are not importable directly)"""
+    with _module_lock:
+        if script not in _module_cache:
+            path = os.path.abspath(script)
+            name = os.path.splitext(os.path.basename(path))[0].replace("-", "_").replace(".", "_")
+            spec = importlib.util.spec_from_file_location(name, path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _module_cache[script] = module
+        return _module_cache[script]
+
+
+def stage_module(stage):
+    return load_stage_module(PIPELINE_STAGES[stage]["script"])
+
+
+def extracted_audio_files():
+    """Audio files in audio-from-input/ (without creating the folder, unlike get_audio_files)"""
+    split = stage_module("split")
+    if not os.path.isdir(split.AUDIO_INPUT_DIR):
+        return []
+    return split.get_audio_files(split.AUDIO_INPUT_DIR)
+
+
+def find_meeting_audio(meeting):
+    """Return the extracted audio file name for a meeting, or None"""
+    for filename in extracted_audio_files():
+        if os.path.splitext(filename)[0] == meeting:
+            return filename
+    return None
+
+
+def discover_meetings():
+    """Meetings are named after input videos and already extracted audio files"""
+    extract = stage_module("extract")
+    names = {os.path.splitext(f)[0] for f in extract.get_webm_files(extract.INPUT_DIR)}
+    names.update(os.path.splitext(f)[0] for f in extracted_audio_files())
+    return sorted(names)
+
+
+def _is_fresh(path, since):
+    return os.path.exists(path) and os.path.getmtime(path) >= since
+
+
+# --- Output checks: a stage whose output exists is up to date (also used by status/plan) ---
+
+def extract_done(meeting):
+    return find_meeting_audio(meeting) is not None
+
+
+def split_done(meeting):
+    audio_filename = find_meeting_audio(meeting)
+    return audio_filename is not None and stage_module("split").has_chunks_been_created(audio_filename)
+
+
+def transcribe_done(meeting, streaming=False):
+    transcribe = stage_module("transcribe")
+    if streaming:
+        output_dir = os.path.join(transcribe.RAW_TEXT_BASE_DIR, meeting)
+        return os.path.isdir(output_dir) and any(f.endswith("_part001.txt") for f in os.listdir(output_dir))
+    return transcribe.get_transcription_status(meeting) == "Готово"
+
+
+def diarize_done(meeting):
+    return os.path.exists(os.path.join(stage_module("apply_diarization").DIARIZATION_DIR, f"{meeting}.rttm"))
+
+
+def merge_done(meeting):
+    merge = stage_module("merge")
+    return merge.has_merged_file(os.path.join(merge.RAW_TEXT_BASE_DIR, meeting))
+
+
+def apply_diarization_done(meeting):
+    apply = stage_module("apply_diarization")
+    return os.path.exists(os.path.join(apply.RAW_TEXT_DIR, meeting, apply.DIARIZED_FILENAME))
+
+
+def summarize_done(meeting):
+    return stage_module("summarize").get_summary_status(meeting)
+
+
+STAGE_DONE_CHECKS = {
+    "extract": extract_done,
+    "split": split_done,
+    "transcribe": transcribe_done,
+    "diarize": diarize_done,
+    "merge": merge_done,
+    "apply_diarization": apply_diarization_done,
+    "summarize": summarize_done,
+}
+
+
+def stage_done(stage, meeting, streaming=False):
+    """The outputs exist and, if the catalog knows the stage, its last run finished"""
+    if catalog.stage_status(meeting, stage) not in (None, catalog.DONE):
+        return False
+    if stage == "transcribe":
+        return transcribe_done(meeting, streaming)
+    return STAGE_DONE_CHECKS[stage](meeting)
+
+
+def run_extract(engine, meeting, rerun):
+    extract = stage_module("extract")
+    if not rerun and stage_done("extract", meeting):
+        return UP_TO_DATE
+    webm_file = f"{meeting}.webm"
+    if not os.path.exists(os.path.join(extract.INPUT_DIR, webm_file)):
+        print(f"[{meeting}] no input video and no extracted audio")
+        return FAILED
+    os.makedirs(extract.OUTPUT_DIR, exist_ok=True)
+    # Stream-copies the audio track when its codec is usable downstream
+    return DONE if extract.extract_file(webm_file, audio_format=engine.audio_format)["output"] else FAILED
+
+
+def run_split(engine, meeting, rerun):
+    split = stage_module("split")
+    audio_filename = find_meeting_audio(meeting)
+    if audio_filename is None:
+        return FAILED
+    if split.has_chunks_been_created(audio_filename):
+        if not rerun:
+            return UP_TO_DATE
+        shutil.rmtree(os.path.join(split.CHUNKS_OUTPUT_DIR, meeting))
+    input_path = os.path.join(split.AUDIO_INPUT_DIR, audio_filename)
+    split.split_audio_into_chunks(input_path, split.CHUNKS_OUTPUT_DIR, audio_filename, mode=engine.split_mode)
+    return DONE if split.has_chunks_been_created(audio_filename) else FAILED
+
+
+def find_meeting_source(meeting):
+    """Original media for streaming mode: the input video, else extracted audio"""
+    extract = stage_module("extract")
+    video_path = os.path.join(extract.INPUT_DIR, f"{meeting}.webm")
+    if os.path.exists(video_path):
+        return video_path
+    audio_filename = find_meeting_audio(meeting)
+    if audio_filename:
+        return os.path.join(stage_module("split").AUDIO_INPUT_DIR, audio_filename)
+    return None
+
+
+def get_shared_waveform(engine, meeting):
+    """The meeting's decoded 16 kHz waveform, memory-mapped; decoded on first use"""
+    source = find_meeting_source(meeting)
+    if source is None or waveform_cache.ensure_waveform(meeting, source) is None:
+        return None
+    return waveform_cache.open_waveform(meeting)
+
+
+def get_whisper(engine):
+    """The shared Whisper pipeline, loaded with the selected ASR backend on first use"""
+    transcribe = stage_module("transcribe")
+    if engine.asr_backend:
+        transcribe.ASR_BACKEND = engine.asr_backend
+    if engine.vad:
+        transcribe.VAD_MODE = engine.vad
+    if engine.shared_waveform:
+        transcribe.USE_SHARED_WAVEFORM = True
+    if engine.word_timestamps:
+        transcribe.WORD_TIMESTAMPS = True
+    return engine.get_resource("whisper", transcribe.load_whisper_pipeline)
+
+
+def run_transcribe(engine, meeting, rerun):
+    if engine.streaming:
+        return run_transcribe_stream(engine, meeting, rerun)
+    transcribe = stage_module("transcribe")
+    status = transcribe.get_transcription_status(meeting)
+    if status == "Готово" and not rerun:
+        return UP_TO_DATE
+    pipe = get_whisper(engine)
+    if pipe is None:
+        return FAILED
+    if engine.shared_waveform:
+        get_shared_waveform(engine, meeting)
+    if engine.batch_size:
+        transcribe.transcribe_batched([meeting], pipe, batch_size=engine.batch_size, force_rerun=rerun)
+    else:
+        transcribe.process_meeting_folder(meeting, pipe, force_rerun=status != "Не начато")
+    return DONE if transcribe.get_transcription_status(meeting) == "Готово" else FAILED
+
+
+def run_transcribe_stream(engine, meeting, rerun):
+    transcribe = stage_module("transcribe")
+    if stage_done("transcribe", meeting, streaming=True) and not rerun:
+        return UP_TO_DATE
+    media_path = find_meeting_source(meeting)
+    if media_path is None:
+        print(f"[{meeting}] no input video and no extracted audio")
+        return FAILED
+    pipe = get_whisper(engine)
+    if pipe is None:
+        return FAILED
+    if engine.shared_waveform:
+        get_shared_waveform(engine, meeting)
+    return DONE if transcribe.transcribe_stream(meeting, media_path, pipe, force_rerun=True) else FAILED
+
+
+def run_diarize(engine, meeting, rerun):
+    apply = stage_module("apply_diarization")
+    if stage_done("diarize", meeting) and not rerun:
+        return UP_TO_DATE
+    audio_file = find_meeting_audio(meeting)
+    if audio_file is None:
+        print(f"❌ [{meeting}] diarize: no extracted audio in {stage_module('split').AUDIO_INPUT_DIR}/")
+        return FAILED
+    diarization = stage_module("diarize")
+    pipeline = engine.get_resource("pyannote", diarization.load_diarization_pipeline)
+    if pipeline is None:
+        return FAILED
+    audio_path = os.path.join(stage_module("split").AUDIO_INPUT_DIR, audio_file)
+    waveform = get_shared_waveform(engine, meeting) if engine.shared_waveform else None
+    result = diarization.diarize_file(pipeline, audio_path, results_dir=apply.DIARIZATION_DIR, verbose=False,
+                                      waveform=waveform)
+    return DONE if result else FAILED
+
+
+def run_merge(engine, meeting, rerun):
+    merge = stage_module("merge")
+    meeting_path = os.path.join(merge.RAW_TEXT_BASE_DIR, meeting)
+    if stage_done("merge", meeting) and not rerun:
+        return UP_TO_DATE
+    started = time.time()
+    merge.merge_text_files_for_meeting(meeting)
+    return DONE if _is_fresh(os.path.join(meeting_path, merge.MERGED_FILENAME), started) else FAILED
+
+
+def run_apply_diarization(engine, meeting, rerun):
+    apply = stage_module("apply_diarization")
+    if stage_done("apply_diarization", meeting) and not rerun:
+        return UP_TO_DATE
+    return DONE if apply.apply_diarization_to_transcript(meeting) else FAILED
+
+
+def run_summarize(engine, meeting, rerun):
+    summarize = stage_module("summarize")
+    if stage_done("summarize", meeting) and not rerun:
+        return UP_TO_DATE
+    started = time.time()
+    summarize.create_summary_for_meeting(meeting, map_reduce=engine.map_reduce or None)
+    summary_path = os.path.join(summarize.SUMMARIES_BASE_DIR, meeting, summarize.SUMMARY_FILENAME)
+    return DONE if _is_fresh(summary_path, started) else FAILED
+
+
+STAGE_RUNNERS = {
+    "extract": run_extract,
+    "split": run_split,
+    "transcribe": run_transcribe,
+    "diarize": run_diarize,
+    "merge": run_merge,
+    "apply_diarization": run_apply_diarization,
+    "summarize": run_summarize,
+}
+
+
+class PipelineEngine:
+    """
+    Runs the stage graph for many meetings at once.
+
+    Every stage has its own worker pool, so a meeting enters the next stage
+    as soon as its dependencies are finished while other meetings keep the
+    remaining stages busy. A stage whose output already exists is skipped,
+    unless one of its dependencies actually ran in this session (or force
+    is set), so re-running the engine resumes where it stopped.
+    """
+
+    def __init__(self, meetings, workers=None, skip_stages=(), force=False, streaming=False, batch_size=None,
+                 map_reduce=False, audio_format=None, asr_backend=None, vad=None, split_mode=None,
+                 shared_waveform=False, model_threads=None, word_timestamps=False):
+        self.meetings = list(meetings)
+        # Stage options, also used to rebuild the engine inside model processes
+        self.options = dict(streaming=streaming, batch_size=batch_size, map_reduce=map_reduce,
+                            audio_format=audio_format, asr_backend=asr_backend, vad=vad,
+                            split_mode=split_mode, shared_waveform=shared_waveform,
+                            model_threads=model_threads, word_timestamps=word_timestamps)
+        self.audio_format = audio_format
+        self.asr_backend = asr_backend
+        self.vad = vad
+        self.split_mode = split_mode
+        self.shared_waveform = shared_waveform
+        self.word_timestamps = word_timestamps
+        self.force = force
+        self.streaming = streaming
+        self.batch_size = batch_size
+        self.map_reduce = map_reduce
+        self.deps = {stage: config["deps"] for stage, config in PIPELINE_STAGES.items()}
+        if streaming:
+            self.deps.update(STREAMING_DEPS)
+            skip_stages = set(skip_stages) | set(STREAMING_SKIP)
+            if "diarize" in skip_stages:
+                skip_stages.add("extract")
+        if vad == "rttm" and "diarize" not in skip_stages:
+            # Silence is cut along the speaker turns, so diarization has to finish first
+            self.deps["transcribe"] = self.deps["transcribe"] + ("diarize",)
+        if split_mode == "rttm" and "diarize" not in skip_stages:
+            # Chunk boundaries are placed in the gaps between speaker turns
+            self.deps["split"] = self.deps["split"] + ("diarize",)
+        self.stages = self._active_stages(skip_stages)
+        self.workers = {stage: PIPELINE_STAGES[stage]["workers"] for stage in self.stages}
+        for stage, count in (workers or {}).items():
+            if stage not in PIPELINE_STAGES:
+                raise ValueError(f"Unknown stage: {stage}")
+            if stage in self.workers:
+                self.workers[stage] = max(1, int(count))
+
+        self.state = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._remaining = len(self.meetings) * len(self.stages)
+        self._resources = {}
+        self._resource_lock = threading.Lock()
+        self._executors = {}
+        # Model stages running in their own processes: stage -> (torch threads, interop threads)
+        self.model_threads = {stage: budget for stage, budget in (model_threads or {}).items()
+                              if stage in self.stages}
+        self._process_pools = {}
+        self._rerun_meetings = set()
+
+    def _active_stages(self, skip_stages):
+        """Enabled stages in dependency order (rttm modes make earlier stages wait for diarize)"""
+        candidates = [stage for stage in PIPELINE_STAGES if stage not in skip_stages]
+        active = []
+        added = True
+        while added:
+            added = False
+            for stage in candidates:
+                # A stage whose dependency is disabled cannot run either
+                if stage not in active and all(dep in active for dep in self.deps[stage]):
+                    active.append(stage)
+                    added = True
+        return active
+
+    def _dependents(self, stage):
+        return [s for s in self.stages if stage in self.deps[s]]
+
+    def get_resource(self, name, loader):
+        """Load a heavy shared object (model pipeline) once, on first use"""
+        with self._resource_lock:
+            if name not in self._resources:
+                self._resources[name] = loader()
+            return self._resources[name]
+
+    def run(self):
+        if not self.meetings or not self.stages:
+            return self.state
+
+        self.start()
+        started = time.time()
+        try:
+            with self._lock:
+                self._submit_roots(self.meetings)
+            self._finished.wait()
+        finally:
+            self.shutdown()
+        self.wall_time = time.time() - started
+        return self.state
+
+    def start(self):
+        """Create the stage worker pools (run() does this; long-lived callers use it with add_meetings)"""
+        self._executors = {
+            stage: ThreadPoolExecutor(max_workers=self.workers[stage], thread_name_prefix=stage)
+            for stage in self.stages
+        }
+        context = multiprocessing.get_context("spawn")
+        for stage, (threads, interop_threads) in self.model_threads.items():
+            print(f"🧵 {stage}: separate process(es), torch threads={threads}, interop={interop_threads}")
+            self._process_pools[stage] = ProcessPoolExecutor(
+                max_workers=self.workers[stage], mp_context=context, initializer=_init_model_process,
+                initargs=(os.getcwd(), threads, interop_threads, self.options))
+
+    def shutdown(self, cancel=False):
+        """Stop the pools; with cancel, queued tasks are dropped and only running ones finish"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=True, cancel_futures=cancel)
+        for pool in self._process_pools.values():
+            pool.shutdown(wait=True)
+
+    def add_meetings(self, meetings, rerun=False):
+        """
+        Queue more meetings on a started engine. With rerun, every stage of
+        these meetings runs again even if its output exists (used to redo
+        meetings whose processing was interrupted or whose recording was
+        replaced). A meeting the engine already finished starts over with a
+        clean state; one that is still in progress is left alone.
+        """
+        with self._lock:
+            queued = []
+            for meeting in meetings:
+                if meeting in self.meetings:
+                    if self._result(meeting) is None:
+                        continue
+                    for stage in self.stages:
+                        self.state.pop((meeting, stage), None)
+                        self.timings.pop((meeting, stage), None)
+                else:
+                    self.meetings.append(meeting)
+                queued.append(meeting)
+            if rerun:
+                self._rerun_meetings.update(queued)
+            else:
+                self._rerun_meetings.difference_update(queued)
+            self._remaining += len(queued) * len(self.stages)
+            if self._remaining:
+                self._finished.clear()
+            self._submit_roots(queued)
+        return queued
+
+    def meeting_result(self, meeting):
+        """None while the meeting is in progress, else True if no stage failed"""
+        with self._lock:
+            return self._result(meeting)
+
+    def _result(self, meeting):
+        states = [self.state.get((meeting, stage)) for stage in self.stages]
+        if any(state in (None, "running") for state in states):
+            return None
+        return not any(state in (FAILED, BLOCKED) for state in states)
+
+    def _submit_roots(self, meetings):
+        for meeting in meetings:
+            for stage in self.stages:
+                if not self.deps[stage]:
+                    self._submit(meeting, stage)
+
+    def _submit(self, meeting, stage):
+        self.state[(meeting, stage)] = "running"
+        rerun = self.force or meeting in self._rerun_meetings or any(
+            self.state.get((meeting, dep)) == DONE for dep in self.deps[stage]
+        )
+        self._executors[stage].submit(self._run_task, meeting, stage, rerun)
+
+    def _run_task(self, meeting, stage, rerun):
+        print(f"\n▶️  [{meeting}] {stage}")
+        started = time.time()
+        try:
+            if stage in self._process_pools:
+                status = self._process_pools[stage].submit(_run_in_model_process, stage, meeting, rerun).result()
+            else:
+                status = STAGE_RUNNERS[stage](self, meeting, rerun)
+        except Exception as e:
+            print(f"❌ [{meeting}] {stage} crashed: {e}")
+            status = FAILED
+            error = str(e)
+        else:
+            error = None if status != FAILED else "stage failed"
+        elapsed = time.time() - started
+        metrics.record(f"engine.{stage}", meeting, wall_seconds=round(elapsed, 4), error=error, status=status)
+        print(f"{'✅' if status != FAILED else '❌'} [{meeting}] {stage}: {status} ({elapsed:.1f}s)")
+        self._complete(meeting, stage, status, elapsed)
+
+    def _complete(self, meeting, stage, status, elapsed):
+        with self._lock:
+            self.state[(meeting, stage)] = status
+            self.timings[(meeting, stage)] = elapsed
+            self._remaining -= 1
+
+            for dependent in self._dependents(stage):
+                if (meeting, dependent) in self.state:
+                    continue
+                dep_states = [self.state.get((meeting, dep)) for dep in self.deps[dependent]]
+                if any(s in (FAILED, BLOCKED) for s in dep_states):
+                    self._block(meeting, dependent)
+                elif all(s in (DONE, UP_TO_DATE) for s in dep_states):
+                    self._submit(meeting, dependent)
+
+            if self._remaining == 0:
+                self._finished.set()
+
+    def _block(self, meeting, stage):
+        if (meeting, stage) in self.state:
+            return
+        self.state[(meeting, stage)] = BLOCKED
+        self._remaining -= 1
+        for dependent in self._dependents(stage):
+            self._block(meeting, dependent)
+
+    def print_report(self):
+        print_header("PIPELINE REPORT")
+        for meeting in self.meetings:
+            line = ", ".join(f"{stage}={self.state.get((meeting, stage), '-')}" for stage in self.stages)
+            print(f"  {meeting}: {line}")
+
+        busy = {stage: sum(t for (m, s), t in self.timings.items() if s == stage) for stage in self.stages}
+        print("\nStage busy time:")
+        for stage in self.stages:
+            print(f"  {stage:<18} {busy[stage]:8.1f}s  (workers: {self.workers[stage]})")
+        print(f"\nSerial time would be ~{sum(busy.values()):.1f}s, wall-clock: {getattr(self, 'wall_time', 0):.1f}s")
+
+
+# Engine of a model process: keeps its model loaded between meetings
+_process_engine = None
+
+
+def _init_model_process(work_dir, threads, interop_threads, options):
+    """Give a model process its own CPU budget before torch is imported"""
+    global _process_engine
+    os.chdir(work_dir)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(interop_threads)
+    _process_engine = PipelineEngine([], **options)
+
+
+def _run_in_model_process(stage, meeting, rerun):
+    return STAGE_RUNNERS[stage](_process_engine, meeting, rerun)
+
+
+def default_thread_budgets(cpu_count=None):
+    """
+    Split the cores between the two model stages: Whisper decoding is the
+    heavier of the two, so it gets two thirds. Interop threads stay low,
+    both pipelines mostly parallelize inside operators.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    transcribe = max(1, round(cpu_count * 2 / 3))
+    diarize = max(1, cpu_count - transcribe)
+    return {"transcribe": (transcribe, 1), "diarize": (diarize, 1)}
+
+
+def parse_thread_budgets(values):
+    """Parse ['transcribe=8', 'diarize=4:2'] into {stage: (threads, interop threads)}"""
+    budgets = {}
+    for value in values or []:
+        stage, _, budget = value.partition("=")
+        threads, _, interop = budget.partition(":")
+        if not threads.isdigit() or (interop and not interop.isdigit()):
+            raise ValueError(f"Invalid thread budget '{value}', expected stage=N or stage=N:M")
+        budgets[stage.strip()] = (max(1, int(threads)), max(1, int(interop or 1)))
+    return budgets
+
+
+def parse_worker_limits(values):
+    """Parse ['transcribe=1', 'extract=4'] into a dict"""
+    limits = {}
+    for value in values or []:
+        stage, _, count = value.partition("=")
+        if not count.isdigit():
+            raise ValueError(f"Invalid worker limit '{value}', expected stage=N")
+        limits[stage.strip()] = int(count)
+    return limits
+
+
+def run_engine(meetings=None, workers=None, skip_stages=(), force=False, streaming=False, batch_size=None,
+               map_reduce=False, audio_format=None, asr_backend=None, vad=None, split_mode=None,
+               shared_waveform=False, model_threads=None, word_timestamps=False):
+    """Run the pipeline unattended for the given (or all discovered) meetings"""
+    for dir_name in ["input", "audio-from-input", "chunks", "raw_text", "summaries"]:
+        Path(dir_name).mkdir(exist_ok=True)
+
+    meetings = meetings or discover_meetings()
+    if not meetings:
+        print("📭 Nothing to process: no videos in input/ and no audio in audio-from-input/")
+        return None
+
+    engine = PipelineEngine(meetings, workers=workers, skip_stages=skip_stages, force=force,
+                            streaming=streaming, batch_size=batch_size, map_reduce=map_reduce,
+                            audio_format=audio_format, asr_backend=asr_backend, vad=vad,
+                            split_mode=split_mode, shared_waveform=shared_waveform, model_threads=model_threads,
+                            word_timestamps=word_timestamps)
+    print(f"🚀 Processing {len(meetings)} meeting(s) through: {' → '.join(engine.stages)}")
+    engine.run()
+    engine.print_report()
+    return engine
+
+
+# ---------------------------------------------------------------------------
+# Quick commands: list, status, plan
+# ---------------------------------------------------------------------------
+# They only look at files on disk. Stage modules are loaded for their paths
+# and output checks; torch, transformers, pyannote, openai and numpy are
+# imported lazily by the stages, so these commands start almost instantly
+# (benchmarks/bench_cli_startup.py keeps it that way).
+
+def list_meetings():
+    for meeting in discover_meetings():
+        print(meeting)
+
+
+def print_status(meetings=None, streaming=False):
+    """
+    State of every stage for every meeting: from the catalog (one query),
+    and by the stage's output files where the catalog has no entry
+    """
+    meetings = meetings or discover_meetings()
+    if not meetings:
+        print("📭 No meetings: no videos in input/ and no audio in audio-from-input/")
+        return
+    table = catalog.stage_table() or {}
+    width = max(len("meeting"), *(len(meeting) for meeting in meetings))
+    columns = [stage[:10] for stage in PIPELINE_STAGES]
+    print(f"{'meeting':<{width}}  " + "  ".join(f"{column:>10}" for column in columns))
+    for meeting in meetings:
+        known = table.get(meeting, {})
+        marks = [known.get(stage) or ("done" if stage_done(stage, meeting, streaming) else "-")
+                 for stage in PIPELINE_STAGES]
+        print(f"{meeting:<{width}}  " + "  ".join(f"{mark:>10}" for mark in marks))
+
+
+def plan_meeting(engine, meeting):
+    """Stages the engine would run for a meeting, by the same rule as _submit"""
+    runs = {}
+    for stage in engine.stages:
+        runs[stage] = (engine.force or meeting in engine._rerun_meetings
+                       or any(runs.get(dep) for dep in engine.deps[stage])
+                       or not stage_done(stage, meeting, engine.streaming))
+    return [stage for stage in engine.stages if runs[stage]]
+
+
+def print_plan(meetings=None, **options):
+    """What run would do with these options, without loading any model"""
+    engine = PipelineEngine(meetings or discover_meetings(), **options)
+    print("Stages:")
+    for stage in engine.stages:
+        deps = ", ".join(engine.deps[stage]) or "-"
+        where = "process, torch threads=%d:%d" % engine.model_threads[stage] if stage in engine.model_threads else "thread"
+        print(f"  {stage:<18} after: {deps:<22} workers: {engine.workers[stage]}  ({where})")
+    skipped = [stage for stage in PIPELINE_STAGES if stage not in engine.stages]
+    if skipped:
+        print(f"  left out: {', '.join(skipped)}")
+    if not engine.meetings:
+        print("\n📭 No meetings: no videos in input/ and no audio in audio-from-input/")
+        return
+    print("\nWork:")
+    for meeting in engine.meetings:
+        stages = plan_meeting(engine, meeting)
+        print(f"  {meeting}: {' → '.join(stages) if stages else 'up to date'}")
+
+
 def run_complete_pipeline():
     """Run the complete pipeline"""
     print_header("RUNNING COMPLETE PIPELINE")
@@ -154,11 +838,13 @@ def run_complete_pipeline():
         ("1-extract_audio.py", "Extract audio from videos"),
         ("2-split_audio.py", "Split audio into chunks"),
         ("3-transcribe_local_batch.py", "Transcribe audio to text"),
+        ("run_diarization.py", "Speaker diarization (parallel to transcription)"),
         ("4-merge_transcripts.py", "Merge transcript files"),
+        ("4.5-apply_diarization.py", "Apply speaker labels"),
         ("5-create_summary_openrouter.py", "Generate AI summary")
     ]
     
-    print("This will run all 5 steps in sequence:")
+    print("This will run all steps for every meeting, pipelined across meetings:")
     for i, (script, desc) in enumerate(steps, 1):
         print(f"  {i}. {desc}")
     
@@ -167,24 +853,100 @@ def run_complete_pipeline():
         return
     
     print("\n🚀 Starting complete pipeline...")
-    
-    for i, (script, description) in enumerate(steps, 1):
-        print_step(i, description)
-        
-        # For now, we'll just show what would be run
-        print(f"Would run: python {script}")
-        print("⚠️  Manual execution required - scripts need user input")
-        
-        continue_choice = input("\nContinue to next step? (y/n): ")
-        if continue_choice.lower() != 'y':
-            print("Pipeline stopped by user")
-            return
-    
-    print("\n🎉 Pipeline completed!")
+    run_engine()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Audio processing pipeline")
+    parser.add_argument("command", nargs="?", choices=["list", "status", "plan", "run", "watch"],
+                        help="list meetings, show their stage status, show what a run would do, "
+                             "run (same as --auto) or watch (same as --watch); without it, the interactive menu")
+    parser.add_argument("--auto", action="store_true",
+                        help="run the whole pipeline unattended instead of the interactive menu")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process every new video dropped into input/ (restart-safe)")
+    parser.add_argument("--meetings", nargs="+", help="only process these meetings (default: all found)")
+    parser.add_argument("--workers", action="append", metavar="STAGE=N",
+                        help="worker limit for a stage, e.g. --workers extract=4 (repeatable)")
+    parser.add_argument("--skip", nargs="+", default=[], choices=list(PIPELINE_STAGES),
+                        help="stages to leave out (stages depending on them are left out too)")
+    parser.add_argument("--no-diarization", action="store_true",
+                        help="shortcut for --skip diarize")
+    parser.add_argument("--force", action="store_true", help="re-run stages even if their output exists")
+    parser.add_argument("--stream", action="store_true",
+                        help="feed decoded audio straight into Whisper, without intermediate mp3 chunks")
+    parser.add_argument("--batch-size", type=int,
+                        help="transcribe each meeting's chunks in batched mode with this many windows per forward pass")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="summarize transcript parts concurrently, then combine them")
+    parser.add_argument("--audio-format", choices=["mp3", "flac", "wav"],
+                        help="intermediate audio format; flac/wav are lossless 16 kHz mono, ready for Whisper and pyannote")
+    parser.add_argument("--asr-backend", choices=["transformers", "int8"],
+                        help="Whisper backend; int8 uses dynamic quantization and is much faster on CPU")
+    parser.add_argument("--split-mode", choices=["fixed", "energy", "rttm"],
+                        help="chunk boundaries: fixed 10-minute cuts with overlap, or aligned to pauses (energy/rttm)")
+    parser.add_argument("--shared-waveform", action="store_true",
+                        help="decode each meeting once to waveforms/<meeting>.npy; diarization and Whisper read it memory-mapped")
+    parser.add_argument("--vad", choices=["energy", "rttm"],
+                        help="cut silence before transcription, by signal energy or by the diarization speaker turns")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="ask Whisper for word timestamps; speakers are then attributed word by word")
+    parser.add_argument("--model-processes", action="store_true",
+                        help="run diarization and Whisper concurrently in separate processes with split CPU budgets")
+    parser.add_argument("--model-threads", action="append", metavar="STAGE=N[:M]",
+                        help="torch threads (and interop threads) of a model process, e.g. --model-threads transcribe=8 "
+                             "(implies --model-processes)")
+    parser.add_argument("--prometheus", metavar="PATH",
+                        help="keep per-stage metrics in Prometheus text format in this file (from metrics/events.jsonl)")
+    return parser.parse_args(argv)
+
+
+def engine_options(args):
+    """PipelineEngine keyword arguments from the command line"""
+    skip = set(args.skip)
+    if args.no_diarization:
+        skip.add("diarize")
+    model_threads = None
+    if args.model_processes or args.model_threads:
+        model_threads = default_thread_budgets()
+        model_threads.update(parse_thread_budgets(args.model_threads))
+    return dict(workers=parse_worker_limits(args.workers),
+                skip_stages=skip, force=args.force, streaming=args.stream,
+                batch_size=args.batch_size, map_reduce=args.map_reduce,
+                audio_format=args.audio_format, asr_backend=args.asr_backend, vad=args.vad,
+                split_mode=args.split_mode, shared_waveform=args.shared_waveform,
+                model_threads=model_threads, word_timestamps=args.word_timestamps)
+
 
 def main():
     """Main function"""
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    args = parse_args()
+
+    if args.prometheus:
+        # Through the environment, so model processes write the same file
+        os.environ["PIPELINE_METRICS_PROM"] = metrics.PROMETHEUS_FILE = os.path.abspath(args.prometheus)
+
+    if args.command == "list":
+        list_meetings()
+        return
+    if args.command == "status":
+        print_status(args.meetings, streaming=args.stream)
+        return
+    if args.command == "plan":
+        print_plan(args.meetings, **engine_options(args))
+        return
+
+    if args.auto or args.watch or args.command in ("run", "watch"):
+        options = engine_options(args)
+        if args.watch or args.command == "watch":
+            from watch_input import InputWatcher
+            for dir_name in ["input", "audio-from-input", "chunks", "raw_text", "summaries"]:
+                Path(dir_name).mkdir(exist_ok=True)
+            InputWatcher(PipelineEngine([], **options)).run()
+            return
+        engine = run_engine(args.meetings, **options)
+        failed = engine and any(s in (FAILED, BLOCKED) for s in engine.state.values())
+        sys.exit(1 if failed else 0)
     
     while True:
         show_menu()
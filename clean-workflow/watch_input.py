@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion for input/
+
+Waits for new videos in input/ and hands each one to a running
+PipelineEngine as soon as the file is complete, i.e. its size and mtime
+have not changed for STABLE_SECONDS (a browser download or a network copy
+is still growing before that). New files are noticed through inotify when
+the optional inotify_simple package is available, otherwise by polling.
+
+Progress is kept in watch_state.json, so the watcher can be restarted at
+any time: finished videos are not queued again, and a meeting that was
+being processed when the watcher stopped is redone from the first stage
+(the transcription and LLM caches make the repeated work cheap).
+
+Started by run_pipeline.py --watch, which passes the usual engine options.
+"""
+
+import os
+import json
+import time
+
+try:
+    from inotify_simple import INotify, flags
+    HAS_INOTIFY = True
+except ImportError:
+    HAS_INOTIFY = False
+
+WATCH_DIR = "input"
+VIDEO_EXTENSIONS = (".webm",)
+STATE_FILE = "watch_state.json"
+POLL_SECONDS = 2.0
+STABLE_SECONDS = 3.0
+
+
+class InputWatcher:
+    def __init__(self, engine, watch_dir=WATCH_DIR, state_file=STATE_FILE,
+                 poll_seconds=POLL_SECONDS, stable_seconds=STABLE_SECONDS):
+        self.engine = engine
+        self.watch_dir = watch_dir
+        self.state_file = state_file
+        self.poll_seconds = poll_seconds
+        self.stable_seconds = stable_seconds
+        self.state = self._load_state()
+        self._seen = {}  # meeting -> (size, mtime, time the file last changed)
+        self._active = set()
+        self._inotify = None
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def scan(self):
+        """Meetings whose video is complete and has not been processed in this exact version"""
+        now = time.time()
+        ready = []
+        for filename in sorted(os.listdir(self.watch_dir)):
+            if not filename.endswith(VIDEO_EXTENSIONS):
+                continue
+            meeting = os.path.splitext(filename)[0]
+            try:
+                stat = os.stat(os.path.join(self.watch_dir, filename))
+            except FileNotFoundError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            previous = self._seen.get(meeting)
+            if previous is None or previous[:2] != signature:
+                self._seen[meeting] = (*signature, now)
+                continue
+            if stat.st_size == 0 or now - previous[2] < self.stable_seconds or meeting in self._active:
+                continue
+            record = self.state.get(meeting, {})
+            if record.get("size") == stat.st_size and record.get("mtime") == stat.st_mtime \
+                    and record.get("status") in ("done", "failed"):
+                continue
+            ready.append((meeting, signature))
+        return ready
+
+    def _queue(self, ready):
+        previous = {m: self.state.get(m, {}).get("status") for m, _ in ready}
+        interrupted = [m for m, _ in ready if previous[m] == "processing"]
+        # scan() only returns a finished meeting again when its video changed
+        replaced = [m for m, _ in ready if previous[m] in ("done", "failed")]
+        fresh = [m for m, _ in ready if previous[m] is None]
+        for meeting, (size, mtime) in ready:
+            self.state[meeting] = {"size": size, "mtime": mtime, "status": "processing", "queued_at": time.time()}
+            self._active.add(meeting)
+        self._save_state()
+        if interrupted:
+            print(f"🔁 Redoing interrupted meeting(s): {', '.join(interrupted)}")
+            self.engine.add_meetings(interrupted, rerun=True)
+        if replaced:
+            print(f"🔄 Reprocessing replaced recording(s): {', '.join(replaced)}")
+            self.engine.add_meetings(replaced, rerun=True)
+        if fresh:
+            print(f"📥 New meeting(s): {', '.join(fresh)}")
+            self.engine.add_meetings(fresh)
+
+    def _collect_finished(self):
+        changed = False
+        for meeting in sorted(self._active):
+            result = self.engine.meeting_result(meeting)
+            if result is None:
+                continue
+            self._active.discard(meeting)
+            self.state[meeting]["status"] = "done" if result else "failed"
+            self.state[meeting]["finished_at"] = time.time()
+            print(f"{'✅' if result else '❌'} {meeting}: {self.state[meeting]['status']}")
+            changed = True
+        if changed:
+            self._save_state()
+
+    def _wait(self):
+        """Sleep until the folder changes (inotify) or the next poll is due"""
+        timeout = self.stable_seconds if self._seen else self.poll_seconds
+        if self._inotify is not None:
+            # Any event only wakes us up early; the scan decides what is ready
+            self._inotify.read(timeout=int(min(timeout, self.poll_seconds) * 1000))
+        else:
+            time.sleep(min(timeout, self.poll_seconds))
+
+    def run(self):
+        os.makedirs(self.watch_dir, exist_ok=True)
+        if HAS_INOTIFY:
+            self._inotify = INotify()
+            self._inotify.add_watch(self.watch_dir, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY)
+            mode = "inotify"
+        else:
+            mode = f"polling every {self.poll_seconds:g}s (pip install inotify_simple for instant pickup)"
+        print(f"👀 Watching {self.watch_dir}/ for {', '.join(VIDEO_EXTENSIONS)} files ({mode}); Ctrl+C to stop")
+
+        self.engine.start()
+        try:
+            while True:
+                ready = self.scan()
+                if ready:
+                    self._queue(ready)
+                self._collect_finished()
+                self._wait()
+        except KeyboardInterrupt:
+            print("\n⏹️  Stopping: waiting for running stages to finish...")
+        finally:
+            self.engine.shutdown(cancel=True)
+            self._collect_finished()
+            if self._inotify is not None:
+                self._inotify.close()
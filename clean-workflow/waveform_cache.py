@@ -0,0 +1,131 @@
+"""
+Shared decoded waveform per meeting.
+
+The recording is decoded once to 16 kHz mono float32 and stored as
+waveforms/<meeting>.npy. Transcription and diarization open it with
+np.load(mmap_mode=...) and work on slices of the mapping, so the audio is
+neither decoded again nor held in memory once per consumer: the OS page
+cache is shared between threads and processes. Decoding a meeting is
+serialized the same way: by a lock per meeting within a process and by
+flock() on waveforms/<meeting>.npy.lock between processes (diarization and
+Whisper workers with --model-processes).
+"""
+
+import os
+import shutil
+import threading
+import subprocess
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialized
+    fcntl = None
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+WAVEFORM_DIR = "waveforms"
+SAMPLE_RATE = 16000
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def waveform_path(meeting_name):
+    return os.path.join(WAVEFORM_DIR, f"{meeting_name}.npy")
+
+
+def is_waveform_fresh(meeting_name, media_path):
+    """The cached waveform exists and is newer than the recording it was decoded from"""
+    path = waveform_path(meeting_name)
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(media_path)
+
+
+def _meeting_lock(meeting_name):
+    with _locks_guard:
+        return _locks.setdefault(meeting_name, threading.Lock())
+
+
+@contextmanager
+def _decode_lock(meeting_name):
+    """Held while a meeting is decoded: by one thread of one process at a time"""
+    with _meeting_lock(meeting_name):
+        if fcntl is None:
+            yield
+            return
+        with open(waveform_path(meeting_name) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _decode(meeting_name, media_path):
+    """Decode into the .npy under the meeting's lock (OSError and CalledProcessError propagate)"""
+    path = waveform_path(meeting_name)
+    # Names of this process and thread only: a concurrent decode never touches them
+    unique = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    raw_path = unique + ".raw.tmp"
+    tmp_path = unique + ".tmp"
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-i", media_path,
+           "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", raw_path]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        num_samples = os.path.getsize(raw_path) // 4
+        with open(tmp_path, "wb") as out, open(raw_path, "rb") as raw:
+            header = {"descr": "<f4", "fortran_order": False, "shape": (num_samples,)}
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out, 16 * 1024 * 1024)
+        os.replace(tmp_path, path)
+    finally:
+        for leftover in (raw_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def ensure_waveform(meeting_name, media_path):
+    """
+    Decode media_path into the meeting's .npy waveform unless a fresh one
+    exists. ffmpeg writes raw samples to disk and the .npy header is put in
+    front afterwards, so memory use does not grow with the recording length.
+    Returns the waveform path, or None if decoding failed.
+    """
+    path = waveform_path(meeting_name)
+    try:
+        if is_waveform_fresh(meeting_name, media_path):
+            return path
+        os.makedirs(WAVEFORM_DIR, exist_ok=True)
+        with _decode_lock(meeting_name):
+            # Another process may have decoded it while this one waited for the lock
+            if not is_waveform_fresh(meeting_name, media_path):
+                _decode(meeting_name, media_path)
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to decode {media_path}: {e.stderr.strip()}")
+        return None
+    except OSError as e:
+        print(f"Failed to decode {media_path}: {e}")
+        return None
+    return path
+
+
+def open_waveform(meeting_name):
+    """
+    Memory-mapped waveform of the meeting, or None if it was not decoded.
+    Copy-on-write mode keeps the array writable for consumers such as torch
+    without copying anything until a page is actually modified.
+    """
+    path = waveform_path(meeting_name)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="c")
+
+
+def waveform_slice(waveform, start_seconds, duration_seconds=None):
+    """Zero-copy view of [start, start + duration) seconds of the waveform"""
+    start = max(0, int(round(start_seconds * SAMPLE_RATE)))
+    if duration_seconds is None:
+        return waveform[start:]
+    return waveform[start:start + int(round(duration_seconds * SAMPLE_RATE))]
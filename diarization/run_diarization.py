@@ -1,8 +1,23 @@
 import os
-import torch
-from pyannote.audio import Pipeline
-from dotenv import load_dotenv
+import sys
 import time
+# torch, pyannote и dotenv импортируются в функциях, где они нужны: загрузка
+# модуля (статус и план run_pipeline.py) не тратит секунды на torch
+
+# Сервер моделей (model_server.py) лежит в clean-workflow
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "clean-workflow"))
+try:
+    import model_server
+except ImportError:
+    model_server = None
+try:
+    import metrics
+except ImportError:
+    metrics = None
+try:
+    import catalog
+except ImportError:
+    catalog = None
 
 # --- НАСТРОЙКИ ---
 # Директория с аудиофайлами для обработки
@@ -11,15 +26,26 @@ SOURCE_AUDIO_DIR = "audio_for_diarization"
 RESULTS_DIR = "diarization_results"
 # ID модели на Hugging Face
 MODEL_ID = "pyannote/speaker-diarization-3.1"
+# Брать модель у запущенного model_server.py (если он есть) вместо загрузки
+USE_MODEL_SERVER = True
 # --- КОНЕЦ НАСТРОЕК ---
 
 
-def diarize_audio_files():
+def load_diarization_pipeline():
     """
-    Основная функция для запуска процесса диаризации спикеров
-    на всех аудиофайлах в указанной директории.
+    Загружает токен Hugging Face и модель диаризации.
+    Если запущен model_server.py, возвращается прокси к уже загруженной
+    на сервере модели.
+    Возвращает конвейер или None, если загрузка не удалась.
     """
-    # --- 1. ЗАГРУЗКА ТОКЕНА И ИНИЦИАЛИЗАЦИЯ МОДЕЛИ ---
+    if USE_MODEL_SERVER and model_server is not None:
+        remote = model_server.connect_pipeline("diarize")
+        if remote is not None:
+            return remote
+
+    import torch
+    from dotenv import load_dotenv
+    from pyannote.audio import Pipeline
 
     # Загружаем переменные окружения из файла .env
     # Это безопасный способ хранить ваш токен
@@ -30,7 +56,7 @@ def diarize_audio_files():
         print("Ошибка: Токен Hugging Face не найден.")
         print("Пожалуйста, создайте файл .env в той же папке, что и скрипт,")
         print("и добавьте в него строку: HUGGINGFACE_TOKEN='ваш_токен_доступа'")
-        return
+        return None
 
     print("Инициализация... Загрузка модели диаризации. Это может занять некоторое время.")
     try:
@@ -48,10 +74,99 @@ def diarize_audio_files():
         else:
             device = torch.device("cpu")
             print(f"Модель {MODEL_ID} успешно загружена на CPU. Обработка будет медленнее.")
+        return pipeline
 
     except Exception as e:
         print(f"Не удалось загрузить модель: {e}")
         print("Убедитесь, что вы приняли условия использования моделей на Hugging Face и ваш токен действителен.")
+        return None
+
+
+def audio_duration(file_path, waveform=None, sample_rate=16000):
+    """Длительность аудио в секундах (для метрик) или None, если ее не узнать."""
+    if waveform is not None:
+        return round(len(waveform) / sample_rate, 2)
+    try:
+        from pyannote.audio import Audio
+        return round(Audio().get_duration(file_path), 2)
+    except Exception:
+        return None
+
+
+def diarize_file(pipeline, file_path, results_dir=RESULTS_DIR, verbose=True, waveform=None, sample_rate=16000):
+    """
+    Выполняет диаризацию одного аудиофайла и сохраняет результат в RTTM.
+    Если передан waveform (моно float32, например срез общего
+    memory-mapped .npy совещания), аудио не декодируется повторно.
+    Возвращает путь к RTTM файлу или None при ошибке.
+    """
+    filename = os.path.basename(file_path)
+    meeting_name = os.path.splitext(filename)[0]
+    os.makedirs(results_dir, exist_ok=True)
+    if catalog is not None:
+        catalog.set_stage(meeting_name, "diarize", catalog.RUNNING)
+
+    try:
+        start_time = time.time()
+
+        # Запускаем конвейер диаризации на аудиофайле
+        # Модель автоматически обработает аудио: сконвертирует в моно, 16кГц
+        if waveform is not None:
+            import torch
+            # torch.from_numpy не копирует данные: тензор смотрит в тот же буфер
+            audio = {"waveform": torch.from_numpy(waveform).unsqueeze(0), "sample_rate": sample_rate,
+                     "uri": os.path.splitext(filename)[0]}
+            diarization = pipeline(audio)
+        else:
+            diarization = pipeline(file_path)
+
+        end_time = time.time()
+        print(f"Диаризация файла {filename} завершена за {end_time - start_time:.2f} секунд.")
+
+        # --- СОХРАНЕНИЕ РЕЗУЛЬТАТОВ ---
+
+        # Формируем путь для сохранения RTTM файла
+        output_rttm_path = os.path.join(results_dir, os.path.splitext(filename)[0] + '.rttm')
+
+        # Записываем результат в файл формата RTTM
+        with open(output_rttm_path, "w") as rttm_file:
+            diarization.write_rttm(rttm_file)
+
+        print(f"Результат сохранен в: {output_rttm_path}")
+        if catalog is not None:
+            catalog.add_artifact(meeting_name, "diarize", output_rttm_path)
+            catalog.set_stage(meeting_name, "diarize", catalog.DONE, wall_seconds=round(end_time - start_time, 4))
+        if metrics is not None:
+            metrics.record("diarize", meeting_name, audio_seconds=audio_duration(file_path, waveform, sample_rate),
+                           wall_seconds=round(end_time - start_time, 4),
+                           bytes_in=waveform.nbytes if waveform is not None else metrics.file_size(file_path),
+                           bytes_out=metrics.file_size(output_rttm_path), speakers=len(diarization.labels()))
+
+        if verbose:
+            # Опционально: выводим результат в консоль для наглядности
+            print("Разметка спикеров:")
+            for turn, _, speaker in diarization.itertracks(yield_label=True):
+                print(f"[{turn.start:04.1f}s -> {turn.end:04.1f}s] SPEAKER_{speaker}")
+
+        return output_rttm_path
+
+    except Exception as e:
+        print(f"!!! Произошла ошибка при обработке файла {filename}: {e}")
+        if metrics is not None:
+            metrics.record("diarize", meeting_name, bytes_in=metrics.file_size(file_path), error=str(e))
+        if catalog is not None:
+            catalog.set_stage(meeting_name, "diarize", catalog.FAILED, error=str(e))
+        return None
+
+
+def diarize_audio_files():
+    """
+    Основная функция для запуска процесса диаризации спикеров
+    на всех аудиофайлах в указанной директории.
+    """
+    # --- 1. ЗАГРУЗКА ТОКЕНА И ИНИЦИАЛИЗАЦИЯ МОДЕЛИ ---
+    pipeline = load_diarization_pipeline()
+    if pipeline is None:
         return
 
 
@@ -61,7 +176,7 @@ def diarize_audio_files():
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
     # Ищем все поддерживаемые аудиофайлы в исходной директории
-    supported_formats = ('.wav', '.mp3', '.flac', '.m4a')
+    supported_formats = ('.wav', '.mp3', '.flac', '.m4a', '.ogg')
     audio_files = [f for f in os.listdir(SOURCE_AUDIO_DIR) if f.endswith(supported_formats)]
 
     if not audio_files:
@@ -73,39 +188,11 @@ def diarize_audio_files():
     for i, filename in enumerate(audio_files):
         print(f"\n--- ({i+1}/{len(audio_files)}) Обрабатываю файл: {filename} ---")
         file_path = os.path.join(SOURCE_AUDIO_DIR, filename)
-        
-        try:
-            start_time = time.time()
-            
-            # Запускаем конвейер диаризации на аудиофайле
-            # Модель автоматически обработает аудио: сконвертирует в моно, 16кГц
-            diarization = pipeline(file_path)
-            
-            end_time = time.time()
-            print(f"Диаризация файла завершена за {end_time - start_time:.2f} секунд.")
-
-            # --- 3. СОХРАНЕНИЕ РЕЗУЛЬТАТОВ ---
-
-            # Формируем путь для сохранения RTTM файла
-            output_rttm_path = os.path.join(RESULTS_DIR, os.path.splitext(filename)[0] + '.rttm')
-            
-            # Записываем результат в файл формата RTTM
-            with open(output_rttm_path, "w") as rttm_file:
-                diarization.write_rttm(rttm_file)
-            
-            print(f"Результат сохранен в: {output_rttm_path}")
-
-            # Опционально: выводим результат в консоль для наглядности
-            print("Разметка спикеров:")
-            for turn, _, speaker in diarization.itertracks(yield_label=True):
-                print(f"[{turn.start:04.1f}s -> {turn.end:04.1f}s] SPEAKER_{speaker}")
-
 
-        except Exception as e:
-            print(f"!!! Произошла ошибка при обработке файла {filename}: {e}")
+        if diarize_file(pipeline, file_path) is None:
             print("!!! Пропускаю этот файл и перехожу к следующему.")
             continue
-            
+
     print(f"\n--- Обработка всех файлов завершена! ---")
 
 
@@ -118,4 +205,4 @@ if __name__ == "__main__":
         print("Рекомендуется установить ее ('pip install python-dotenv') для безопасного хранения токена.")
 
     dotenv.load_dotenv()
-    diarize_audio_files()
\ No newline at end of file
+    diarize_audio_files()